@@ -23,5 +23,7 @@ from breezedb.db import *
 from breezedb.table import *
 from breezedb.field import *
 from breezedb.element import *
+from breezedb.handle import Database, shared, transaction
+from breezedb.journal import disable_log, enable_log
 from breezedb.query import run_query
 from breezedb._version import __version__
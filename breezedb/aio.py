@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+
+"""
+.. module:: aio
+    :platform: Unix, Windows
+    :synopsis: Non-blocking database operations.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import os, sys, threading
+from Queue import Queue
+import db, element, field, parser, query, table
+
+# Maximum number of threads running blocking operations
+MAX_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Pending loads of each database, by absolute path
+_loads = {}
+_loads_lock = threading.Lock()
+
+class Future(object):
+    """ Result of an operation running in the background.
+
+        Event loops can be notified when the operation finishes with
+        :meth:`add_done_callback`, and threads can wait for it with
+        :meth:`result`.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def add_done_callback(self, function):
+        """ Call a function when the operation finishes. The function
+            receives the future as its only argument and is called right
+            away if the operation has already finished.
+
+            :param function: function to call
+        """
+        with self._condition:
+            if not self._done:
+                self._callbacks.append(function)
+                return
+
+        function(self)
+
+    def done(self):
+        """ Check whether the operation has finished.
+
+            :returns: True or False
+        """
+        return self._done
+
+    def exception(self, timeout=None):
+        """ Wait for the operation and get the exception it raised.
+
+            :param float timeout: seconds to wait. If None is specified,
+                wait until the operation finishes
+            :returns: exception object, or None if the operation succeeded
+
+            :raises Exception: timed out
+        """
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info else None
+
+    def result(self, timeout=None):
+        """ Wait for the operation and get its result.
+
+            :param float timeout: seconds to wait. If None is specified,
+                wait until the operation finishes
+            :returns: value returned by the operation
+
+            :raises Exception: timed out, or any exception raised by the
+                operation
+        """
+        self._wait(timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+
+        return self._result
+
+    def set_result(self, result):
+        """ Finish the operation with a result. """
+        self._finish(result, None)
+
+    def set_exc_info(self, exc_info):
+        """ Finish the operation with an exception, as returned by
+            :func:`sys.exc_info`.
+        """
+        self._finish(None, exc_info)
+
+    def _finish(self, result, exc_info):
+        """ Store the outcome, wake up waiting threads and run callbacks. """
+        with self._condition:
+            self._result = result
+            self._exc_info = exc_info
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notify_all()
+
+        for function in callbacks:
+            function(self)
+
+    def _wait(self, timeout):
+        """ Wait until the operation finishes. """
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+
+            if not self._done:
+                raise Exception('Timed out waiting for operation')
+
+class Executor(object):
+    """ Bounded pool of threads running blocking operations.
+
+        Threads are started as operations are submitted, up to the maximum
+        number of workers. Operations waiting for a free thread are queued.
+
+        :arg int max_workers: maximum number of threads
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.queue = Queue()
+        self.workers = []
+        self.idle = 0
+        self.lock = threading.Lock()
+
+    def shutdown(self):
+        """ Stop the threads of the pool once they have run the operations
+            already submitted. No operations may be submitted afterwards.
+        """
+        with self.lock:
+            for worker in self.workers:
+                self.queue.put(None)
+
+            self.workers = []
+
+    def submit(self, function, *args, **kwargs):
+        """ Run a function in the pool.
+
+            :param function: function to run
+            :returns: :class:`Future` of its result
+        """
+        future = Future()
+        self.queue.put((future, function, args, kwargs))
+
+        with self.lock:
+            if not self.idle and len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+
+        return future
+
+    def _work(self):
+        """ Run queued operations. """
+        while True:
+            with self.lock:
+                self.idle += 1
+            operation = self.queue.get()
+            with self.lock:
+                self.idle -= 1
+
+            if operation is None:
+                # Stopped by shutdown
+                return
+
+            future, function, args, kwargs = operation
+
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+def load(db_path):
+    """ Load a database in the background. Concurrent loads of the same
+        database share a single future, so the file is only read once.
+
+        :param str db_path: path to the database
+        :returns: :class:`Future` of the data of the database
+    """
+    key = os.path.abspath(db_path)
+    with _loads_lock:
+        future = _loads.get(key)
+        if future:
+            return future
+
+        future = submit(parser.read, db_path)
+        _loads[key] = future
+
+    def forget(done):
+        with _loads_lock:
+            if _loads.get(key) is done:
+                del _loads[key]
+
+    future.add_done_callback(forget)
+    return future
+
+def set_max_workers(max_workers):
+    """ Set the maximum number of threads running blocking operations. The
+        threads of the current pool stop once they have run the operations
+        already submitted, and new operations run in a new pool.
+
+        :param int max_workers: maximum number of threads
+    """
+    global MAX_WORKERS, _executor
+    with _executor_lock:
+        MAX_WORKERS = max_workers
+        if _executor is not None:
+            _executor.shutdown()
+
+        _executor = None
+
+def submit(function, *args, **kwargs):
+    """ Run a blocking function in the background.
+
+        :param function: function to run
+        :returns: :class:`Future` of its result
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = Executor(MAX_WORKERS)
+
+        # Submitted while holding the lock, so that the pool is not shut
+        # down in between
+        return _executor.submit(function, *args, **kwargs)
+
+def _after_load(db_path, function, *args):
+    """ Run a read operation once the database is loaded, so that
+        concurrent reads of the same database share the load. The operation
+        runs even if the load fails, so that it reports its own errors.
+
+        The database is pinned in the cache of the parser until the
+        operation finishes, so that the shared load is not evicted before
+        the operation reads it, even if the database does not fit in
+        ``parser.CACHE_LIMIT``.
+    """
+    future = Future()
+
+    def finish(done):
+        parser.unpin(db_path)
+        _copy(done, future)
+
+    def run(loaded):
+        submit(function, *args).add_done_callback(finish)
+
+    parser.pin(db_path)
+    try:
+        load(db_path).add_done_callback(run)
+    except:
+        parser.unpin(db_path)
+        raise
+
+    return future
+
+def _copy(source, target):
+    """ Finish a future with the outcome of another. """
+    if source._exc_info:
+        target.set_exc_info(source._exc_info)
+    else:
+        target.set_result(source._result)
+
+# Database operations
+def compact_db(db_path):
+    """ See :func:`db.compact_db`. """
+    return submit(db.compact_db, db_path)
+
+def get_table_list(db_path):
+    """ See :func:`db.get_table_list`. """
+    return _after_load(db_path, db.get_table_list, db_path)
+
+# Table operations
+def count_rows(table_name, db_path, where=None):
+    """ See :func:`table.count_rows`. """
+    return _after_load(db_path, table.count_rows, table_name, db_path, where)
+
+def create_table(table_name, db_path):
+    """ See :func:`table.create_table`. """
+    return submit(table.create_table, table_name, db_path)
+
+def enable_row_ids(table_name, db_path):
+    """ See :func:`table.enable_row_ids`. """
+    return submit(table.enable_row_ids, table_name, db_path)
+
+def exists_table(table_name, db_path):
+    """ See :func:`table.exists_table`. """
+    return _after_load(db_path, table.exists_table, table_name, db_path)
+
+def get_field_list(table_name, db_path):
+    """ See :func:`table.get_field_list`. """
+    return _after_load(db_path, table.get_field_list, table_name, db_path)
+
+def get_row(index, table_name, db_path, fields=None):
+    """ See :func:`table.get_row`. """
+    return _after_load(db_path, table.get_row, index, table_name, db_path,
+            fields)
+
+def get_row_by_id(row_id, table_name, db_path):
+    """ See :func:`table.get_row_by_id`. """
+    return _after_load(db_path, table.get_row_by_id, row_id, table_name,
+            db_path)
+
+def get_row_ids(table_name, db_path):
+    """ See :func:`table.get_row_ids`. """
+    return _after_load(db_path, table.get_row_ids, table_name, db_path)
+
+def get_row_list(table_name, db_path, where=None, fields=None):
+    """ See :func:`table.get_row_list`. """
+    return _after_load(db_path, table.get_row_list, table_name, db_path,
+            where, fields)
+
+def rename_table(table_name, db_path, new_name):
+    """ See :func:`table.rename_table`. """
+    return submit(table.rename_table, table_name, db_path, new_name)
+
+def remove_table(table_name, db_path):
+    """ See :func:`table.remove_table`. """
+    return submit(table.remove_table, table_name, db_path)
+
+def search_data(data, table_name, db_path, field_name=None,
+        ignore_case=True):
+    """ See :func:`table.search_data`. """
+    return _after_load(db_path, table.search_data, data, table_name,
+            db_path, field_name, ignore_case)
+
+def search_prefix(prefix, table_name, db_path, field_name):
+    """ See :func:`table.search_prefix`. """
+    return _after_load(db_path, table.search_prefix, prefix, table_name,
+            db_path, field_name)
+
+def search_range(low, high, table_name, db_path, field_name):
+    """ See :func:`table.search_range`. """
+    return _after_load(db_path, table.search_range, low, high, table_name,
+            db_path, field_name)
+
+def sort_data(field_name, table_name, db_path, reverse=False):
+    """ See :func:`table.sort_data`. """
+    return _after_load(db_path, table.sort_data, field_name, table_name,
+            db_path, reverse)
+
+# Field operations
+def create_field(field_name, field_type, table_name, db_path,
+        primary_key=False):
+    """ See :func:`field.create_field`. """
+    return submit(field.create_field, field_name, field_type, table_name,
+            db_path, primary_key)
+
+def create_index(field_name, table_name, db_path, index_type='hash'):
+    """ See :func:`field.create_index`. """
+    return submit(field.create_index, field_name, table_name, db_path,
+            index_type)
+
+def empty_field_row(index, field_name, table_name, db_path):
+    """ See :func:`field.empty_field_row`. """
+    return submit(field.empty_field_row, index, field_name, table_name,
+            db_path)
+
+def empty_field_table(field_name, table_name, db_path):
+    """ See :func:`field.empty_field_table`. """
+    return submit(field.empty_field_table, field_name, table_name, db_path)
+
+def exists_field(field_name, table_name, db_path):
+    """ See :func:`field.exists_field`. """
+    return _after_load(db_path, field.exists_field, field_name, table_name,
+            db_path)
+
+def get_field_avg(field_name, table_name, db_path):
+    """ See :func:`field.get_field_avg`. """
+    return _after_load(db_path, field.get_field_avg, field_name, table_name,
+            db_path)
+
+def get_field_data(field_name, table_name, db_path):
+    """ See :func:`field.get_field_data`. """
+    return _after_load(db_path, field.get_field_data, field_name,
+            table_name, db_path)
+
+def get_field_max(field_name, table_name, db_path):
+    """ See :func:`field.get_field_max`. """
+    return _after_load(db_path, field.get_field_max, field_name, table_name,
+            db_path)
+
+def get_field_min(field_name, table_name, db_path):
+    """ See :func:`field.get_field_min`. """
+    return _after_load(db_path, field.get_field_min, field_name, table_name,
+            db_path)
+
+def get_field_sum(field_name, table_name, db_path):
+    """ See :func:`field.get_field_sum`. """
+    return _after_load(db_path, field.get_field_sum, field_name, table_name,
+            db_path)
+
+def get_field_type(field_name, table_name, db_path):
+    """ See :func:`field.get_field_type`. """
+    return _after_load(db_path, field.get_field_type, field_name,
+            table_name, db_path)
+
+def get_index_list(field_name, table_name, db_path):
+    """ See :func:`field.get_index_list`. """
+    return _after_load(db_path, field.get_index_list, field_name,
+            table_name, db_path)
+
+def rename_field(field_name, table_name, db_path, new_name):
+    """ See :func:`field.rename_field`. """
+    return submit(field.rename_field, field_name, table_name, db_path,
+            new_name)
+
+def remove_field(field_name, table_name, db_path):
+    """ See :func:`field.remove_field`. """
+    return submit(field.remove_field, field_name, table_name, db_path)
+
+def remove_index(field_name, table_name, db_path, index_type='hash'):
+    """ See :func:`field.remove_index`. """
+    return submit(field.remove_index, field_name, table_name, db_path,
+            index_type)
+
+def swap_fields(index1, index2, table_name, db_path):
+    """ See :func:`field.swap_fields`. """
+    return submit(field.swap_fields, index1, index2, table_name, db_path)
+
+# Element operations
+def create_row(element_list, table_name, db_path):
+    """ See :func:`element.create_row`. """
+    return submit(element.create_row, element_list, table_name, db_path)
+
+def create_rows(element_lists, table_name, db_path):
+    """ See :func:`element.create_rows`. """
+    return submit(element.create_rows, element_lists, table_name, db_path)
+
+def empty_element(index, field_name, table_name, db_path):
+    """ See :func:`element.empty_element`. """
+    return submit(element.empty_element, index, field_name, table_name,
+            db_path)
+
+def exists_row(index, table_name, db_path):
+    """ See :func:`element.exists_row`. """
+    return _after_load(db_path, element.exists_row, index, table_name,
+            db_path)
+
+def exists_row_id(row_id, table_name, db_path):
+    """ See :func:`element.exists_row_id`. """
+    return _after_load(db_path, element.exists_row_id, row_id, table_name,
+            db_path)
+
+def get_element_data(index, field_name, table_name, db_path):
+    """ See :func:`element.get_element_data`. """
+    return _after_load(db_path, element.get_element_data, index, field_name,
+            table_name, db_path)
+
+def get_row_by_key(key, table_name, db_path):
+    """ See :func:`element.get_row_by_key`. """
+    return _after_load(db_path, element.get_row_by_key, key, table_name,
+            db_path)
+
+def modify_by_key(key, field_name, table_name, db_path, new_content):
+    """ See :func:`element.modify_by_key`. """
+    return submit(element.modify_by_key, key, field_name, table_name,
+            db_path, new_content)
+
+def modify_element(index, field_name, table_name, db_path, new_content):
+    """ See :func:`element.modify_element`. """
+    return submit(element.modify_element, index, field_name, table_name,
+            db_path, new_content)
+
+def modify_where(predicate, new_contents, table_name, db_path):
+    """ See :func:`element.modify_where`. """
+    return submit(element.modify_where, predicate, new_contents, table_name,
+            db_path)
+
+def remove_row(index, table_name, db_path):
+    """ See :func:`element.remove_row`. """
+    return submit(element.remove_row, index, table_name, db_path)
+
+def remove_row_by_id(row_id, table_name, db_path):
+    """ See :func:`element.remove_row_by_id`. """
+    return submit(element.remove_row_by_id, row_id, table_name, db_path)
+
+def remove_rows(indexes, table_name, db_path):
+    """ See :func:`element.remove_rows`. """
+    return submit(element.remove_rows, indexes, table_name, db_path)
+
+def remove_where(predicate, table_name, db_path):
+    """ See :func:`element.remove_where`. """
+    return submit(element.remove_where, predicate, table_name, db_path)
+
+def upsert_row(element_list, table_name, db_path):
+    """ See :func:`element.upsert_row`. """
+    return submit(element.upsert_row, element_list, table_name, db_path)
+
+def upsert_rows(element_lists, table_name, db_path):
+    """ See :func:`element.upsert_rows`. """
+    return submit(element.upsert_rows, element_lists, table_name, db_path)
+
+# Queries
+def run_query(query_string):
+    """ See :func:`query.run_query`. """
+    return submit(query.run_query, query_string)
@@ -0,0 +1,829 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: backend
+    :platform: Unix, Windows
+    :synopsis: Storage formats of database files.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import json, re, struct
+from collections import OrderedDict
+from itertools import izip
+
+# Names of the built-in formats
+FORMAT_JSON = 'json'
+FORMAT_COMPACT = 'compact'
+FORMAT_BINARY = 'binary'
+
+# Number of bytes read at a time when decoding rows incrementally
+READ_SIZE = 64 * 1024
+
+# Keys of a table holding a value for each of its rows, which are stored
+# with the rows rather than with the definition of the table
+ROW_KEYS = ('rows', 'row_ids')
+
+# Whitespace and separators between the elements of a JSON array
+_SEPARATORS = re.compile(r'[\s,]*')
+
+# Registered backends, by format name
+_backends = OrderedDict()
+
+class JSONBackend(object):
+    """ Indented JSON document with rows stored as dictionaries. This is
+        the default format.
+    """
+
+    name = FORMAT_JSON
+
+    # Beginning of the lines containing table names and table keys
+    TABLE_KEY = '\n' + ' ' * 4 + '"'
+    TABLE_KEY_KEY = '\n' + ' ' * 8 + '"'
+    TABLE_END = '\n' + ' ' * 4 + '}'
+    ROWS_KEY = TABLE_KEY_KEY + 'rows": '
+
+    def detect(self, head):
+        """ Check whether the beginning of a file belongs to this format.
+
+            :param str head: first bytes of the file
+            :returns: True or False
+        """
+        return head.lstrip().startswith('{')
+
+    def encode(self, db_data):
+        """ Encode database data.
+
+            :param db_data: data to encode
+            :returns: encoded data as a byte string
+        """
+        return json.dumps(db_data, ensure_ascii=False, sort_keys=True,
+                indent=4).encode('utf-8')
+
+    def decode(self, content):
+        """ Decode database data.
+
+            :param str content: encoded data as a byte string
+            :returns: decoded data
+        """
+        return json.loads(content, encoding='utf-8')
+
+    def read_index(self, content):
+        """ Locate the tables of encoded data without decoding their rows.
+
+            Files written by this backend are indented by four spaces and
+            JSON strings cannot contain line breaks, so every line starting
+            with exactly four spaces and a quote is the name of a table and
+            every line starting with exactly eight spaces and a quote is a
+            key of a table. Content laid out differently is not indexed.
+
+            :param str content: encoded data as a byte string
+            :returns: dictionary with a (definition, location) tuple for
+                each table name, or None if the content cannot be indexed
+        """
+        if not content.startswith('{' + self.TABLE_KEY):
+            return None
+
+        index = {}
+        for name, start, end in _scan_keys(content, self.TABLE_KEY, 0,
+                content.rindex('}')):
+            if name is None or content[start] != '{' or \
+                    content[end - 1] != '}':
+                return None
+
+            definition = {}
+            for key, key_start, key_end in _scan_keys(content,
+                    self.TABLE_KEY_KEY, start, end - 1):
+                if key is None:
+                    return None
+                if key not in ROW_KEYS:
+                    definition[key] = json.loads(
+                            content[key_start:key_end], encoding='utf-8')
+
+            index[name] = (definition, (start, end))
+
+        return index
+
+    def read_table(self, content, location):
+        """ Decode a single table of encoded data.
+
+            :param str content: encoded data as a byte string
+            :param location: location of the table, as returned by
+                :meth:`read_index`
+            :returns: table data
+        """
+        start, end = location
+        return json.loads(content[start:end], encoding='utf-8')
+
+    def iter_rows(self, db_file, table_name, fields=None):
+        """ Decode the rows of a table one at a time from an open file,
+            reading it in blocks of :data:`READ_SIZE` bytes.
+
+            The table is located following the same rules as
+            :meth:`read_index`.
+
+            :param file db_file: database file opened in binary mode
+            :param unicode table_name: name of the table
+            :param list fields: names of the fields to include in each row.
+                If None is specified, every field is included
+            :returns: iterator of row dictionaries, or None if the rows
+                cannot be read incrementally
+        """
+        db_file.seek(0)
+        if db_file.read(len(self.TABLE_KEY) + 1) != '{' + self.TABLE_KEY:
+            return None
+
+        position = 0
+        while True:
+            position = _find(db_file, self.TABLE_KEY, position)
+            if position == -1:
+                return None
+
+            name, position = _decode_at(db_file,
+                    position + len(self.TABLE_KEY) - 1)
+            if name == table_name:
+                break
+
+        rows = _find(db_file, self.ROWS_KEY, position)
+        if rows == -1 or _find(db_file, self.TABLE_END, position, rows) != -1:
+            return None
+
+        return _project(_iter_array(db_file, rows + len(self.ROWS_KEY)),
+                fields)
+
+class CompactBackend(JSONBackend):
+    """ JSON list whose first element describes the format and whose second
+        element contains the tables, without indentation. Rows are stored
+        as lists ordered by the fields of the table.
+    """
+
+    name = FORMAT_COMPACT
+
+    def detect(self, head):
+        return head.lstrip().startswith('[')
+
+    def encode(self, db_data):
+        header = {'format': self.name, 'tables': {}}
+        chunks = []
+        offset = 1
+        for table_name, table in sorted(db_data.iteritems()):
+            names = _field_names(table)
+            definition = get_definition(table)
+            keys = dict((k, v) for k, v in table.iteritems() if k != 'rows')
+
+            # The rows are written last so that they can be read on their
+            # own, see iter_rows
+            key = '%s%s:' % (',' if chunks else '', _dumps(table_name))
+            start = _dumps(keys)[:-1]
+            start += '%s"rows":' % (',' if keys else '')
+            rows = _dumps([[row[n] for n in names] for row in table['rows']])
+            chunks.extend([key, start, rows, '}'])
+
+            offset += len(key)
+            header['tables'][table_name] = {'offset': offset,
+                    'rows': offset + len(start),
+                    'size': len(start) + len(rows) + 1,
+                    'count': len(table['rows']), 'definition': definition}
+            offset += len(start) + len(rows) + 1
+
+        return '[%s,{%s}]' % (_dumps(header), ''.join(chunks))
+
+    def decode(self, content):
+        db_data = json.loads(content, encoding='utf-8')[1]
+        for table in db_data.itervalues():
+            self._decode_rows(table)
+
+        return db_data
+
+    def read_index(self, content):
+        """ Read the index stored in the first element of the list, which
+            contains the definition of each table and the position of the
+            table relative to the beginning of the second element. Files
+            written without an index are not indexed.
+        """
+        header, end = json.JSONDecoder(encoding='utf-8').raw_decode(
+                content, content.index('{'))
+        if 'tables' not in header:
+            return None
+
+        body = content.index('{', end)
+        return dict((name, (entry['definition'], (body + entry['offset'],
+                body + entry['offset'] + entry['size'])))
+                for name, entry in header['tables'].iteritems())
+
+    def read_table(self, content, location):
+        start, end = location
+        return self._decode_rows(json.loads(content[start:end],
+                encoding='utf-8'))
+
+    def count_rows(self, db_file, table_name):
+        """ Get the number of rows of a table from the index, without
+            decoding the tables. Files written without an index do not
+            store it.
+
+            :param file db_file: database file opened in binary mode
+            :param unicode table_name: name of the table
+            :returns: number of rows, or None if it is not stored
+        """
+        db_file.seek(0)
+        if db_file.read(1) != '[':
+            return None
+
+        header, end = _decode_at(db_file, 1)
+        return header.get('tables', {}).get(table_name, {}).get('count')
+
+    def iter_rows(self, db_file, table_name, fields=None):
+        """ Decode the rows of a table one at a time, starting at the
+            position of the rows stored in the index. Files written without
+            an index cannot be read incrementally.
+        """
+        db_file.seek(0)
+        if db_file.read(1) != '[':
+            return None
+
+        header, end = _decode_at(db_file, 1)
+        entry = header.get('tables', {}).get(table_name)
+        if not entry or 'rows' not in entry:
+            return None
+
+        names = _field_names(entry['definition'])
+        rows = _iter_array(db_file, end + 1 + entry['rows'])
+        return _project((dict(izip(names, row)) for row in rows), fields)
+
+    def _decode_rows(self, table):
+        """ Turn the rows of a decoded table into dictionaries. """
+        names = _field_names(table)
+        table['rows'] = [dict(izip(names, row)) for row in table['rows']]
+        return table
+
+class BinaryBackend(object):
+    """ Typed binary format storing the rows of each table by column.
+
+        The file starts with the magic string ``BRDB``, a version byte and
+        the number of tables. Each table contains its name, the size of the
+        rest of the table, its definition (see :func:`get_definition`) as
+        JSON, the number of rows and one block per field, followed by a
+        block with the id of each row if the table has row ids.
+
+        A column block contains its kind, a flags byte and the size of its
+        content. Numeric columns are packed as little-endian 64-bit
+        integers or doubles, string columns as UTF-8 text with values
+        separated by a NUL character. If some numeric elements are empty, a
+        byte mask marking them precedes the values. Columns whose values do
+        not match the data type of their field are stored as JSON.
+
+        All sizes are little-endian unsigned integers (32 bits for names and
+        definitions, 64 bits for tables and columns).
+    """
+
+    name = FORMAT_BINARY
+
+    MAGIC = 'BRDB'
+    VERSION = 1
+
+    # Column kinds
+    INT = 'q'
+    FLOAT = 'd'
+    STR = 's'
+    JSON = 'j'
+
+    # Column flags
+    EMPTY_MASK = 1
+
+    def detect(self, head):
+        return head.startswith(self.MAGIC)
+
+    def encode(self, db_data):
+        chunks = [self.MAGIC, struct.pack('<BI', self.VERSION, len(db_data))]
+        for table_name, table in sorted(db_data.iteritems()):
+            chunks.append(_pack_string(table_name.encode('utf-8')))
+
+            definition = get_definition(table)
+            section = [_pack_string(json.dumps(definition,
+                    ensure_ascii=False).encode('utf-8')),
+                    struct.pack('<Q', len(table['rows']))]
+
+            for f in table['fields']:
+                name, field_type = f.items()[0]
+                section.extend(self.encode_column(
+                        [row[name] for row in table['rows']], field_type))
+
+            if 'row_ids' in table:
+                section.extend(self.encode_column(table['row_ids'], 'int'))
+
+            size = sum(len(chunk) for chunk in section)
+            chunks.append(struct.pack('<Q', size))
+            chunks.extend(section)
+
+        return ''.join(chunks)
+
+    def encode_column(self, values, field_type):
+        """ Encode the values of a field.
+
+            :param list values: values of the field, ordered by row
+            :param str field_type: data type of the field
+            :returns: list of byte strings forming the column block
+        """
+        kind, flags, content = self.JSON, 0, None
+
+        if field_type in ('int', 'bool', 'float'):
+            kind = self.FLOAT if field_type == 'float' else self.INT
+            valid = (float,) if kind == self.FLOAT else (int, long)
+            mask = ['\x01' if v == "" else '\x00' for v in values]
+            empty = 0.0 if kind == self.FLOAT else 0
+            numbers = [empty if v == "" else v for v in values]
+
+            try:
+                if not all(type(v) in valid for v in numbers):
+                    raise ValueError
+                content = struct.pack('<%d%s' % (len(numbers), kind),
+                        *numbers)
+            except (ValueError, struct.error):
+                kind, content = self.JSON, None
+            else:
+                if '\x01' in mask:
+                    flags = self.EMPTY_MASK
+                    content = ''.join(mask) + content
+
+        elif field_type == 'str':
+            if all(type(v) is unicode and u'\x00' not in v for v in values):
+                kind = self.STR
+                content = u'\x00'.join(values).encode('utf-8')
+
+        if content is None:
+            kind = self.JSON
+            content = json.dumps(values, ensure_ascii=False).encode('utf-8')
+
+        return [struct.pack('<ccQ', kind, chr(flags), len(content)), content]
+
+    def decode(self, content):
+        version, count = struct.unpack_from('<BI', content, len(self.MAGIC))
+        if version != self.VERSION:
+            raise Exception('Unsupported binary format version %i' % version)
+
+        db_data = {}
+        offset = len(self.MAGIC) + 5
+        for _ in xrange(count):
+            table_name, offset = _unpack_string(content, offset)
+            size, = struct.unpack_from('<Q', content, offset)
+            offset += 8
+            db_data[table_name.decode('utf-8')] = self.decode_table(content,
+                    offset)
+            offset += size
+
+        return db_data
+
+    def read_index(self, content):
+        """ Read the name and definition of each table, skipping its rows
+            with the size of the table section.
+        """
+        version, count = struct.unpack_from('<BI', content, len(self.MAGIC))
+        if version != self.VERSION:
+            raise Exception('Unsupported binary format version %i' % version)
+
+        index = {}
+        offset = len(self.MAGIC) + 5
+        for _ in xrange(count):
+            table_name, offset = _unpack_string(content, offset)
+            size, = struct.unpack_from('<Q', content, offset)
+            offset += 8
+            definition, _ = _unpack_string(content, offset)
+            index[table_name.decode('utf-8')] = (json.loads(definition,
+                    encoding='utf-8'), offset)
+            offset += size
+
+        return index
+
+    def read_table(self, content, location):
+        return self.decode_table(content, location)
+
+    def count_rows(self, db_file, table_name):
+        """ Get the number of rows of a table, which is stored before its
+            columns, without decoding them.
+
+            :param file db_file: database file opened in binary mode
+            :param unicode table_name: name of the table
+            :returns: number of rows, or None if the table does not exist
+        """
+        offset = self._find_table(db_file, table_name)
+        if offset is None:
+            return None
+
+        definition, offset = _read_string(db_file, offset)
+        return struct.unpack('<Q', _read(db_file, offset, 8))[0]
+
+    def iter_rows(self, db_file, table_name, fields=None):
+        """ Decode the rows of a table one at a time, reading only the
+            columns of the requested fields.
+        """
+        offset = self._find_table(db_file, table_name)
+        if offset is None:
+            return None
+
+        definition, offset = _read_string(db_file, offset)
+        names = _field_names(json.loads(definition, encoding='utf-8'))
+        row_count, = struct.unpack('<Q', _read(db_file, offset, 8))
+        offset += 8
+
+        columns = []
+        for name in names:
+            kind, flags, size = struct.unpack('<ccQ',
+                    _read(db_file, offset, 10))
+            if fields is None or name in fields:
+                columns.append((name, self.iter_column(db_file, offset,
+                        row_count)))
+            offset += 10 + size
+
+        return self._iter_columns(columns, row_count)
+
+    def iter_column(self, db_file, offset, count):
+        """ Decode the values of a column block one at a time.
+
+            :param file db_file: database file opened in binary mode
+            :param int offset: position of the column block
+            :param int count: number of rows in the table
+            :returns: iterator of values
+        """
+        kind, flags, size = struct.unpack('<ccQ', _read(db_file, offset, 10))
+        offset += 10
+
+        if kind == self.STR:
+            if count == 0:
+                return
+
+            rest = ''
+            for chunk in _iter_chunks(db_file, offset, offset + size):
+                values = (rest + chunk).split('\x00')
+                rest = values.pop()
+                for value in values:
+                    yield value.decode('utf-8')
+            yield rest.decode('utf-8')
+
+        elif kind == self.JSON:
+            for value in _iter_array(db_file, offset):
+                yield value
+
+        else:
+            mask = ord(flags) & self.EMPTY_MASK
+            start = offset + count if mask else offset
+            batch = max(1, READ_SIZE // 8)
+            for index in xrange(0, count, batch):
+                number = min(batch, count - index)
+                values = struct.unpack('<%d%s' % (number, kind),
+                        _read(db_file, start + index * 8, number * 8))
+                if mask:
+                    values = ["" if m == '\x01' else v for v, m in
+                            izip(values, _read(db_file, offset + index,
+                                number))]
+
+                for value in values:
+                    yield value
+
+    def _find_table(self, db_file, table_name):
+        """ Find the position of the definition of a table in a file, or
+            None if the table does not exist.
+        """
+        head = _read(db_file, 0, len(self.MAGIC) + 5)
+        version, count = struct.unpack_from('<BI', head, len(self.MAGIC))
+        if version != self.VERSION:
+            raise Exception('Unsupported binary format version %i' % version)
+
+        offset = len(head)
+        for _ in xrange(count):
+            name, offset = _read_string(db_file, offset)
+            size, = struct.unpack('<Q', _read(db_file, offset, 8))
+            offset += 8
+            if name.decode('utf-8') == table_name:
+                return offset
+            offset += size
+
+        return None
+
+    def _iter_columns(self, columns, count):
+        """ Combine column iterators into row dictionaries. """
+        if not columns:
+            for _ in xrange(count):
+                yield {}
+            return
+
+        names = [name for name, values in columns]
+        for values in izip(*[values for name, values in columns]):
+            yield dict(izip(names, values))
+
+    def decode_table(self, content, offset):
+        """ Decode a table section.
+
+            :param str content: encoded data
+            :param int offset: position of the definition of the table
+            :returns: table data
+        """
+        definition, offset = _unpack_string(content, offset)
+        table = json.loads(definition, encoding='utf-8')
+        count, = struct.unpack_from('<Q', content, offset)
+        offset += 8
+
+        columns = []
+        for f in table['fields']:
+            values, offset = self.decode_column(content, offset, count)
+            columns.append(values)
+
+        # Files written before row ids were stored as a column keep them in
+        # the definition
+        if 'next_id' in table and 'row_ids' not in table:
+            table['row_ids'], offset = self.decode_column(content, offset,
+                    count)
+
+        names = _field_names(table)
+        if names:
+            table['rows'] = [dict(izip(names, values))
+                    for values in izip(*columns)]
+        else:
+            table['rows'] = [{} for _ in xrange(count)]
+
+        return table
+
+    def decode_column(self, content, offset, count):
+        """ Decode a column block.
+
+            :param str content: encoded data
+            :param int offset: position of the column block
+            :param int count: number of rows in the table
+            :returns: tuple with the list of values and the position of the
+                next block
+        """
+        kind, flags, size = struct.unpack_from('<ccQ', content, offset)
+        offset += 10
+        end = offset + size
+
+        if kind == self.STR:
+            if count == 0:
+                return [], end
+            return content[offset:end].decode('utf-8').split(u'\x00'), end
+
+        elif kind == self.JSON:
+            return json.loads(content[offset:end], encoding='utf-8'), end
+
+        mask = None
+        if ord(flags) & self.EMPTY_MASK:
+            mask = content[offset:offset + count]
+            offset += count
+
+        values = list(struct.unpack_from('<%d%s' % (count, kind), content,
+                offset))
+        if mask:
+            values = ["" if m == '\x01' else v for v, m in izip(values, mask)]
+
+        return values, end
+
+def detect_backend(head):
+    """ Find the backend of a database file.
+
+        :param str head: first bytes of the file
+        :returns: backend object
+
+        :raises Exception: unknown format
+    """
+    for backend in reversed(_backends.values()):
+        if backend.detect(head):
+            return backend
+
+    raise Exception('Unknown database format')
+
+def get_definition(table):
+    """ Get the definition of a table: every key except those holding a
+        value for each row (see :data:`ROW_KEYS`), so that it stays small
+        regardless of the number of rows.
+
+        :param dict table: table data
+        :returns: dictionary with the definition of the table
+    """
+    return dict((k, v) for k, v in table.iteritems() if k not in ROW_KEYS)
+
+def get_backend(name):
+    """ Get a registered backend.
+
+        :param str name: name of the format
+        :returns: backend object
+
+        :raises Exception: invalid format
+    """
+    if name not in _backends:
+        raise Exception('Invalid format %s' % name)
+
+    return _backends[name]
+
+def get_backend_list():
+    """ Get the names of the registered formats.
+
+        :returns: list of format names, in order of registration
+    """
+    return _backends.keys()
+
+def register_backend(backend):
+    """ Register a storage format.
+
+        A backend is an object with a `name` attribute and `detect(head)`,
+        `encode(db_data)` and `decode(content)` methods working on byte
+        strings. Backends registered later take precedence when detecting
+        the format of a file.
+
+        Backends may also provide `read_index(content)` and
+        `read_table(content, location)` methods, see
+        :meth:`JSONBackend.read_index`, so that tables are only decoded
+        when accessed, and an `iter_rows(db_file, table_name, fields)`
+        method, see :meth:`JSONBackend.iter_rows`, to read the rows of a
+        table without loading it. A `count_rows(db_file, table_name)`
+        method, see :meth:`BinaryBackend.count_rows`, gets the number of
+        rows of a table the same way, returning None if the file does not
+        store it.
+
+        :param backend: backend object
+    """
+    _backends[backend.name] = backend
+
+def _decode_at(db_file, offset):
+    """ Decode the JSON value starting at a position of a file.
+
+        :returns: tuple with the value and the position following it
+    """
+    decoder = json.JSONDecoder(encoding='utf-8')
+    buffer = ''
+    for chunk in _iter_chunks(db_file, offset):
+        buffer += chunk
+        try:
+            value, end = decoder.raw_decode(buffer)
+        except ValueError:
+            continue
+
+        if end < len(buffer):
+            return value, offset + end
+
+    raise ValueError('Unexpected end of data')
+
+def _dumps(data):
+    """ Encode data as JSON without whitespace. """
+    return json.dumps(data, ensure_ascii=False,
+            separators=(',', ':')).encode('utf-8')
+
+def _field_names(table):
+    """ Get the names of the fields of a table, in order. """
+    return [f.keys()[0] for f in table['fields']]
+
+def _find(db_file, marker, start, end=None):
+    """ Find the position of a byte string in a file, reading it in blocks.
+
+        :returns: position of the byte string, or -1 if it is not found
+            between `start` and `end`
+    """
+    position = start
+    tail = ''
+    for chunk in _iter_chunks(db_file, start, end):
+        data = tail + chunk
+        index = data.find(marker)
+        if index != -1:
+            return position - len(tail) + index
+
+        tail = data[max(0, len(data) - len(marker) + 1):]
+        position += len(chunk)
+
+    return -1
+
+def _iter_array(db_file, offset):
+    """ Decode the elements of a JSON array in a file one at a time,
+        keeping at most a few blocks in memory.
+    """
+    decoder = json.JSONDecoder(encoding='utf-8')
+    chunks = _iter_chunks(db_file, offset)
+    buffer = ''
+    position = 0
+    opened = False
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if not opened:
+                if buffer[position] != '[':
+                    raise ValueError('Expected a JSON array')
+                opened = True
+                position += 1
+                continue
+
+            if buffer[position] == ']':
+                return
+
+            # Values ending at the end of the buffer may be incomplete
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = len(buffer)
+
+            if end < len(buffer):
+                yield value
+                position = end
+                continue
+
+        chunk = next(chunks, '')
+        if not chunk:
+            raise ValueError('Unexpected end of data')
+
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def _iter_chunks(db_file, offset, end=None):
+    """ Read a file in blocks of :data:`READ_SIZE` bytes from a position,
+        seeking before each read so that the file can be shared.
+    """
+    while end is None or offset < end:
+        db_file.seek(offset)
+        chunk = db_file.read(READ_SIZE if end is None else
+                min(READ_SIZE, end - offset))
+        if not chunk:
+            return
+
+        offset += len(chunk)
+        yield chunk
+
+def _pack_string(data):
+    """ Prefix a byte string with its length. """
+    return struct.pack('<I', len(data)) + data
+
+def _project(rows, fields):
+    """ Restrict rows to the given fields, if any. """
+    for row in rows:
+        if fields is None:
+            yield row
+        else:
+            yield dict((f, row[f]) for f in fields)
+
+def _read(db_file, offset, size):
+    """ Read a number of bytes from a position of a file. """
+    db_file.seek(offset)
+    data = db_file.read(size)
+    if len(data) < size:
+        raise ValueError('Unexpected end of data')
+
+    return data
+
+def _read_string(db_file, offset):
+    """ Read a byte string prefixed with its length from a file. """
+    size, = struct.unpack('<I', _read(db_file, offset, 4))
+    return _read(db_file, offset + 4, size), offset + 4 + size
+
+def _scan_keys(content, marker, start, end):
+    """ Find the keys of a JSON object written with one key per line.
+
+        :param str content: encoded data
+        :param str marker: line break, indentation and quote preceding each
+            key
+        :param int start: position where the object starts
+        :param int end: position where the object ends
+        :returns: iterator of (key, value start, value end) tuples. The key
+            is None if the content is not laid out as expected
+    """
+    position = content.find(marker, start, end)
+    while position != -1:
+        try:
+            key, value_start = json.decoder.scanstring(content,
+                    position + len(marker), 'utf-8')
+        except ValueError:
+            key = None
+
+        if key is None or content[value_start:value_start + 2] != ': ':
+            yield None, None, None
+            return
+
+        value_start += 2
+        position = content.find(marker, value_start, end)
+        value_end = end if position == -1 else position
+        while content[value_end - 1] in ' \n,':
+            value_end -= 1
+
+        yield key, value_start, value_end
+
+def _unpack_string(content, offset):
+    """ Read a byte string prefixed with its length. """
+    size, = struct.unpack_from('<I', content, offset)
+    offset += 4
+    return content[offset:offset + size], offset + size
+
+register_backend(JSONBackend())
+register_backend(CompactBackend())
+register_backend(BinaryBackend())
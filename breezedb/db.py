@@ -27,33 +27,113 @@
 .. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
 """
 
-import os
-import parser
+import os, shutil
+import backend, filelock, journal, parser, segment
 
-def create_db(path, name):
+def compact_db(db_path, background=False):
+    """ Fold the change log of the database into a new database file.
+
+        The new file atomically replaces the current one once written, so
+        that readers keep using the previous state until then. Compaction is
+        also triggered automatically when the log grows past the thresholds
+        defined in :mod:`journal`.
+
+        :param str db_path: path to the database
+        :param Boolean background: whether to compact in a separate thread
+        :returns: the compaction thread if running in the background
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: not a breezedb database
+    """
+    try:
+        if not is_brdb(db_path):
+            raise Exception('Not a breezedb database: %s' % db_path)
+
+        return journal.compact(db_path, background)
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
+
+def convert_db(db_path, db_format):
+    """ Rewrite the database in another storage format.
+
+        :param str db_path: path to the database
+        :param str db_format: name of the new storage format, see
+            :mod:`backend`
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: not a breezedb database, invalid format
+    """
+    try:
+        if not is_brdb(db_path):
+            raise Exception('Not a breezedb database: %s' % db_path)
+        elif db_format not in backend.get_backend_list():
+            raise Exception('Invalid format %s' % db_format)
+
+        with parser.lock(db_path):
+            parser.write_file(db_path, parser.read_file(db_path), True,
+                    db_format)
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
+
+def create_db(path, name, db_format=backend.FORMAT_JSON, segmented=False):
     """ Create a database file in the specified path.
 
         :param str path: path where the database should be created
         :param str name: name for the database
+        :param str db_format: name of the storage format of the database,
+            see :mod:`backend`. The format is recorded in the file and
+            detected when reading it
+        :param Boolean segmented: whether to store the database as a
+            directory containing a manifest and one file per table, so that
+            operations only read and write the tables they affect
 
         :raises IOError: cannot write to path
         :raises OSError: error writing to database
-        :raises Exception: database already exists
+        :raises Exception: database already exists, invalid format
     """
     try:
         db_path = os.path.join(path, name + '.brdb')
         if is_brdb(db_path):
             raise Exception('Database %s already exists' % db_path)
+        elif db_format not in backend.get_backend_list():
+            raise Exception('Invalid format %s' % db_format)
 
-        db_file = open(db_path, 'w')
-        db_file.write('{}')
-        db_file.close()
+        if segmented:
+            segment.create(db_path, db_format, parser.must_sync())
+        else:
+            parser.dump(db_path, {}, parser.must_sync(), db_format)
 
     except IOError as e:
         raise e
     except OSError as e:
         raise e
 
+def get_db_format(db_path):
+    """ Get the storage format of the database.
+
+        :param str db_path: path to the database
+        :returns: name of the storage format
+
+        :raises IOError: cannot open file
+        :raises Exception: not a breezedb database
+    """
+    try:
+        if not is_brdb(db_path):
+            raise Exception('Not a breezedb database: %s' % db_path)
+
+        return parser.get_format(db_path)
+
+    except IOError as e:
+        raise e
+
 def get_table_list(db_path):
     """ Get a list of tables present in the database.
 
@@ -68,9 +148,10 @@ def get_table_list(db_path):
         if not is_brdb(db_path):
             raise Exception('Not a breezedb database: %s' % db_path)
 
-        db_data = parser.read(db_path)
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
 
-        return sorted(db_data.iterkeys())
+            return sorted(db_data.iterkeys())
 
     except IOError as e:
         raise e
@@ -80,10 +161,13 @@ def get_table_list(db_path):
 def is_brdb(db_path):
     """ Determine whether the specified file is a breezedb database or not.
 
+        Segmented databases are directories containing a manifest.
+
         :param str db_path: path to the database
         :returns: True or False
     """
-    if os.path.isfile(db_path) and db_path.endswith('.brdb'):
+    if (os.path.isfile(db_path) or segment.is_segmented(db_path)) and \
+            db_path.endswith('.brdb'):
         return True
     else:
         return False
@@ -101,7 +185,18 @@ def remove_db(db_path):
         if not is_brdb(db_path):
             raise Exception('Not a breezedb database: %s' % db_path)
 
-        os.remove(db_path)
+        if segment.is_segmented(db_path):
+            shutil.rmtree(db_path)
+        else:
+            os.remove(db_path)
+
+        if journal.is_enabled(db_path):
+            os.remove(journal.log_path(db_path))
+
+        if os.path.isfile(filelock.lock_path(db_path)):
+            os.remove(filelock.lock_path(db_path))
+
+        parser.clear_cache(db_path)
 
     except IOError as e:
         raise e
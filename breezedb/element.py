@@ -28,9 +28,11 @@
 """
 
 import codecs
-from table import exists_table
+from itertools import izip
+from table import exists_table, get_row
 from field import DTYPES, get_field_type
-import parser
+from predicate import Predicate
+import index, parser
 
 def create_row(element_list, table_name, db_path):
     """ Creates a row of elements in the given table.
@@ -50,33 +52,19 @@ def create_row(element_list, table_name, db_path):
         :raises KeyError: invalid key
         :raises OSError: error writing to database
         :raises TypeError: data type error
-        :raises Exception: table does not exist
+        :raises Exception: table does not exist, duplicate primary key
     """
     try:
         if not exists_table(table_name, db_path):
             raise Exception('Table %s does not exist', table_name)
 
         db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        converters = _build_converters(parser.definition(db_data,
+                table)['fields'])
 
-        if len(element_list) != len(
-                db_data[codecs.decode(table_name, 'utf-8')]['fields']):
-            raise Exception('Number of elements is not equal to the number of available fields')
-        new_row = {}
-        for index, f in enumerate(
-                db_data[codecs.decode(table_name, 'utf-8')]['fields']):
-            if element_list[index] == "":
-                new_row[f.keys()[0]] = ""
-            elif f.values()[0] == 'str':
-                new_row[f.keys()[0]] = codecs.decode(element_list[index], 'utf-8')
-            elif f.values()[0] == 'int' or f.values()[0] == 'bool':
-                # Boolean values a represented with 0 or 1
-                new_row[f.keys()[0]] = int(element_list[index])
-            elif f.values()[0] == 'float':
-                new_row[f.keys()[0]] = float(element_list[index])
-
-        db_data[codecs.decode(table_name, 'utf-8')]['rows'].append(new_row)
-
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['create_row', table,
+                _convert_row(element_list, converters)])
 
     except IndexError as e:
         raise e
@@ -91,6 +79,51 @@ def create_row(element_list, table_name, db_path):
     except ValueError as e:
         raise e
 
+def create_rows(element_lists, table_name, db_path):
+    """ Creates several rows of elements in the given table at once.
+
+        The elements of every row are validated and converted before
+        changing the table, so either all the rows are added or none of
+        them is, and the database is written only once.
+
+        :param element_lists: iterable of element lists, each one following
+            the rules of :func:`create_row`. It may be a generator
+        :param str table_name: name of the table that will contain the rows
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises TypeError: data type error
+        :raises ValueError: element cannot be converted to the field type
+        :raises Exception: table does not exist, invalid number of
+            elements, duplicate primary key
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        converters = _build_converters(parser.definition(db_data,
+                table)['fields'])
+
+        rows = [_convert_row(element_list, converters)
+                for element_list in element_lists]
+        if rows:
+            parser.update(db_path, db_data, ['create_rows', table, rows])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except TypeError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
 def empty_element(index, field_name, table_name, db_path):
     """ Empty the content of a specific element.
 
@@ -114,9 +147,9 @@ def empty_element(index, field_name, table_name, db_path):
             raise Exception('Row %i does not exist' % index)
 
         db_data = parser.read(db_path)
-        db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                [codecs.decode(field_name, 'utf-8')] = ""
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['modify_element',
+                codecs.decode(table_name, 'utf-8'), index,
+                codecs.decode(field_name, 'utf-8'), ""])
 
     except IndexError as e:
         raise e
@@ -164,6 +197,33 @@ def exists_row(index, table_name, db_path):
     except TypeError as e:
         raise e
 
+def exists_row_id(row_id, table_name, db_path):
+    """ Check if a row with the given id exists in the table (see
+        :func:`table.enable_row_ids`).
+
+        :param int row_id: id to check
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :returns: True or False
+
+        :raises IOError: cannot open file
+        :raises Exception: table does not exist or has no row ids
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = db_data[codecs.decode(table_name, 'utf-8')]
+            if 'row_ids' not in table:
+                raise Exception('Table %s has no row ids' % table_name)
+
+            return index.find_id(table, row_id) is not None
+
+    except IOError as e:
+        raise e
+
 def get_element_data(index, field_name, table_name, db_path):
     """ Get the data contained in a specific element.
 
@@ -183,9 +243,10 @@ def get_element_data(index, field_name, table_name, db_path):
         if not exists_row(index, table_name, db_path):
             raise Exception('Row %i does not exist' % index)
 
-        db_data = parser.read(db_path)
-        return db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                [codecs.decode(field_name, 'utf-8')]
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            return db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
+                    [codecs.decode(field_name, 'utf-8')]
 
     except IndexError as e:
         raise e
@@ -196,6 +257,74 @@ def get_element_data(index, field_name, table_name, db_path):
     except TypeError as e:
         raise e
 
+def get_row_by_key(key, table_name, db_path):
+    """ Get the elements located in a row of the table from its primary
+        key (see :func:`field.create_field`).
+
+        :param key: primary key of the row. Strings are converted to the
+            data type of the key
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :returns: list containing the data of the row, ordered by field
+
+        :raises IOError: cannot open file
+        :raises ValueError: key cannot be converted to the field type
+        :raises Exception: table does not exist or has no primary key, row
+            does not exist
+    """
+    try:
+        with parser.reading(db_path):
+            position = _find_key(key, table_name, db_path)
+            if position is None:
+                raise Exception('Row with key %s does not exist' % key)
+
+            return get_row(position, table_name, db_path)
+
+    except IOError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
+def modify_by_key(key, field_name, table_name, db_path, new_content):
+    """ Modify the content of an element of a row found from its primary
+        key (see :func:`field.create_field`).
+
+        :param key: primary key of the row. Strings are converted to the
+            data type of the key
+        :param str field_name: name of the field that contains the element
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :param str new_content: new content to store in the element
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises ValueError: content cannot be converted to the field type
+        :raises Exception: table does not exist or has no primary key, row
+            does not exist, duplicate primary key
+    """
+    try:
+        if _find_key(key, table_name, db_path) is None:
+            raise Exception('Row with key %s does not exist' % key)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        f_type = get_field_type(field_name, table_name, db_path)
+        value = "" if new_content == "" else CONVERTERS[f_type](new_content)
+
+        parser.update(db_path, db_data, ['modify_by_key', table,
+                _convert_key(parser.definition(db_data, table), key),
+                codecs.decode(field_name, 'utf-8'), value])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
 def modify_element(index, field_name, table_name, db_path, new_content):
     """ Modify the content of an element.
 
@@ -220,21 +349,18 @@ def modify_element(index, field_name, table_name, db_path, new_content):
         f_type = get_field_type(field_name, table_name, db_path)
 
         if new_content == "":
-            db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                    [codecs.decode(field_name, 'utf-8')] = ""
+            value = ""
         elif f_type == 'str':
-            db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                    [codecs.decode(field_name, 'utf-8')] =\
-                    codecs.decode(new_content, 'utf-8')
+            value = codecs.decode(new_content, 'utf-8')
         elif f_type == 'int' or f_type == 'bool':
             # Boolean values a represented with 0 or 1
-            db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                    [codecs.decode(field_name, 'utf-8')] = int(new_content)
+            value = int(new_content)
         elif f_type == 'float':
-            db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]\
-                    [codecs.decode(field_name, 'utf-8')] = float(new_content)
+            value = float(new_content)
 
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['modify_element',
+                codecs.decode(table_name, 'utf-8'), index,
+                codecs.decode(field_name, 'utf-8'), value])
 
     except IndexError as e:
         raise e
@@ -247,6 +373,57 @@ def modify_element(index, field_name, table_name, db_path, new_content):
     except TypeError as e:
         raise e
 
+def modify_where(predicate, new_contents, table_name, db_path):
+    """ Modify the elements of every row that matches a predicate, in a
+        single pass over the table and writing the database only once.
+
+        :param str predicate: condition the rows must match, see
+            :class:`predicate.Predicate`
+        :param dict new_contents: new content to store in the elements of
+            each field, by field name
+        :param str table_name: name of the table that contains the rows
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises ValueError: content cannot be converted to the field type
+        :raises Exception: table or field does not exist, invalid
+            predicate, duplicate primary key
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        fields = parser.definition(db_data, table)['fields']
+        text = codecs.decode(predicate, 'utf-8')
+        Predicate(text, fields)
+
+        converters = dict(_build_converters(fields))
+        values = {}
+        for field_name, new_content in new_contents.iteritems():
+            field = codecs.decode(field_name, 'utf-8')
+            if field not in converters:
+                raise Exception('Field %s does not exist' % field_name)
+
+            values[field] = ("" if new_content == "" else
+                    converters[field](new_content))
+
+        if values:
+            parser.update(db_path, db_data,
+                    ['modify_where', table, text, values])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
 def remove_row(index, table_name, db_path):
     """ Remove an element row from the specified table.
 
@@ -266,8 +443,8 @@ def remove_row(index, table_name, db_path):
             raise Exception('Row %i does not exist' % index)
 
         db_data = parser.read(db_path)
-        del db_data[codecs.decode(table_name, 'utf-8')]['rows'][index]
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data,
+                ['remove_row', codecs.decode(table_name, 'utf-8'), index])
 
     except IndexError as e:
         raise e
@@ -280,3 +457,229 @@ def remove_row(index, table_name, db_path):
     except TypeError as e:
         raise e
 
+def remove_row_by_id(row_id, table_name, db_path):
+    """ Remove an element row from the specified table from its id (see
+        :func:`table.enable_row_ids`).
+
+        Unlike indexes, the ids of the rest of the rows do not change.
+
+        :param int row_id: id of the row to remove
+        :param str table_name: name of the table that contains the row
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: row does not exist
+        :raises OSError: error writing to database
+        :raises Exception: table does not exist or has no row ids, row
+            does not exist
+    """
+    try:
+        if not exists_row_id(row_id, table_name, db_path):
+            raise Exception('Row with id %i does not exist' % row_id)
+
+        db_data = parser.read(db_path)
+        parser.update(db_path, db_data, ['remove_row_by_id',
+                codecs.decode(table_name, 'utf-8'), row_id])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+
+def remove_rows(indexes, table_name, db_path):
+    """ Remove several rows from the specified table at once.
+
+        Every index refers to the rows as they were before removing any of
+        them, and the rows are removed in a single pass over the table,
+        writing the database only once.
+
+        :param indexes: iterable of indexes of the rows to remove
+        :param str table_name: name of the table that contains the rows
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises TypeError: invalid index type
+        :raises Exception: table does not exist, row does not exist
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        count = len(db_data[table]['rows'])
+
+        positions = sorted(set(indexes))
+        for position in positions:
+            if position < 0 or position >= count:
+                raise Exception('Row %i does not exist' % position)
+
+        if positions:
+            parser.update(db_path, db_data, ['remove_rows', table, positions])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except TypeError as e:
+        raise e
+
+def remove_where(predicate, table_name, db_path):
+    """ Remove every row that matches a predicate, in a single pass over
+        the table and writing the database only once.
+
+        :param str predicate: condition the rows must match, see
+            :class:`predicate.Predicate`
+        :param str table_name: name of the table that contains the rows
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises ValueError: value cannot be converted to the field type
+        :raises Exception: table or field does not exist, invalid predicate
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        text = codecs.decode(predicate, 'utf-8')
+        Predicate(text, parser.definition(db_data, table)['fields'])
+
+        parser.update(db_path, db_data, ['remove_where', table, text])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
+def upsert_row(element_list, table_name, db_path):
+    """ Create a row, or replace the elements of the row with the same
+        primary key if there is one (see :func:`field.create_field`).
+
+        :param element_list: list of elements, following the rules of
+            :func:`create_row`
+        :param str table_name: name of the table that contains the row
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises ValueError: element cannot be converted to the field type
+        :raises Exception: table does not exist or has no primary key,
+            invalid number of elements
+    """
+    upsert_rows([element_list], table_name, db_path)
+
+def upsert_rows(element_lists, table_name, db_path):
+    """ Create or replace several rows at once, see :func:`upsert_row`.
+        The database is written only once.
+
+        :param element_lists: iterable of element lists. It may be a
+            generator
+        :param str table_name: name of the table that contains the rows
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises KeyError: invalid key
+        :raises OSError: error writing to database
+        :raises ValueError: element cannot be converted to the field type
+        :raises Exception: table does not exist or has no primary key,
+            invalid number of elements
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        definition = parser.definition(db_data, table)
+        if 'primary_key' not in definition:
+            raise Exception('Table %s has no primary key' % table_name)
+
+        converters = _build_converters(definition['fields'])
+        rows = [_convert_row(element_list, converters)
+                for element_list in element_lists]
+        if rows:
+            parser.update(db_path, db_data, ['upsert_rows', table, rows])
+
+    except IOError as e:
+        raise e
+    except KeyError as e:
+        raise e
+    except OSError as e:
+        raise e
+    except ValueError as e:
+        raise e
+
+def _build_converters(fields):
+    """ Build a (field name, converter) tuple for each field of a table. """
+    return tuple((f.keys()[0], CONVERTERS[f.values()[0]]) for f in fields)
+
+def _convert_key(definition, key):
+    """ Convert a string key to the data type of the primary key of a
+        table.
+    """
+    if not isinstance(key, str) or key == "":
+        return key
+
+    for f in definition['fields']:
+        if definition['primary_key'] in f:
+            return CONVERTERS[f.values()[0]](key)
+
+def _convert_row(element_list, converters):
+    """ Convert a list of elements to a row using the converters of the
+        fields of its table.
+    """
+    if len(element_list) != len(converters):
+        raise Exception('Number of elements is not equal to the number of available fields')
+
+    row = {}
+    for (name, convert), element in izip(converters, element_list):
+        row[name] = "" if element == "" else convert(element)
+
+    return row
+
+def _decode_str(element):
+    """ Convert an element to unicode. """
+    return codecs.decode(element, 'utf-8')
+
+def _find_key(key, table_name, db_path):
+    """ Find the index of a row from its primary key, or None if there is
+        no such row.
+    """
+    if not exists_table(table_name, db_path):
+        raise Exception('Table %s does not exist' % table_name)
+
+    db_data = parser.read(db_path)
+    table = db_data[codecs.decode(table_name, 'utf-8')]
+    if 'primary_key' not in table:
+        raise Exception('Table %s has no primary key' % table_name)
+
+    key = _convert_key(table, key)
+    positions = index.lookup(table, table['primary_key'], key)
+    if key == "" or not positions:
+        return None
+
+    return positions[0]
+
+# Conversion of elements by data type. Boolean values are represented with
+# 0 or 1
+CONVERTERS = {
+    'str': _decode_str,
+    'int': int,
+    'bool': int,
+    'float': float
+}
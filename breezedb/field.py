@@ -28,25 +28,35 @@
 """
 
 import codecs
+from itertools import chain
 from table import exists_table
-import parser
+import index, parser
 
 DTYPES = ['str', 'int', 'float', 'bool']
 
-def create_field(field_name, field_type, table_name, db_path):
+def create_field(field_name, field_type, table_name, db_path,
+        primary_key=False):
     """ Create a new field in the table.
 
         Adds the empty field to already existing rows.
 
+        The primary key of a table identifies its rows: two rows cannot have
+        the same non-empty key, and rows can be found, modified or replaced
+        from their key (see :func:`element.get_row_by_key`). The key has a
+        hash index that cannot be removed.
+
         :param str field_name: name for the new field
         :param str field_type: data type, available types are 'str', 'int',
             'float', 'bool'
         :param str table_name: name of the table that will contain the field
         :param str db_path: path to the database
+        :param Boolean primary_key: whether the field is the primary key of
+            the table
 
         :raises IOError: cannot open file
         :raises OSError: error writing to database
-        :raises Exception: field already exists, not a valid data type
+        :raises Exception: field already exists, not a valid data type,
+            table already has a primary key
     """
     try:
         if exists_field(field_name, table_name, db_path):
@@ -55,13 +65,18 @@ def create_field(field_name, field_type, table_name, db_path):
             raise Exception('Invalid data type %s' % field_type)
 
         db_data = parser.read(db_path)
-        db_data[codecs.decode(table_name, 'utf-8')]['fields'].append(
-                {codecs.decode(field_name, 'utf-8'):field_type})
+        table = codecs.decode(table_name, 'utf-8')
+        record = ['create_field', table, codecs.decode(field_name, 'utf-8'),
+                field_type]
+
+        if primary_key:
+            if 'primary_key' in parser.definition(db_data, table):
+                raise Exception('Table %s already has a primary key' %
+                        table_name)
 
-        for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
-            row[codecs.decode(field_name, 'utf-8')] = ""
+            record.append(True)
 
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, record)
 
     except IOError as e:
         raise e
@@ -70,6 +85,53 @@ def create_field(field_name, field_type, table_name, db_path):
     except TypeError as e:
         raise e
 
+def create_index(field_name, table_name, db_path, index_type='hash'):
+    """ Create an index on a field of the table.
+
+        A hash index is used when searching the field for a number (see
+        :func:`table.search_data`). An ordered index is used to search a
+        range of elements or a prefix, sort the rows and get the smallest
+        or largest element of the field (see :func:`table.search_range`,
+        :func:`table.search_prefix`, :func:`table.sort_data`,
+        :func:`get_field_min` and :func:`get_field_max`). A trigram index
+        is used when searching the string elements of the field for a text
+        of at least three characters (see :func:`table.search_data`), so
+        that only the rows containing all of its trigrams are checked,
+        regardless of their case.
+
+        Only the declaration of the index is stored in the database. The
+        index is built in memory when the same parsed rows are searched a
+        second time, see :func:`index.get`.
+
+        :param str field_name: name of the field to index
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :param str index_type: type of the index, available types are
+            'hash', 'ordered' and 'trigram'
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: field does not exist, index already exists, not
+            a valid index type
+    """
+    try:
+        if not exists_field(field_name, table_name, db_path):
+            raise Exception('Field %s does not exist' % field_name)
+        elif index_type not in index.INDEX_TYPES:
+            raise Exception('Invalid index type %s' % index_type)
+        elif index_type in get_index_list(field_name, table_name, db_path):
+            raise Exception('Index on field %s already exists' % field_name)
+
+        db_data = parser.read(db_path)
+        parser.update(db_path, db_data, ['create_index',
+                codecs.decode(table_name, 'utf-8'),
+                codecs.decode(field_name, 'utf-8'), index_type])
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
+
 def empty_field_row(index, field_name, table_name, db_path):
     """ Empty the contents of a field on a single row of the table.
 
@@ -88,9 +150,9 @@ def empty_field_row(index, field_name, table_name, db_path):
             raise Exception('Field %s does not exist' % field_name)
 
         db_data = parser.read(db_path)
-        db_data[codecs.decode(table_name, 'utf-8')]['rows']\
-                [index][codecs.decode(field_name, 'utf-8')] = ""
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['modify_element',
+                codecs.decode(table_name, 'utf-8'), index,
+                codecs.decode(field_name, 'utf-8'), ""])
 
     except IndexError as e:
         raise e
@@ -115,11 +177,9 @@ def empty_field_table(field_name, table_name, db_path):
             raise Exception('Field %s does not exist' % field_name)
 
         db_data = parser.read(db_path)
-
-        for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
-            row[codecs.decode(field_name, 'utf-8')] = ""
-
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['empty_field',
+                codecs.decode(table_name, 'utf-8'),
+                codecs.decode(field_name, 'utf-8')])
 
     except IOError as e:
         raise e
@@ -142,7 +202,8 @@ def exists_field(field_name, table_name, db_path):
 
         db_data = parser.read(db_path)
 
-        for f in db_data[codecs.decode(table_name, 'utf-8')]['fields']:
+        for f in parser.definition(db_data,
+                codecs.decode(table_name, 'utf-8'))['fields']:
             if field_name.decode('utf-8') in f:
                 return True
 
@@ -151,6 +212,22 @@ def exists_field(field_name, table_name, db_path):
     except IOError as e:
         raise e
 
+def get_field_avg(field_name, table_name, db_path):
+    """ Get the average of the elements of a numeric field, ignoring empty
+        elements. The elements are read in a single pass, see
+        :func:`get_field_sum`.
+
+        :param str field_name: name of the field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :returns: average as a float, or None if every element is empty
+
+        :raises IOError: cannot open file
+        :raises Exception: field does not exist or is not numeric
+    """
+    total, count = _get_field_total(field_name, table_name, db_path)
+    return float(total) / count if count else None
+
 def get_field_data(field_name, table_name, db_path):
     """ Get the data contained in the field for every row in the table.
 
@@ -168,19 +245,73 @@ def get_field_data(field_name, table_name, db_path):
         if not exists_field(field_name, table_name, db_path):
             raise Exception('Field %s does not exist' % field_name)
 
-        db_data = parser.read(db_path)
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
 
-        datalist = []
-        for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
-            datalist.append(row[codecs.decode(field_name, 'utf-8')])
+            datalist = []
+            for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
+                datalist.append(row[codecs.decode(field_name, 'utf-8')])
 
-        return datalist
+            return datalist
 
     except IOError as e:
         raise e
     except KeyError as e:
         raise e
 
+def get_field_max(field_name, table_name, db_path):
+    """ Get the largest element of the field, ignoring empty elements.
+
+        Uses the end of the ordered index of the field if it has one, once
+        it is built (see :func:`index.get`). Otherwise, the elements are
+        read in a single pass, see :func:`table.iter_rows`.
+
+        :param str field_name: name of the field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :returns: largest element, or None if every element is empty
+
+        :raises IOError: cannot open file
+        :raises ValueError: the rows stored in the file are corrupt
+        :raises Exception: field does not exist
+    """
+    return _get_field_end(field_name, table_name, db_path, max)
+
+def get_field_min(field_name, table_name, db_path):
+    """ Get the smallest element of the field, ignoring empty elements.
+
+        Uses the start of the ordered index of the field if it has one, once
+        it is built (see :func:`index.get`). Otherwise, the elements are
+        read in a single pass, see :func:`table.iter_rows`.
+
+        :param str field_name: name of the field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :returns: smallest element, or None if every element is empty
+
+        :raises IOError: cannot open file
+        :raises ValueError: the rows stored in the file are corrupt
+        :raises Exception: field does not exist
+    """
+    return _get_field_end(field_name, table_name, db_path, min)
+
+def get_field_sum(field_name, table_name, db_path):
+    """ Get the sum of the elements of a numeric field, ignoring empty
+        elements.
+
+        The elements are read one at a time (see :func:`table.iter_rows`),
+        so formats that store each field separately only decode this one.
+
+        :param str field_name: name of the field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :returns: sum of the elements, 0 if every element is empty
+
+        :raises IOError: cannot open file
+        :raises Exception: field does not exist or is not numeric
+    """
+    return _get_field_total(field_name, table_name, db_path)[0]
+
 def get_field_type(field_name, table_name, db_path):
     """ Get the data type contained in a specific field for parsing
         purposes.
@@ -200,7 +331,8 @@ def get_field_type(field_name, table_name, db_path):
 
         db_data = parser.read(db_path)
 
-        for f in db_data[codecs.decode(table_name, 'utf-8')]['fields']:
+        for f in parser.definition(db_data,
+                codecs.decode(table_name, 'utf-8'))['fields']:
             if field_name.decode('utf-8') in f:
                 return f.values()[0]
 
@@ -209,6 +341,31 @@ def get_field_type(field_name, table_name, db_path):
     except KeyError as e:
         raise e
 
+def get_index_list(field_name, table_name, db_path):
+    """ Get the types of the indexes created on a field of the table.
+
+        :param str field_name: name of the field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :returns: list of index types
+
+        :raises IOError: cannot open file
+        :raises Exception: field does not exist
+    """
+    try:
+        if not exists_field(field_name, table_name, db_path):
+            raise Exception('Field %s does not exist' % field_name)
+
+        db_data = parser.read(db_path)
+        definition = parser.definition(db_data,
+                codecs.decode(table_name, 'utf-8'))
+
+        return [index_type for name, index_type in index.declared(definition)
+                if name == field_name.decode('utf-8')]
+
+    except IOError as e:
+        raise e
+
 def rename_field(field_name, table_name, db_path, new_name):
     """ Rename a field.
 
@@ -231,20 +388,10 @@ def rename_field(field_name, table_name, db_path, new_name):
             raise Exception('Field %s already exists' % new_name)
 
         db_data = parser.read(db_path)
-
-        for index, field in enumerate(
-                db_data[codecs.decode(table_name, 'utf-8')]['fields']):
-            if field_name.decode('utf-8') == field:
-                db_data[codecs.decode(table_name, 'utf-8')]['fields'][index] =\
-                         codecs.decode(new_name, 'utf-8')
-                break
-
-        for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
-            row[codecs.decode(new_name, 'utf-8')] =\
-                    row[codecs.decode(field_name, 'utf-8')]
-            del row[codecs.decode(field_name, 'utf-8')]
-
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['rename_field',
+                codecs.decode(table_name, 'utf-8'),
+                codecs.decode(field_name, 'utf-8'),
+                codecs.decode(new_name, 'utf-8')])
 
     except IOError as e:
         raise e
@@ -270,17 +417,40 @@ def remove_field(field_name, table_name, db_path):
             raise Exception('Field %s does not exist' % field_name)
 
         db_data = parser.read(db_path)
+        parser.update(db_path, db_data, ['remove_field',
+                codecs.decode(table_name, 'utf-8'),
+                codecs.decode(field_name, 'utf-8')])
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
 
-        for index, f in enumerate(
-                db_data[codecs.decode(table_name, 'utf-8')]['fields']):
-            if field_name.decode('utf-8') in f.keys():
-                del db_data[codecs.decode(table_name, 'utf-8')]['fields'][index]
-                break
+def remove_index(field_name, table_name, db_path, index_type='hash'):
+    """ Remove an index of a field of the table.
+
+        :param str field_name: name of the indexed field
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :param str index_type: type of the index
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: index does not exist, index of the primary key
+    """
+    try:
+        if index_type not in get_index_list(field_name, table_name, db_path):
+            raise Exception('Index on field %s does not exist' % field_name)
 
-        for row in db_data[codecs.decode(table_name, 'utf-8')]['rows']:
-            del row[codecs.decode(field_name, 'utf-8')]
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        field = codecs.decode(field_name, 'utf-8')
+        if (index_type == index.HASH and
+                parser.definition(db_data, table).get('primary_key') == field):
+            raise Exception('Field %s is the primary key' % field_name)
 
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['remove_index', table, field,
+                index_type])
 
     except IOError as e:
         raise e
@@ -307,11 +477,8 @@ def swap_fields(index1, index2, table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
         db_data = parser.read(db_path)
-        temp = db_data[codecs.decode(table_name, 'utf-8')]['fields'][index1]
-        db_data[codecs.decode(table_name, 'utf-8')]['fields'][index1] =\
-                db_data[codecs.decode(table_name, 'utf-8')]['fields'][index2]
-        db_data[codecs.decode(table_name, 'utf-8')]['fields'][index2] = temp
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['swap_fields',
+                codecs.decode(table_name, 'utf-8'), index1, index2])
 
     except IndexError as e:
         raise e
@@ -322,3 +489,65 @@ def swap_fields(index1, index2, table_name, db_path):
     except TypeError as e:
         raise e
 
+def _get_field_end(field_name, table_name, db_path, end):
+    """ Get the smallest or largest element of the field, where `end` is
+        either :func:`min` or :func:`max`.
+    """
+    try:
+        if not exists_field(field_name, table_name, db_path):
+            raise Exception('Field %s does not exist' % field_name)
+
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = codecs.decode(table_name, 'utf-8')
+            field = codecs.decode(field_name, 'utf-8')
+
+            if (field, index.ORDERED) in index.declared(
+                    parser.definition(db_data, table)):
+                ordered = index.get(db_data[table], field, index.ORDERED,
+                        True)
+                if ordered is not None:
+                    return ordered.min() if end is min else ordered.max()
+
+            elements = _iter_elements(db_path, table, field)
+            for first in elements:
+                return end(chain([first], elements))
+
+            # Every element is empty
+            return None
+
+    except IOError as e:
+        raise e
+
+def _get_field_total(field_name, table_name, db_path):
+    """ Get the sum and the number of the non-empty elements of a numeric
+        field.
+    """
+    try:
+        if not exists_field(field_name, table_name, db_path):
+            raise Exception('Field %s does not exist' % field_name)
+
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = codecs.decode(table_name, 'utf-8')
+            field = codecs.decode(field_name, 'utf-8')
+            for f in parser.definition(db_data, table)['fields']:
+                if f.get(field) == 'str':
+                    raise Exception('Field %s is not numeric' % field_name)
+
+            total = count = 0
+            for element in _iter_elements(db_path, table, field):
+                total += element
+                count += 1
+
+            return total, count
+
+    except IOError as e:
+        raise e
+
+def _iter_elements(db_path, table_name, field_name):
+    """ Iterate over the non-empty elements of a field without loading its
+        table, if possible.
+    """
+    return (row[field_name] for row in parser.iter_rows(db_path, table_name,
+            [field_name]) if row[field_name] != "")
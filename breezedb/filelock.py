@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+
+"""
+.. module:: filelock
+    :platform: Unix, Windows
+    :synopsis: Readers-writer locks on databases.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import errno, os, thread, threading, time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where only the threads of the same process
+    # are coordinated
+    fcntl = None
+
+# Suffix of the lock file created next to each database
+LOCK_SUFFIX = '.lock'
+
+# Seconds to wait for a lock before giving up. None waits forever
+LOCK_TIMEOUT = 30.0
+
+# Longest pause between attempts to lock a file held by another process,
+# in seconds
+POLL_INTERVAL = 0.05
+
+_locks = {}
+_locks_lock = threading.Lock()
+_stats = {'acquired': 0, 'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0,
+        'timeouts': 0}
+
+class FileLock(object):
+    """ Readers-writer lock on a database.
+
+        Any number of threads may hold the lock shared in order to read the
+        database, while writing requires holding it exclusively. The same
+        lock is enforced between processes with an advisory lock (`flock`)
+        on the lock file, which is only held while some thread of the
+        process holds the lock.
+
+        The thread holding the lock exclusively may acquire it again, either
+        shared or exclusively, and threads holding it shared may acquire it
+        shared again. Upgrading a shared lock is not supported. Writers are
+        preferred: while a thread waits to acquire the lock exclusively, new
+        readers wait as well, so that a steady stream of readers cannot
+        starve it.
+
+        :arg str path: path to the lock file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.reading = {}
+        self.writers = 0
+        self.owner = None
+        self.depth = 0
+        self.locking = False
+        self.fd = None
+
+    def acquire(self, exclusive=False, timeout=None):
+        """ Acquire the lock, waiting until it is available.
+
+            :param Boolean exclusive: whether to acquire the lock for
+                writing
+            :param float timeout: seconds to wait. If None is specified,
+                :data:`LOCK_TIMEOUT` is used
+
+            :raises Exception: timed out waiting for the lock
+        """
+        if timeout is None:
+            timeout = LOCK_TIMEOUT
+
+        me = thread.get_ident()
+        start = time.time()
+        deadline = None if timeout is None else start + timeout
+        waited = False
+
+        with self.condition:
+            while True:
+                if self.owner == me:
+                    self.depth += 1
+                    return
+
+                if not self.locking and self.owner is None:
+                    if not exclusive and self.readers and (not self.writers
+                            or me in self.reading):
+                        # The file is already locked shared by this process.
+                        # Threads already reading may always read again, as
+                        # waiting for the writer would never end
+                        self._add_reader(me)
+                        _record(start, waited)
+                        return
+                    elif not self.readers and (exclusive or
+                            not self.writers):
+                        self.locking = True
+                        break
+
+                if deadline is not None and time.time() >= deadline:
+                    if exclusive:
+                        # Readers may be waiting for this writer
+                        self.condition.notify_all()
+                    _record(start, True, True)
+                    raise Exception('Timed out waiting for lock %s' %
+                            self.path)
+
+                waited = True
+                if exclusive:
+                    self.writers += 1
+                try:
+                    self.condition.wait(None if deadline is None else
+                            max(deadline - time.time(), 0))
+                finally:
+                    if exclusive:
+                        self.writers -= 1
+
+        try:
+            fd, blocked = self._lock_file(exclusive, deadline)
+        except:
+            with self.condition:
+                self.locking = False
+                self.condition.notify_all()
+            _record(start, True, True)
+            raise
+
+        with self.condition:
+            self.locking = False
+            self.fd = fd
+            if exclusive:
+                self.owner = me
+                self.depth = 1
+            else:
+                self._add_reader(me)
+            self.condition.notify_all()
+
+        _record(start, waited or blocked)
+
+    def release(self):
+        """ Release the lock acquired by the current thread. """
+        me = thread.get_ident()
+        with self.condition:
+            if self.owner == me:
+                self.depth -= 1
+                if self.depth:
+                    return
+                self.owner = None
+            else:
+                self.readers -= 1
+                self.reading[me] -= 1
+                if not self.reading[me]:
+                    del self.reading[me]
+                if self.readers:
+                    return
+
+            if self.fd is not None:
+                # Closing the file releases the advisory lock
+                os.close(self.fd)
+                self.fd = None
+            self.condition.notify_all()
+
+    def _add_reader(self, me):
+        """ Count a thread as holding the lock shared once more. Must be
+            called with the condition held.
+        """
+        self.readers += 1
+        self.reading[me] = self.reading.get(me, 0) + 1
+
+    def _lock_file(self, exclusive, deadline):
+        """ Lock the lock file, polling until the deadline if another
+            process holds it.
+
+            :returns: tuple with the file descriptor, or None if files
+                cannot be locked, and whether the lock was held by another
+                process
+        """
+        if fcntl is None:
+            return None, False
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0666)
+        except OSError:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                # Read-only location without a lock file
+                return None, False
+
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        delay = 0.001
+        blocked = False
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return fd, blocked
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    os.close(fd)
+                    raise
+
+            if deadline is not None and time.time() >= deadline:
+                os.close(fd)
+                raise Exception('Timed out waiting for lock %s' % self.path)
+
+            blocked = True
+            time.sleep(delay if deadline is None else
+                    max(min(delay, deadline - time.time()), 0))
+            delay = min(delay * 2, POLL_INTERVAL)
+
+def exclusive(db_path, timeout=None):
+    """ Hold the lock of a database exclusively, in order to write it.
+
+        >>> with filelock.exclusive('/path/to/db.brdb'):
+        ...     pass
+
+        :param str db_path: path to the database
+        :param float timeout: seconds to wait. If None is specified,
+            :data:`LOCK_TIMEOUT` is used
+        :returns: context manager
+
+        :raises Exception: timed out waiting for the lock
+    """
+    return _holding(get_lock(db_path), True, timeout)
+
+def get_lock(db_path):
+    """ Get the lock of a database, shared by the whole process.
+
+        :param str db_path: path to the database
+        :returns: :class:`FileLock` object
+    """
+    key = os.path.abspath(db_path)
+    with _locks_lock:
+        if key not in _locks:
+            _locks[key] = FileLock(lock_path(key))
+
+        return _locks[key]
+
+def get_lock_info():
+    """ Get the statistics of the database locks of the process.
+
+        :returns: dictionary with the number of locks `acquired`, the number
+            of acquisitions that had to wait (`waits`), the total and
+            longest time spent waiting in seconds (`wait_time` and
+            `max_wait`), the number of `timeouts` and the current `timeout`
+    """
+    with _locks_lock:
+        info = dict(_stats)
+
+    info['timeout'] = LOCK_TIMEOUT
+    return info
+
+def lock_path(db_path):
+    """ Get the path to the lock file of a database.
+
+        :param str db_path: path to the database
+        :returns: path to the lock file
+    """
+    return db_path + LOCK_SUFFIX
+
+def set_lock_timeout(timeout):
+    """ Set how long to wait for a lock before giving up.
+
+        :param float timeout: seconds to wait, or None to wait forever
+    """
+    global LOCK_TIMEOUT
+    LOCK_TIMEOUT = timeout
+
+def shared(db_path, timeout=None):
+    """ Hold the lock of a database shared, in order to read it.
+
+        :param str db_path: path to the database
+        :param float timeout: seconds to wait. If None is specified,
+            :data:`LOCK_TIMEOUT` is used
+        :returns: context manager
+
+        :raises Exception: timed out waiting for the lock
+    """
+    return _holding(get_lock(db_path), False, timeout)
+
+@contextmanager
+def _holding(lock, exclusive, timeout):
+    """ Hold a lock for the duration of a ``with`` block. """
+    lock.acquire(exclusive, timeout)
+    try:
+        yield
+    finally:
+        lock.release()
+
+def _record(start, waited, timed_out=False):
+    """ Update the statistics after trying to acquire a lock. """
+    with _locks_lock:
+        if timed_out:
+            _stats['timeouts'] += 1
+        else:
+            _stats['acquired'] += 1
+
+        if waited:
+            wait = time.time() - start
+            _stats['waits'] += 1
+            _stats['wait_time'] += wait
+            _stats['max_wait'] = max(_stats['max_wait'], wait)
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: handle
+    :platform: Unix, Windows
+    :synopsis: Persistent database handles.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import os, threading
+from contextlib import contextmanager
+import db, element, field, filelock, journal, parser, table
+
+# Shared databases, by absolute path
+_shared = {}
+_shared_lock = threading.Lock()
+
+class Database(object):
+    """ Persistent handle to a database.
+
+        The database is parsed once when the handle is opened and every
+        operation works on the in-memory data. Changes are only written to
+        the file when calling :meth:`flush` or :meth:`close`, or when
+        leaving the ``with`` block if the handle is used as a context
+        manager.
+
+        While the handle is open, the module level functions operating on
+        the same path also use its in-memory data.
+
+        :arg str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises Exception: not a breezedb database, database already open
+    """
+
+    def __init__(self, db_path):
+        if not db.is_brdb(db_path):
+            raise Exception('Not a breezedb database: %s' % db_path)
+
+        self.db_path = db_path
+        with parser.lock(db_path):
+            self.data = parser.read(db_path)
+            self.signature = parser.get_signature(db_path)
+
+            # The handle owns the parsed data, so that reading the file
+            # meanwhile, for instance to compact it, does not see the
+            # changes that are not flushed yet
+            parser.clear_cache(db_path)
+        self.dirty = False
+        self.records = []
+        self.closed = False
+
+        parser.open_handle(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def flush(self):
+        """ Write pending changes to the database file.
+
+            :raises IOError: cannot open file
+            :raises OSError: error writing to database
+        """
+        self._flush()
+
+    def _flush(self, closing=False):
+        """ Write pending changes, flushing them to disk according to the
+            fsync policy of the parser.
+
+            If another process changed the database since it was read, the
+            pending change records are applied to the latest version
+            instead. Data replaced with :func:`parser.write` overwrites the
+            changes of other processes.
+        """
+        if not self.dirty:
+            return
+
+        with parser.lock(self.db_path):
+            if self.records is None:
+                parser.write_file(self.db_path, self.data, closing)
+            else:
+                if parser.get_signature(self.db_path) != self.signature:
+                    self.data = parser.read_file(self.db_path)
+                    for record in self.records:
+                        journal.apply(self.data, record)
+
+                parser.write_records(self.db_path, self.data, self.records,
+                        closing)
+
+            self.signature = parser.get_signature(self.db_path)
+            if not closing:
+                parser.clear_cache(self.db_path)
+
+        self.dirty = False
+        self.records = []
+
+    def close(self):
+        """ Flush pending changes and close the handle.
+
+            :raises IOError: cannot open file
+            :raises OSError: error writing to database
+        """
+        if self.closed:
+            return
+
+        try:
+            self._flush(True)
+        except:
+            parser.clear_cache(self.db_path)
+            raise
+        finally:
+            parser.close_handle(self.db_path)
+            self.closed = True
+
+    def discard(self):
+        """ Drop pending changes and close the handle. The database file is
+            left as it was when the handle was last flushed.
+        """
+        if self.closed:
+            return
+
+        parser.close_handle(self.db_path)
+        self.dirty = False
+        self.records = []
+        self.closed = True
+
+    # Database operations
+    def get_table_list(self):
+        """ See :func:`db.get_table_list`. """
+        return db.get_table_list(self.db_path)
+
+    # Table operations
+    def count_rows(self, table_name, where=None):
+        """ See :func:`table.count_rows`. """
+        return table.count_rows(table_name, self.db_path, where)
+
+    def create_table(self, table_name):
+        """ See :func:`table.create_table`. """
+        table.create_table(table_name, self.db_path)
+
+    def enable_row_ids(self, table_name):
+        """ See :func:`table.enable_row_ids`. """
+        table.enable_row_ids(table_name, self.db_path)
+
+    def exists_table(self, table_name):
+        """ See :func:`table.exists_table`. """
+        return table.exists_table(table_name, self.db_path)
+
+    def get_field_list(self, table_name):
+        """ See :func:`table.get_field_list`. """
+        return table.get_field_list(table_name, self.db_path)
+
+    def get_row(self, index, table_name, fields=None):
+        """ See :func:`table.get_row`. """
+        return table.get_row(index, table_name, self.db_path, fields)
+
+    def get_row_by_id(self, row_id, table_name):
+        """ See :func:`table.get_row_by_id`. """
+        return table.get_row_by_id(row_id, table_name, self.db_path)
+
+    def get_row_ids(self, table_name):
+        """ See :func:`table.get_row_ids`. """
+        return table.get_row_ids(table_name, self.db_path)
+
+    def get_row_list(self, table_name, where=None, fields=None):
+        """ See :func:`table.get_row_list`. """
+        return table.get_row_list(table_name, self.db_path, where, fields)
+
+    def iter_rows(self, table_name, fields=None):
+        """ See :func:`table.iter_rows`. """
+        return table.iter_rows(table_name, self.db_path, fields)
+
+    def rename_table(self, table_name, new_name):
+        """ See :func:`table.rename_table`. """
+        table.rename_table(table_name, self.db_path, new_name)
+
+    def remove_table(self, table_name):
+        """ See :func:`table.remove_table`. """
+        table.remove_table(table_name, self.db_path)
+
+    def search_data(self, data, table_name, field_name=None,
+            ignore_case=True):
+        """ See :func:`table.search_data`. """
+        return table.search_data(data, table_name, self.db_path, field_name,
+                ignore_case)
+
+    def search_prefix(self, prefix, table_name, field_name):
+        """ See :func:`table.search_prefix`. """
+        return table.search_prefix(prefix, table_name, self.db_path,
+                field_name)
+
+    def search_range(self, low, high, table_name, field_name):
+        """ See :func:`table.search_range`. """
+        return table.search_range(low, high, table_name, self.db_path,
+                field_name)
+
+    def sort_data(self, field_name, table_name, reverse=False):
+        """ See :func:`table.sort_data`. """
+        return table.sort_data(field_name, table_name, self.db_path, reverse)
+
+    # Field operations
+    def create_field(self, field_name, field_type, table_name,
+            primary_key=False):
+        """ See :func:`field.create_field`. """
+        field.create_field(field_name, field_type, table_name, self.db_path,
+                primary_key)
+
+    def create_index(self, field_name, table_name, index_type='hash'):
+        """ See :func:`field.create_index`. """
+        field.create_index(field_name, table_name, self.db_path, index_type)
+
+    def empty_field_row(self, index, field_name, table_name):
+        """ See :func:`field.empty_field_row`. """
+        field.empty_field_row(index, field_name, table_name, self.db_path)
+
+    def empty_field_table(self, field_name, table_name):
+        """ See :func:`field.empty_field_table`. """
+        field.empty_field_table(field_name, table_name, self.db_path)
+
+    def exists_field(self, field_name, table_name):
+        """ See :func:`field.exists_field`. """
+        return field.exists_field(field_name, table_name, self.db_path)
+
+    def get_field_avg(self, field_name, table_name):
+        """ See :func:`field.get_field_avg`. """
+        return field.get_field_avg(field_name, table_name, self.db_path)
+
+    def get_field_data(self, field_name, table_name):
+        """ See :func:`field.get_field_data`. """
+        return field.get_field_data(field_name, table_name, self.db_path)
+
+    def get_field_max(self, field_name, table_name):
+        """ See :func:`field.get_field_max`. """
+        return field.get_field_max(field_name, table_name, self.db_path)
+
+    def get_field_min(self, field_name, table_name):
+        """ See :func:`field.get_field_min`. """
+        return field.get_field_min(field_name, table_name, self.db_path)
+
+    def get_field_sum(self, field_name, table_name):
+        """ See :func:`field.get_field_sum`. """
+        return field.get_field_sum(field_name, table_name, self.db_path)
+
+    def get_field_type(self, field_name, table_name):
+        """ See :func:`field.get_field_type`. """
+        return field.get_field_type(field_name, table_name, self.db_path)
+
+    def get_index_list(self, field_name, table_name):
+        """ See :func:`field.get_index_list`. """
+        return field.get_index_list(field_name, table_name, self.db_path)
+
+    def rename_field(self, field_name, table_name, new_name):
+        """ See :func:`field.rename_field`. """
+        field.rename_field(field_name, table_name, self.db_path, new_name)
+
+    def remove_field(self, field_name, table_name):
+        """ See :func:`field.remove_field`. """
+        field.remove_field(field_name, table_name, self.db_path)
+
+    def remove_index(self, field_name, table_name, index_type='hash'):
+        """ See :func:`field.remove_index`. """
+        field.remove_index(field_name, table_name, self.db_path, index_type)
+
+    def swap_fields(self, index1, index2, table_name):
+        """ See :func:`field.swap_fields`. """
+        field.swap_fields(index1, index2, table_name, self.db_path)
+
+    # Element operations
+    def create_row(self, element_list, table_name):
+        """ See :func:`element.create_row`. """
+        element.create_row(element_list, table_name, self.db_path)
+
+    def create_rows(self, element_lists, table_name):
+        """ See :func:`element.create_rows`. """
+        element.create_rows(element_lists, table_name, self.db_path)
+
+    def empty_element(self, index, field_name, table_name):
+        """ See :func:`element.empty_element`. """
+        element.empty_element(index, field_name, table_name, self.db_path)
+
+    def exists_row(self, index, table_name):
+        """ See :func:`element.exists_row`. """
+        return element.exists_row(index, table_name, self.db_path)
+
+    def exists_row_id(self, row_id, table_name):
+        """ See :func:`element.exists_row_id`. """
+        return element.exists_row_id(row_id, table_name, self.db_path)
+
+    def get_element_data(self, index, field_name, table_name):
+        """ See :func:`element.get_element_data`. """
+        return element.get_element_data(index, field_name, table_name,
+                self.db_path)
+
+    def get_row_by_key(self, key, table_name):
+        """ See :func:`element.get_row_by_key`. """
+        return element.get_row_by_key(key, table_name, self.db_path)
+
+    def modify_by_key(self, key, field_name, table_name, new_content):
+        """ See :func:`element.modify_by_key`. """
+        element.modify_by_key(key, field_name, table_name, self.db_path,
+                new_content)
+
+    def modify_element(self, index, field_name, table_name, new_content):
+        """ See :func:`element.modify_element`. """
+        element.modify_element(index, field_name, table_name, self.db_path,
+                new_content)
+
+    def modify_where(self, predicate, new_contents, table_name):
+        """ See :func:`element.modify_where`. """
+        element.modify_where(predicate, new_contents, table_name,
+                self.db_path)
+
+    def remove_row(self, index, table_name):
+        """ See :func:`element.remove_row`. """
+        element.remove_row(index, table_name, self.db_path)
+
+    def remove_row_by_id(self, row_id, table_name):
+        """ See :func:`element.remove_row_by_id`. """
+        element.remove_row_by_id(row_id, table_name, self.db_path)
+
+    def remove_rows(self, indexes, table_name):
+        """ See :func:`element.remove_rows`. """
+        element.remove_rows(indexes, table_name, self.db_path)
+
+    def remove_where(self, predicate, table_name):
+        """ See :func:`element.remove_where`. """
+        element.remove_where(predicate, table_name, self.db_path)
+
+    def upsert_row(self, element_list, table_name):
+        """ See :func:`element.upsert_row`. """
+        element.upsert_row(element_list, table_name, self.db_path)
+
+    def upsert_rows(self, element_lists, table_name):
+        """ See :func:`element.upsert_rows`. """
+        element.upsert_rows(element_lists, table_name, self.db_path)
+
+class SharedDatabase(object):
+    """ Database shared by the threads of the process.
+
+        A single parsed copy of the database is kept in memory, pinned in
+        the cache of the parser, and access to it is coordinated with the
+        readers-writer lock of the database: any number of threads can read
+        it at the same time, while changes are serialized and wait for the
+        readers to finish. The copy is refreshed when the database is
+        changed by another process.
+
+        Shared databases are obtained with :func:`shared` rather than
+        created directly, and each of them must be closed with
+        :meth:`close` once it is no longer needed. Functions reading the
+        database already hold the lock shared, while holding the lock
+        around several operations keeps other threads from changing the
+        database in between:
+
+        >>> with breezedb.shared('/path/to/db.brdb') as database:
+        ...     with database.reading():
+        ...         rows = breezedb.get_row_list('table_1', database.db_path)
+        ...     with database.writing():
+        ...         breezedb.remove_row(0, 'table_1', database.db_path)
+
+        :arg str db_path: path to the database
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.users = 0
+        parser.pin(db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Release the shared database. Once every thread that obtained it
+            has closed it, the parsed data can be evicted from the cache
+            again.
+        """
+        with _shared_lock:
+            self.users -= 1
+            if self.users:
+                return
+
+            _shared.pop(os.path.abspath(self.db_path), None)
+            parser.unpin(self.db_path)
+
+    def read(self):
+        """ Get the parsed data of the database. The data must not be used
+            after releasing the lock.
+
+            :returns: data of the database
+
+            :raises IOError: cannot open file
+        """
+        return parser.read(self.db_path)
+
+    def reading(self):
+        """ Hold the lock of the database shared.
+
+            :returns: context manager
+
+            :raises Exception: timed out waiting for the lock
+        """
+        return filelock.shared(self.db_path)
+
+    def writing(self):
+        """ Hold the lock of the database exclusively.
+
+            :returns: context manager
+
+            :raises Exception: timed out waiting for the lock
+        """
+        return filelock.exclusive(self.db_path)
+
+def shared(db_path):
+    """ Get the shared database of a path, creating it if needed. Every
+        thread of the process gets the same object for the same database
+        until it is closed as many times as it was obtained.
+
+        :param str db_path: path to the database
+        :returns: :class:`SharedDatabase` object
+
+        :raises Exception: not a breezedb database
+    """
+    key = os.path.abspath(db_path)
+    with _shared_lock:
+        if key not in _shared:
+            if not db.is_brdb(db_path):
+                raise Exception('Not a breezedb database: %s' % db_path)
+
+            _shared[key] = SharedDatabase(db_path)
+
+        _shared[key].users += 1
+        return _shared[key]
+
+@contextmanager
+def transaction(db_path):
+    """ Group changes to a database so that they are written at once.
+
+        Changes made inside the ``with`` block, either through the returned
+        handle or through the module level functions, are applied to the
+        in-memory data and written when the block ends. If the block raises
+        an exception, every change is discarded and the database file is
+        not modified.
+
+        The lock of the database is held until the transaction ends, so
+        other threads and processes cannot change the database meanwhile.
+        If a handle is already open for the database, for instance in an
+        enclosing transaction, the transaction joins it and its changes are
+        written when that handle is flushed.
+
+        >>> with breezedb.transaction('/path/to/db.brdb') as tx:
+        ...     tx.create_field('id', 'int', 'table_1')
+        ...     tx.create_field('name', 'str', 'table_1')
+
+        :param str db_path: path to the database
+        :returns: :class:`Database` handle
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: not a breezedb database, timed out waiting for
+            the lock
+    """
+    with parser.lock(db_path):
+        handle = parser.get_handle(db_path)
+        if handle:
+            yield handle
+            return
+
+        handle = Database(db_path)
+        try:
+            yield handle
+        except:
+            handle.discard()
+            raise
+
+        handle.close()
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: index
+    :platform: Unix, Windows
+    :synopsis: Secondary indexes on the fields of a table.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import bisect
+
+# Index mapping each value of the field to the rows that contain it
+HASH = 'hash'
+
+# Index keeping the rows sorted by the value of the field
+ORDERED = 'ordered'
+
+# Index mapping each trigram of the field to the rows that contain it
+TRIGRAM = 'trigram'
+
+INDEX_TYPES = [HASH, ORDERED, TRIGRAM]
+
+# Number of removed rows, relative to the rows left, from which the map of
+# row ids is built again
+TOMBSTONE_RATIO = 0.125
+
+class HashIndex(dict):
+    """ Hash index of a field, mapping each value to the list of rows that
+        contain it, in ascending order.
+    """
+
+    def add(self, value, position):
+        """ Add a row to the index. """
+        positions = self.setdefault(value, [])
+        if positions and positions[-1] > position:
+            bisect.insort(positions, position)
+        else:
+            positions.append(position)
+
+    def discard(self, value, position):
+        """ Remove a row from the index. """
+        positions = self.get(value)
+        if positions is None:
+            return
+
+        positions.pop(bisect.bisect_left(positions, position))
+        if not positions:
+            del self[value]
+
+    def find(self, value):
+        """ Get the rows whose element is equal to a value. """
+        return list(self.get(value, []))
+
+    def shift(self, position):
+        """ Move back the rows that followed a removed row. """
+        for positions in self.itervalues():
+            for p in xrange(bisect.bisect(positions, position),
+                    len(positions)):
+                positions[p] -= 1
+
+class OrderedIndex(object):
+    """ Ordered index of a field, keeping the rows sorted by their element
+        and then by their position. Empty elements are not indexed.
+
+        :arg list pairs: (element, position) tuples of the rows, in any order
+    """
+
+    def __init__(self, pairs=()):
+        pairs = sorted(p for p in pairs if p[0] != "")
+        self.keys = [p[0] for p in pairs]
+        self.positions = [p[1] for p in pairs]
+
+    def add(self, value, position):
+        """ Add a row to the index. """
+        if value == "":
+            return
+
+        p = self._locate(value, position)
+        self.keys.insert(p, value)
+        self.positions.insert(p, position)
+
+    def discard(self, value, position):
+        """ Remove a row from the index. """
+        if value == "":
+            return
+
+        p = self._locate(value, position)
+        del self.keys[p]
+        del self.positions[p]
+
+    def max(self):
+        """ Get the largest element, or None if there are none. """
+        return self.keys[-1] if self.keys else None
+
+    def min(self):
+        """ Get the smallest element, or None if there are none. """
+        return self.keys[0] if self.keys else None
+
+    def prefix(self, prefix):
+        """ Get the rows whose element starts with a string, in order. """
+        start = end = bisect.bisect_left(self.keys, prefix)
+        while end < len(self.keys) and isinstance(self.keys[end],
+                basestring) and self.keys[end].startswith(prefix):
+            end += 1
+
+        return self.positions[start:end]
+
+    def range(self, low=None, high=None):
+        """ Get the rows whose element is between two values (both
+            included), in order. A None bound leaves that end open.
+        """
+        start = 0 if low is None else bisect.bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_right(
+                self.keys, high)
+
+        return self.positions[start:end]
+
+    def shift(self, position):
+        """ Move back the rows that followed a removed row. """
+        self.positions = [p - 1 if p > position else p
+                for p in self.positions]
+
+    def _locate(self, value, position):
+        """ Find the place of a row among the rows with the same element. """
+        return bisect.bisect_left(self.positions, position,
+                bisect.bisect_left(self.keys, value),
+                bisect.bisect_right(self.keys, value))
+
+class TrigramIndex(HashIndex):
+    """ Trigram index of a field, mapping each sequence of three characters
+        found in its string elements to the list of rows that contain it,
+        in ascending order. Elements are indexed in lower case, so the
+        index finds rows regardless of their case.
+    """
+
+    def add(self, value, position):
+        """ Add a row to the index. """
+        for gram in _trigrams(value):
+            HashIndex.add(self, gram, position)
+
+    def discard(self, value, position):
+        """ Remove a row from the index. """
+        for gram in _trigrams(value):
+            HashIndex.discard(self, gram, position)
+
+    def find(self, text):
+        """ Get the rows that may contain a string, which are the rows that
+            contain all of its trigrams. The caller must check them.
+
+            :returns: list of row indexes in ascending order, or None if
+                the string is too short to have trigrams
+        """
+        grams = _trigrams(text)
+        if not grams:
+            return None
+
+        postings = sorted((self.get(gram, []) for gram in grams), key=len)
+        candidates = postings[0]
+        for positions in postings[1:]:
+            if not candidates:
+                break
+
+            candidates = [p for p in candidates
+                    if _contains(positions, p)]
+
+        return list(candidates)
+
+# Classes of the indexes by type
+_INDEXES = {
+    HASH: HashIndex,
+    ORDERED: OrderedIndex,
+    TRIGRAM: TrigramIndex
+}
+
+class IdMap(object):
+    """ Map of the row ids of a table to the position of their rows.
+
+        Removing a row does not renumber the rows that followed it. Instead,
+        the map records a *tombstone* with the position the row had when the
+        map was built, and positions are corrected with the number of
+        tombstones before them. The map is built again once the tombstones
+        reach :data:`TOMBSTONE_RATIO` of the rows.
+
+        :arg list row_ids: id of each row of the table, in order
+    """
+
+    def __init__(self, row_ids):
+        self.positions = dict((row_id, position)
+                for position, row_id in enumerate(row_ids))
+        self.tombstones = []
+
+    def add(self, row_id, position):
+        """ Add a row appended to the table. """
+        self.positions[row_id] = position + len(self.tombstones)
+
+    def find(self, row_id):
+        """ Get the position of a row, or None if there is no such row. """
+        position = self.positions.get(row_id)
+        if position is None:
+            return None
+
+        return position - bisect.bisect(self.tombstones, position)
+
+    def remove(self, row_id):
+        """ Remove a row, leaving a tombstone in its place. """
+        bisect.insort(self.tombstones, self.positions.pop(row_id))
+
+    def stale(self):
+        """ Check whether the map has too many tombstones. """
+        return len(self.tombstones) > max(64,
+                len(self.positions) * TOMBSTONE_RATIO)
+
+class Rows(list):
+    """ Rows of a table, along with the indexes built for them.
+
+        The indexes of a table are declared in its ``indexes`` key, which is
+        stored in the database like any other part of its definition, and
+        built in memory the first time they are used (see :func:`get`).
+        Every change record applied to the table keeps them up to date
+        afterwards.
+    """
+
+    def __init__(self, rows=()):
+        list.__init__(self, rows)
+        self.indexes = {}
+        self.ids = None
+        self.requested = set()
+
+def added(table, start):
+    """ Add the rows appended to a table to the indexes built for it.
+
+        :param dict table: table whose rows changed
+        :param int start: index of the first new row
+    """
+    rows = table['rows']
+    for (field_name, index_type), built in _built(table).iteritems():
+        for position in xrange(start, len(rows)):
+            built.add(rows[position][field_name], position)
+
+    if isinstance(rows, Rows) and rows.ids is not None:
+        for position in xrange(start, len(rows)):
+            rows.ids.add(table['row_ids'][position], position)
+
+def candidates(table, field_name, text):
+    """ Find the rows whose element of a field may contain a string, using
+        the trigram index of the field. Building the index is deferred, see
+        :func:`get`.
+
+        :param dict table: table to search
+        :param unicode field_name: name of the field
+        :param unicode text: string to find
+        :returns: list of row indexes in ascending order, or None if the
+            field has no trigram index, it was deferred or the string is
+            shorter than three characters
+    """
+    if len(text) < 3:
+        return None
+
+    built = get(table, field_name, TRIGRAM, True)
+    if built is None:
+        return None
+
+    return built.find(text)
+
+def changed(table, index, field_name, old_value):
+    """ Move a row whose element has been modified to its new position in
+        the indexes built for the field.
+
+        :param dict table: table whose rows changed
+        :param int index: index of the row
+        :param unicode field_name: name of the modified field
+        :param old_value: value the element contained before
+    """
+    for (name, index_type), built in _built(table).iteritems():
+        if name == field_name:
+            built.discard(old_value, index)
+            built.add(table['rows'][index][field_name], index)
+
+def declared(definition):
+    """ Get the indexes declared in the definition of a table.
+
+        :param dict definition: definition of the table
+        :returns: list of (field name, index type) tuples
+    """
+    return [f.items()[0] for f in definition.get('indexes', [])]
+
+def find_id(table, row_id):
+    """ Find the position of a row from its id.
+
+        :param dict table: table with row ids
+        :param int row_id: id of the row
+        :returns: index of the row, or None if there is no such row
+    """
+    rows = _rows(table)
+    if rows.ids is None:
+        rows.ids = IdMap(table['row_ids'])
+
+    return rows.ids.find(row_id)
+
+def get(table, field_name, index_type, deferred=False):
+    """ Get an index of a table, building it if it has not been built yet.
+
+        Building an index costs more than scanning the table once, and the
+        index only lives as long as the parsed rows. Searches may therefore
+        defer it: the first time they request an index that has not been
+        built for the rows, None is returned and the table is scanned, and
+        the index is only built if the same rows are searched again. Tables
+        parsed again for every search, such as those of databases that do
+        not fit in the cache of the parser, are always scanned.
+
+        :param dict table: table whose index to get
+        :param unicode field_name: name of the indexed field
+        :param str index_type: type of the index
+        :param Boolean deferred: whether to return None instead of building
+            the index the first time it is requested
+        :returns: :class:`HashIndex` or :class:`OrderedIndex`, or None if
+            the field has no index of that type or it was deferred
+    """
+    if (field_name, index_type) not in declared(table):
+        return None
+
+    rows = _rows(table)
+    built = rows.indexes.get((field_name, index_type))
+    if built is None:
+        if deferred and (field_name, index_type) not in rows.requested:
+            rows.requested.add((field_name, index_type))
+            return None
+
+        built = _build(rows, field_name, index_type)
+        rows.indexes[(field_name, index_type)] = built
+
+    return built
+
+def lookup(table, field_name, value, deferred=False):
+    """ Find the rows whose element of a field is equal to a value, using
+        the hash index of the field.
+
+        :param dict table: table to search
+        :param unicode field_name: name of the field
+        :param value: value to find
+        :param Boolean deferred: whether to defer building the index, see
+            :func:`get`
+        :returns: list of row indexes in ascending order, or None if the
+            field has no hash index or it was deferred
+    """
+    built = get(table, field_name, HASH, deferred)
+    if built is None:
+        return None
+
+    return built.find(value)
+
+def removed(table, index, row, row_id=None):
+    """ Remove a row from the indexes built for a table, shifting the rows
+        that followed it.
+
+        :param dict table: table whose rows changed
+        :param int index: index the row had
+        :param dict row: removed row
+        :param int row_id: id the row had, if the table has row ids
+    """
+    for (field_name, index_type), built in _built(table).iteritems():
+        built.discard(row[field_name], index)
+        if index < len(table['rows']):
+            built.shift(index)
+
+    rows = table['rows']
+    if row_id is not None and isinstance(rows, Rows) and rows.ids is not None:
+        rows.ids.remove(row_id)
+        if rows.ids.stale():
+            rows.ids = None
+
+def reset(table, field_name=None):
+    """ Discard the indexes built for a table, so that they are built again
+        the next time they are used.
+
+        :param dict table: table whose indexes to discard
+        :param unicode field_name: only discard the indexes of this field
+    """
+    built = _built(table)
+    for key in built.keys():
+        if field_name is None or key[0] == field_name:
+            del built[key]
+
+def _build(rows, field_name, index_type):
+    """ Build an index of a field from the rows of its table. """
+    if index_type == ORDERED:
+        return OrderedIndex((row[field_name], position)
+                for position, row in enumerate(rows))
+
+    built = _INDEXES[index_type]()
+    if index_type == TRIGRAM:
+        for position, row in enumerate(rows):
+            for gram in _trigrams(row[field_name]):
+                built.setdefault(gram, []).append(position)
+    else:
+        for position, row in enumerate(rows):
+            built.setdefault(row[field_name], []).append(position)
+
+    return built
+
+def _built(table):
+    """ Get the indexes built for a table, by field name and type. """
+    rows = table.get('rows')
+    if isinstance(rows, Rows):
+        return rows.indexes
+
+    return {}
+
+def _contains(positions, position):
+    """ Check whether a sorted list of row indexes contains a row. """
+    p = bisect.bisect_left(positions, position)
+    return p < len(positions) and positions[p] == position
+
+def _rows(table):
+    """ Get the rows of a table, making them able to hold indexes. """
+    rows = table['rows']
+    if not isinstance(rows, Rows):
+        rows = Rows(rows)
+        table['rows'] = rows
+
+    return rows
+
+def _trigrams(value):
+    """ Get the set of trigrams of a string in lower case. Other values have
+        no trigrams.
+    """
+    if not isinstance(value, basestring):
+        return set()
+
+    value = value.lower()
+    return set(value[i:i + 3] for i in xrange(len(value) - 2))
@@ -0,0 +1,529 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: journal
+    :platform: Unix, Windows
+    :synopsis: Append-only log of database changes.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import json, os, threading
+import index, parser, predicate, segment
+
+# Suffix appended to the path of the database to obtain its log
+LOG_SUFFIX = '.log'
+
+# Size of the log, in bytes, from which it is automatically compacted
+COMPACT_SIZE = 16 * 1024 * 1024
+
+# Size of the log relative to the database file, or to the manifest and
+# segment files of segmented databases, from which it is automatically
+# compacted
+COMPACT_RATIO = 1.0
+
+# Databases being compacted in the background
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+def apply(db_data, record):
+    """ Apply a change record to the data of a database.
+
+        A record is a list containing the name of the operation followed by
+        its arguments, for instance ``['remove_row', u'table', 3]``.
+
+        :param db_data: data of the database
+        :param list record: change to apply
+
+        :raises IndexError: invalid index
+        :raises KeyError: invalid key
+        :raises Exception: unknown operation
+    """
+    if record[0] not in OPERATIONS:
+        raise Exception('Unknown operation %s' % record[0])
+
+    OPERATIONS[record[0]](db_data, *record[1:])
+
+def append(db_path, records, sync=True):
+    """ Append change records to the log of a database.
+
+        :param str db_path: path to the database
+        :param list records: records to append
+        :param Boolean sync: whether to fsync the log
+
+        :raises IOError: cannot open file
+    """
+    log_file = open(log_path(db_path), 'r+b')
+    try:
+        _truncate_partial(log_file)
+        for record in records:
+            log_file.write(json.dumps(record, ensure_ascii=False).encode(
+                    'utf-8') + '\n')
+        log_file.flush()
+        if sync:
+            os.fsync(log_file.fileno())
+
+    finally:
+        log_file.close()
+
+def compact(db_path, background=False):
+    """ Fold the log into a new database file.
+
+        The new file is written next to the current one and then renamed
+        over it, so that readers keep using the previous file and log until
+        the swap. Changes to the database made meanwhile wait for the new
+        file to be written, see :func:`parser.compact_file`.
+
+        :param str db_path: path to the database
+        :param Boolean background: whether to compact in a separate thread
+        :returns: the compaction thread if running in the background
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+    """
+    if background:
+        key = os.path.abspath(db_path)
+        with _compacting_lock:
+            if key in _compacting:
+                return None
+            _compacting.add(key)
+
+        thread = threading.Thread(target=_compact_background,
+                args=(db_path, key))
+        thread.start()
+        return thread
+
+    parser.compact_file(db_path)
+
+def disable_log(db_path):
+    """ Fold the log into the database file and stop logging changes.
+
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: log not enabled
+    """
+    try:
+        if not is_enabled(db_path):
+            raise Exception('Log is not enabled for %s' % db_path)
+
+        db_data = parser.read(db_path)
+        parser.write_file(db_path, db_data, closing=True)
+        os.remove(log_path(db_path))
+        parser.clear_cache(db_path)
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
+
+def enable_log(db_path):
+    """ Start logging changes of the database.
+
+        Once enabled, changes to rows, fields and tables are appended to a
+        log next to the database file instead of rewriting the whole file.
+        The log is replayed over the database file when reading it.
+
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises Exception: log already enabled
+    """
+    try:
+        if is_enabled(db_path):
+            raise Exception('Log is already enabled for %s' % db_path)
+
+        reset(db_path)
+
+    except IOError as e:
+        raise e
+
+def is_enabled(db_path):
+    """ Check whether changes to the database are being logged.
+
+        :param str db_path: path to the database
+        :returns: True or False
+    """
+    return os.path.isfile(log_path(db_path))
+
+def needs_compaction(db_path):
+    """ Check whether the log of a database has grown past the
+        compaction thresholds, see :data:`COMPACT_SIZE` and
+        :data:`COMPACT_RATIO`.
+
+        :param str db_path: path to the database
+        :returns: True or False
+    """
+    try:
+        log_size = os.path.getsize(log_path(db_path))
+        if segment.is_segmented(db_path):
+            db_size = segment.get_size(db_path)
+        else:
+            db_size = os.path.getsize(db_path)
+    except OSError:
+        return False
+
+    return log_size >= COMPACT_SIZE or log_size > db_size * COMPACT_RATIO
+
+def log_path(db_path):
+    """ Get the path to the log of a database.
+
+        :param str db_path: path to the database
+        :returns: path to the log file
+    """
+    return db_path + LOG_SUFFIX
+
+def replay(db_path, db_data):
+    """ Apply the records of the log to the data read from the database file.
+
+        The log is ignored if it does not belong to the current database
+        file, which happens when the file has been rewritten after the last
+        record was logged. A partially written record at the end of the log
+        is ignored as well.
+
+        :param str db_path: path to the database
+        :param db_data: data read from the database file
+        :returns: number of records applied
+
+        :raises IOError: cannot open file
+    """
+    # Records are split on newlines only: decoding the whole log would also
+    # break lines on characters such as U+2028, which records may contain
+    log_file = open(log_path(db_path), 'rb')
+    try:
+        header = log_file.readline()
+        if not header.endswith('\n') or \
+                json.loads(header)['snapshot'] != _snapshot(db_path):
+            return 0
+
+        count = 0
+        for line in log_file:
+            if not line.endswith('\n'):
+                break
+
+            apply(db_data, json.loads(line.decode('utf-8')))
+            count += 1
+
+        return count
+
+    finally:
+        log_file.close()
+
+def reset(db_path, sync=True):
+    """ Empty the log, binding it to the current database file.
+
+        Must be called whenever the database file is rewritten.
+
+        :param str db_path: path to the database
+        :param Boolean sync: whether to fsync the log
+
+        :raises IOError: cannot open file
+    """
+    log_file = open(log_path(db_path), 'wb')
+    try:
+        log_file.write(json.dumps({'snapshot': _snapshot(db_path)}) + '\n')
+        log_file.flush()
+        if sync:
+            os.fsync(log_file.fileno())
+    finally:
+        log_file.close()
+
+def _compact_background(db_path, key):
+    """ Compact a database and mark it as no longer being compacted. """
+    try:
+        compact(db_path)
+    finally:
+        with _compacting_lock:
+            _compacting.discard(key)
+
+def _snapshot(db_path):
+    """ Build the signature that binds a log to its database file. """
+    stat = os.stat(db_path)
+    return [stat.st_size, stat.st_mtime]
+
+def _truncate_partial(log_file):
+    """ Remove a partially written record from the end of an open log. """
+    log_file.seek(0, os.SEEK_END)
+    end = log_file.tell()
+    position = end
+    while position > 0:
+        start = max(0, position - 4096)
+        log_file.seek(start)
+        chunk = log_file.read(position - start)
+        newline = chunk.rfind('\n')
+        if newline != -1:
+            position = start + newline + 1
+            break
+
+        position = start
+
+    if position != end:
+        log_file.truncate(position)
+
+    log_file.seek(position)
+
+# Operations that can be stored in the log
+def _create_table(db_data, table_name):
+    db_data[table_name] = {'fields': [], 'rows': []}
+
+def _rename_table(db_data, table_name, new_name):
+    db_data[new_name] = db_data.pop(table_name)
+
+def _remove_table(db_data, table_name):
+    del db_data[table_name]
+
+def _create_field(db_data, table_name, field_name, field_type,
+        primary_key=False):
+    db_data[table_name]['fields'].append({field_name: field_type})
+    def create(row):
+        row[field_name] = ""
+
+    _change_rows(db_data[table_name], create)
+
+    if primary_key:
+        # The hash index of the key finds rows and keeps keys unique
+        db_data[table_name]['primary_key'] = field_name
+        _create_index(db_data, table_name, field_name, index.HASH)
+
+def _rename_field(db_data, table_name, field_name, new_name):
+    fields = db_data[table_name]['fields']
+    for position, f in enumerate(fields):
+        if field_name in f:
+            fields[position] = {new_name: f[field_name]}
+            break
+
+    def rename(row):
+        row[new_name] = row.pop(field_name)
+
+    _change_rows(db_data[table_name], rename)
+
+    for f in db_data[table_name].get('indexes', []):
+        if field_name in f:
+            f[new_name] = f.pop(field_name)
+
+    if db_data[table_name].get('primary_key') == field_name:
+        db_data[table_name]['primary_key'] = new_name
+
+    index.reset(db_data[table_name], field_name)
+
+def _remove_field(db_data, table_name, field_name):
+    fields = db_data[table_name]['fields']
+    for position, f in enumerate(fields):
+        if field_name in f:
+            del fields[position]
+            break
+
+    def remove(row):
+        del row[field_name]
+
+    _change_rows(db_data[table_name], remove)
+
+    if db_data[table_name].get('primary_key') == field_name:
+        del db_data[table_name]['primary_key']
+
+    for f in list(db_data[table_name].get('indexes', [])):
+        if field_name in f:
+            _remove_index(db_data, table_name, field_name, f[field_name])
+
+def _swap_fields(db_data, table_name, index1, index2):
+    fields = db_data[table_name]['fields']
+    fields[index1], fields[index2] = fields[index2], fields[index1]
+
+def _empty_field(db_data, table_name, field_name):
+    def empty(row):
+        row[field_name] = ""
+
+    _change_rows(db_data[table_name], empty)
+
+    index.reset(db_data[table_name], field_name)
+
+def _create_index(db_data, table_name, field_name, index_type):
+    db_data[table_name].setdefault('indexes', []).append(
+            {field_name: index_type})
+
+def _remove_index(db_data, table_name, field_name, index_type):
+    table = db_data[table_name]
+    table['indexes'].remove({field_name: index_type})
+    if not table['indexes']:
+        del table['indexes']
+
+    index.reset(table, field_name)
+
+def _enable_row_ids(db_data, table_name):
+    table = db_data[table_name]
+    table['row_ids'] = range(len(table['rows']))
+    table['next_id'] = len(table['rows'])
+
+def _create_row(db_data, table_name, row):
+    _create_rows(db_data, table_name, [row])
+
+def _create_rows(db_data, table_name, rows):
+    table = db_data[table_name]
+    if 'primary_key' in table:
+        _check_keys(table, rows)
+
+    table['rows'].extend(rows)
+    if 'row_ids' in table:
+        table['row_ids'].extend(xrange(table['next_id'],
+                table['next_id'] + len(rows)))
+        table['next_id'] += len(rows)
+
+    index.added(table, len(table['rows']) - len(rows))
+
+def _modify_element(db_data, table_name, position, field_name, value):
+    table = db_data[table_name]
+    if table.get('primary_key') == field_name:
+        _check_keys(table, [{field_name: value}], position)
+
+    row = dict(table['rows'][position])
+    old_value = row[field_name]
+    row[field_name] = value
+    table['rows'][position] = row
+    index.changed(table, position, field_name, old_value)
+
+def _modify_by_key(db_data, table_name, key, field_name, value):
+    _modify_element(db_data, table_name,
+            _find_key(db_data[table_name], key), field_name, value)
+
+def _modify_where(db_data, table_name, text, values):
+    table = db_data[table_name]
+    positions = predicate.Predicate(text, table['fields']).find(table)
+
+    # Keys are checked before changing any row, so that a duplicate key
+    # leaves the table as it was
+    key = table.get('primary_key')
+    if key in values and positions:
+        if len(positions) > 1 and values[key] != "":
+            raise Exception('Duplicate primary key %s' % values[key])
+
+        _check_keys(table, [{key: values[key]}], positions[0])
+
+    for position in positions:
+        for field_name, value in values.iteritems():
+            _modify_element(db_data, table_name, position, field_name, value)
+
+def _upsert_rows(db_data, table_name, rows):
+    table = db_data[table_name]
+    for row in rows:
+        try:
+            position = _find_key(table, row[table['primary_key']])
+        except KeyError:
+            _create_rows(db_data, table_name, [row])
+            continue
+
+        for field_name, value in row.iteritems():
+            _modify_element(db_data, table_name, position, field_name, value)
+
+def _remove_row(db_data, table_name, position):
+    table = db_data[table_name]
+    row = table['rows'].pop(position)
+    row_id = table['row_ids'].pop(position) if 'row_ids' in table else None
+    index.removed(table, position, row, row_id)
+
+def _remove_row_by_id(db_data, table_name, row_id):
+    position = index.find_id(db_data[table_name], row_id)
+    if position is None:
+        raise KeyError(row_id)
+
+    _remove_row(db_data, table_name, position)
+
+def _remove_rows(db_data, table_name, positions):
+    table = db_data[table_name]
+    positions = set(positions)
+
+    # The rows are copied to a new list, so the indexes built for the old
+    # one are discarded and built again the next time they are used
+    table['rows'] = [row for position, row in enumerate(table['rows'])
+            if position not in positions]
+    if 'row_ids' in table:
+        table['row_ids'] = [row_id for position, row_id in
+                enumerate(table['row_ids']) if position not in positions]
+
+def _remove_where(db_data, table_name, text):
+    table = db_data[table_name]
+    _remove_rows(db_data, table_name,
+            predicate.Predicate(text, table['fields']).find(table))
+
+def _change_rows(table, change):
+    """ Apply a change to a copy of every row of a table.
+
+        Changed rows replace the old ones rather than being modified in
+        place, so that iterations over the rows (see
+        :func:`parser.iter_rows`) keep the rows they started with.
+    """
+    rows = table['rows']
+    for position, row in enumerate(rows):
+        row = dict(row)
+        change(row)
+        rows[position] = row
+
+def _check_keys(table, rows, position=None):
+    """ Check that rows do not repeat the primary key of other rows of the
+        table, or of each other. Empty keys are not checked.
+
+        :param int position: index of the row being modified, if any
+    """
+    key = table['primary_key']
+    keys = set()
+    for row in rows:
+        value = row[key]
+        if value == "":
+            continue
+
+        positions = index.lookup(table, key, value)
+        if value in keys or [p for p in positions if p != position]:
+            raise Exception('Duplicate primary key %s' % value)
+
+        keys.add(value)
+
+def _find_key(table, key):
+    """ Find the position of a row from its primary key. """
+    positions = index.lookup(table, table['primary_key'], key)
+    if key == "" or not positions:
+        raise KeyError(key)
+
+    return positions[0]
+
+OPERATIONS = {
+    'create_table': _create_table,
+    'rename_table': _rename_table,
+    'remove_table': _remove_table,
+    'create_field': _create_field,
+    'rename_field': _rename_field,
+    'remove_field': _remove_field,
+    'swap_fields': _swap_fields,
+    'empty_field': _empty_field,
+    'create_index': _create_index,
+    'remove_index': _remove_index,
+    'enable_row_ids': _enable_row_ids,
+    'create_row': _create_row,
+    'create_rows': _create_rows,
+    'modify_element': _modify_element,
+    'modify_by_key': _modify_by_key,
+    'modify_where': _modify_where,
+    'upsert_rows': _upsert_rows,
+    'remove_row': _remove_row,
+    'remove_row_by_id': _remove_row_by_id,
+    'remove_rows': _remove_rows,
+    'remove_where': _remove_where
+}
@@ -27,28 +27,843 @@
 .. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
 """
 
-import codecs, json, os
+import json, os, stat, tempfile, threading
+from collections import OrderedDict
+import backend, filelock, journal, segment
+
+# Number of bytes read from the beginning of a file to detect its format
+HEAD_SIZE = 64
+
+# Policies for flushing written data to disk with fsync:
+# - always: after every write
+# - close: only when closing a database handle or compacting the log
+# - never: leave it to the operating system
+FSYNC_ALWAYS = 'always'
+FSYNC_CLOSE = 'close'
+FSYNC_NEVER = 'never'
+
+FSYNC_POLICY = FSYNC_ALWAYS
+
+# Memory budget of the parsed database cache, in bytes. The size of each
+# entry is estimated from the size of the files on disk
+CACHE_LIMIT = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'size': 0}
+
+# Databases whose cache entries are never evicted, with the number of times
+# they have been pinned, by absolute path
+_pinned = {}
+
+# Locks ensuring that each database is parsed by one thread at a time, by
+# absolute path
+_loading = {}
+
+# Open database handles, by absolute path
+_handles = {}
+_handles_lock = threading.Lock()
 
 def read(db_path):
     """ Read a database file in the specified path.
 
+        If a handle is open for the database, its in-memory data is
+        returned instead. Otherwise, the parsed data is kept in a
+        process-wide cache and reused as long as the stat signature (inode,
+        size and modification time) of the file and its log does not
+        change. Callers must not modify the returned data unless they write
+        it back with :func:`write` or :func:`update`.
+
+        :param str db_path: complete path to the database file
+        :returns: data contained in the file
+    """
+    handle = _handles.get(os.path.abspath(db_path))
+    if handle:
+        return handle.data
+
+    return read_file(db_path)
+
+def read_file(db_path):
+    """ Read a database file and its log, ignoring open handles.
+
+        Concurrent reads of the same database share a single parse. Cached
+        data is returned without taking the lock of the database, as every
+        change to its files also changes their signature.
+
         :param str db_path: complete path to the database file
         :returns: data contained in the file
     """
-    db_file = codecs.open(db_path, 'r', 'utf-8')
-    db_data = json.load(db_file, encoding='utf-8')
-    db_file.close()
+    key = os.path.abspath(db_path)
+    try:
+        signature = get_signature(db_path)
+    except OSError:
+        # Reported when opening the file below
+        signature = None
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == signature:
+            _cache_stats['hits'] += 1
+            del _cache[key]
+            _cache[key] = entry
+            return entry[1]
+
+    with filelock.shared(db_path):
+        # Threads missing the cache at the same time parse the database
+        # only once
+        with _loading_lock(key):
+            segmented = segment.is_segmented(db_path)
+            db_file = open(_data_path(db_path), 'rb')
+            try:
+                signature = (_signature(os.fstat(db_file.fileno())),
+                        _log_signature(db_path))
+
+                with _cache_lock:
+                    entry = _cache.get(key)
+                    if entry and entry[0] == signature:
+                        _cache_stats['hits'] += 1
+                        del _cache[key]
+                        _cache[key] = entry
+                        return entry[1]
+
+                    _cache_stats['misses'] += 1
+
+                content = db_file.read()
+
+            finally:
+                db_file.close()
+
+            if segmented:
+                db_data = segment.load(db_path, content)
+            else:
+                db_data = _load_indexed(db_path, content)
+
+            if signature[1]:
+                journal.replay(db_path, db_data)
+
+            _cache_store(key, signature, db_data)
+
+            return db_data
+
+def iter_rows(db_path, table_name, fields=None):
+    """ Iterate over the rows of a table.
+
+        If the database is open in a handle, has changes in its log or the
+        table is already cached, the rows are read from memory: the list of
+        rows is copied while holding the lock of the database, and each row
+        is copied as the iteration reaches it. Changes replace rows instead
+        of modifying them, so the iteration sees the rows present when it
+        started. Otherwise, they are decoded one at a time from the file, as
+        long as its format allows it, so that the table is never loaded
+        entirely.
+
+        :param str db_path: complete path to the database file
+        :param unicode table_name: name of the table
+        :param list fields: names of the fields to include in each row. If
+            None is specified, every field is included
+        :returns: iterator of row dictionaries, which can be modified
+    """
+    rows = _stream_rows(db_path, table_name, fields)
+    if rows is not None:
+        return rows
+
+    with reading(db_path):
+        rows = list(read(db_path)[table_name]['rows'])
+
+    return _copy_rows(rows, fields)
+
+def count_rows(db_path, table_name):
+    """ Get the number of rows of a table.
+
+        The rows are counted in memory under the same conditions as
+        :func:`iter_rows`. Otherwise, the number of rows is read from the
+        manifest of segmented databases, or from the file if its format
+        stores it, so that the table is not loaded.
+
+        :param str db_path: complete path to the database file
+        :param unicode table_name: name of the table
+        :returns: number of rows
+    """
+    if segment.is_segmented(db_path) and not _in_memory(db_path, table_name):
+        try:
+            count = segment.count_rows(db_path, table_name)
+        except IOError:
+            count = None
+
+        if count is not None:
+            return count
+
+    opened = _open_table(db_path, table_name)
+    if opened is not None:
+        db_file, db_backend = opened
+        try:
+            if hasattr(db_backend, 'count_rows'):
+                count = db_backend.count_rows(db_file, table_name)
+                if count is not None:
+                    return count
+        finally:
+            db_file.close()
+
+    return len(read(db_path)[table_name]['rows'])
+
+def update(db_path, db_data, record):
+    """ Apply a change record to the data of a database and store it.
+
+        If the log of the database is enabled, only the record is appended
+        to it. Otherwise, the whole database is written.
+
+        :param str db_path: complete path to the database file
+        :param db_data: data of the database, as returned by :func:`read`
+        :param list record: change to apply, see :func:`journal.apply`
+    """
+    with lock(db_path):
+        # The handle is checked while holding the lock, so that other
+        # threads wait for a transaction to end instead of writing into it
+        handle = _handles.get(os.path.abspath(db_path))
+        if handle:
+            journal.apply(handle.data, record)
+            if handle.records is not None:
+                handle.records.append(record)
+            handle.dirty = True
+            return
 
-    return db_data
+        # Another process may have changed the database since the data was
+        # read, so the record is applied to the latest version
+        db_data = read_file(db_path)
+        try:
+            journal.apply(db_data, record)
+        except:
+            clear_cache(db_path)
+            raise
+
+        write_records(db_path, db_data, [record])
 
 def write(db_path, db_data):
     """ Write data to a database.
 
+        If a handle is open for the database, the data is kept in memory
+        until the handle is flushed. Otherwise, it is written to the file.
+
+        :param str db_path: complete path to the database file
+        :param data: new data to store in the database
+    """
+    with lock(db_path):
+        handle = _handles.get(os.path.abspath(db_path))
+        if handle:
+            handle.data = db_data
+            handle.dirty = True
+            handle.records = None
+            return
+
+        write_file(db_path, db_data)
+
+def write_file(db_path, db_data, closing=False, db_format=None):
+    """ Write data to a database file, ignoring open handles.
+
+        The log of the database, if enabled, is emptied and the cache entry
+        of the database is updated with the new data.
+
         :param str db_path: complete path to the database file
         :param data: new data to store in the database
+        :param Boolean closing: whether the write happens when closing the
+            database, see :data:`FSYNC_POLICY`
+        :param str db_format: storage format to use. If None is specified,
+            the current format of the file is kept
+    """
+    sync = must_sync(closing)
+    with lock(db_path):
+        try:
+            if segment.is_segmented(db_path):
+                segment.write(db_path, db_data, None, sync, db_format)
+            else:
+                dump(db_path, db_data, sync, db_format or get_format(db_path))
+
+            if journal.is_enabled(db_path):
+                journal.reset(db_path, sync)
+
+        except:
+            clear_cache(db_path)
+            raise
+
+        _cache_store(os.path.abspath(db_path), get_signature(db_path),
+                db_data)
+
+def write_records(db_path, db_data, records, closing=False):
+    """ Store changes already applied to the data of a database, ignoring
+        open handles.
+
+        The records are appended to the log if it is enabled. Otherwise, the
+        whole database is written, or only the affected tables if the
+        database is segmented.
+
+        :param str db_path: complete path to the database file
+        :param data: data of the database, including the changes
+        :param list records: change records applied to the data
+        :param Boolean closing: whether the write happens when closing the
+            database, see :data:`FSYNC_POLICY`
+    """
+    with lock(db_path):
+        try:
+            if journal.is_enabled(db_path):
+                journal.append(db_path, records, must_sync(closing))
+            elif segment.is_segmented(db_path):
+                segment.write(db_path, db_data, segment.tables_of(records),
+                        must_sync(closing))
+            else:
+                write_file(db_path, db_data, closing)
+                return
+
+        except:
+            clear_cache(db_path)
+            raise
+
+        _cache_store(os.path.abspath(db_path), get_signature(db_path),
+                db_data)
+
+    if journal.needs_compaction(db_path):
+        journal.compact(db_path, background=True)
+
+def compact_file(db_path):
+    """ Fold the log of a database into a new database file.
+
+        The new file is written while holding the lock of the database
+        shared, so that reads go on meanwhile, and the lock is only held
+        exclusively to rename it over the database. Records logged in the
+        meantime are kept in the new log. Segmented databases are rewritten
+        while holding the lock exclusively.
+
+        :param str db_path: complete path to the database file
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+    """
+    sync = must_sync(True)
+    if segment.is_segmented(db_path):
+        with lock(db_path):
+            write_file(db_path, read_file(db_path), True)
+        return
+
+    with reading(db_path):
+        signature = get_signature(db_path)
+        temp_path = _dump_temp(db_path, read_file(db_path), sync,
+                get_format(db_path))
+
+    try:
+        with lock(db_path):
+            if not _appended(signature, get_signature(db_path)):
+                # The database was rewritten meanwhile
+                write_file(db_path, read_file(db_path), True)
+                return
+
+            db_data = read_file(db_path)
+            records = []
+            if signature[1]:
+                log_file = open(journal.log_path(db_path), 'rb')
+                try:
+                    log_file.seek(signature[1][1])
+                    records = [json.loads(line.decode('utf-8')) for line in
+                            log_file if line.endswith('\n')]
+                finally:
+                    log_file.close()
+
+            _replace(db_path, temp_path, sync)
+            if signature[1]:
+                journal.reset(db_path, sync)
+            if records:
+                journal.append(db_path, records, sync)
+
+            _cache_store(os.path.abspath(db_path), get_signature(db_path),
+                    db_data)
+
+    finally:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+
+def dump(path, db_data, sync=True, db_format=backend.FORMAT_JSON):
+    """ Serialize database data to a file.
+
+        The data is written to a temporary file in the same directory which
+        is then renamed over the target, so that neither a crash nor
+        concurrent readers can ever see a partially written file.
+
+        :param str path: path to the file
+        :param data: data to serialize
+        :param Boolean sync: whether to fsync the file and its directory
+        :param str db_format: name of a registered format, see
+            :mod:`backend`
+
+        :raises Exception: invalid format
+    """
+    _replace(path, _dump_temp(path, db_data, sync, db_format), sync)
+
+def encode(db_data, db_format=backend.FORMAT_JSON):
+    """ Encode database data in the given storage format.
+
+        :param data: data to encode
+        :param str db_format: name of a registered format, see
+            :mod:`backend`
+        :returns: encoded data as a byte string
+
+        :raises Exception: invalid format
+    """
+    return backend.get_backend(db_format).encode(db_data)
+
+def get_format(db_path):
+    """ Detect the storage format of a database file.
+
+        :param str db_path: complete path to the database file
+        :returns: name of the format
+
+        :raises IOError: cannot open file
+        :raises Exception: unknown format
+    """
+    if segment.is_segmented(db_path):
+        return segment.get_format(db_path)
+
+    db_file = open(db_path, 'rb')
+    try:
+        head = db_file.read(HEAD_SIZE)
+    finally:
+        db_file.close()
+
+    return backend.detect_backend(head).name
+
+def get_signature(db_path):
+    """ Get the stat signature (inode, size and modification time) of a
+        database file and its log, which changes whenever the database is
+        written.
+
+        :param str db_path: complete path to the database file
+        :returns: tuple with the signature of the file and the signature of
+            the log, or None if there is no log
+
+        :raises OSError: cannot find file
+    """
+    return (_signature(os.stat(_data_path(db_path))), _log_signature(db_path))
+
+def load(content):
+    """ Decode database data, detecting its storage format.
+
+        :param str content: content of a database file
+        :returns: decoded data
+
+        :raises Exception: unknown format
+    """
+    return backend.detect_backend(content[:HEAD_SIZE]).decode(content)
+
+def definition(db_data, table_name):
+    """ Get the definition of a table (see :func:`backend.get_definition`)
+        without decoding the rows if they have not been loaded yet.
+
+        :param db_data: data of the database, as returned by :func:`read`
+        :param unicode table_name: name of the table
+        :returns: dictionary whose `fields` key lists the fields of the
+            table. It must not be modified
+
+        :raises KeyError: table does not exist
+    """
+    if isinstance(db_data, segment.Tables):
+        return db_data.definition(table_name)
+
+    return db_data[table_name]
+
+def must_sync(closing=False):
+    """ Check whether a write must be flushed to disk according to
+        :data:`FSYNC_POLICY`.
+
+        :param Boolean closing: whether the write happens when closing the
+            database
+        :returns: True or False
+    """
+    if FSYNC_POLICY == FSYNC_ALWAYS:
+        return True
+    elif FSYNC_POLICY == FSYNC_CLOSE:
+        return closing
+
+    return False
+
+def set_fsync_policy(policy):
+    """ Set when written data is flushed to disk.
+
+        :param str policy: one of :data:`FSYNC_ALWAYS`, :data:`FSYNC_CLOSE`
+            or :data:`FSYNC_NEVER`
+
+        :raises Exception: invalid policy
+    """
+    global FSYNC_POLICY
+    if policy not in (FSYNC_ALWAYS, FSYNC_CLOSE, FSYNC_NEVER):
+        raise Exception('Invalid fsync policy %s' % policy)
+
+    FSYNC_POLICY = policy
+
+def sync_directory(directory):
+    """ Flush the entries of a directory to disk so that renames are
+        durable. Does nothing on platforms that do not support it.
+
+        :param str directory: path to the directory
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def lock(db_path):
+    """ Get the lock that serializes changes to a database, both within the
+        process and between processes. Reads wait while the lock is held.
+
+        :param str db_path: path to the database
+        :returns: context manager holding the lock exclusively, see
+            :func:`filelock.exclusive`
+
+        :raises Exception: timed out waiting for the lock
+    """
+    return filelock.exclusive(db_path)
+
+def reading(db_path):
+    """ Get the lock that keeps other threads and processes from changing a
+        database while it is read. Functions that read the parsed data of a
+        database hold it shared, so that changes made meanwhile by other
+        threads cannot be seen half done.
+
+        :param str db_path: path to the database
+        :returns: context manager holding the lock shared, see
+            :func:`filelock.shared`
+
+        :raises Exception: timed out waiting for the lock
+    """
+    return filelock.shared(db_path)
+
+def open_handle(handle):
+    """ Register an open handle so that reads and writes of its database
+        are served from memory.
+
+        :param handle: object with `db_path`, `data`, `dirty` and `records`
+            attributes
+
+        :raises Exception: database is already open
+    """
+    key = os.path.abspath(handle.db_path)
+    with _handles_lock:
+        if key in _handles:
+            raise Exception('Database %s is already open' % handle.db_path)
+
+        _handles[key] = handle
+
+def get_handle(db_path):
+    """ Get the open handle of a database.
+
+        :param str db_path: path to the database
+        :returns: handle object, or None if the database is not open
+    """
+    return _handles.get(os.path.abspath(db_path))
+
+def close_handle(db_path):
+    """ Unregister the open handle of a database.
+
+        :param str db_path: path to the database
+    """
+    with _handles_lock:
+        _handles.pop(os.path.abspath(db_path), None)
+
+def clear_cache(db_path=None):
+    """ Remove cached data.
+
+        :param str db_path: path to the database to remove from the cache.
+            If None is specified, the whole cache is emptied
+    """
+    with _cache_lock:
+        if db_path is None:
+            _cache.clear()
+            _cache_stats['size'] = 0
+
+        else:
+            entry = _cache.pop(os.path.abspath(db_path), None)
+            if entry:
+                _cache_stats['size'] -= entry[2]
+
+def get_cache_info():
+    """ Get the statistics of the parsed database cache.
+
+        :returns: dictionary with the number of cache `hits` and `misses`,
+            the number of cached `entries`, their estimated `size` in bytes
+            and the current `limit`
+    """
+    with _cache_lock:
+        return {
+            'hits': _cache_stats['hits'],
+            'misses': _cache_stats['misses'],
+            'entries': len(_cache),
+            'size': _cache_stats['size'],
+            'limit': CACHE_LIMIT
+        }
+
+def pin(db_path):
+    """ Keep the parsed data of a database in the cache regardless of the
+        memory budget. The entry is still refreshed when the database
+        changes. Each call must be matched by a call to :func:`unpin`.
+
+        :param str db_path: path to the database
+    """
+    key = os.path.abspath(db_path)
+    with _cache_lock:
+        _pinned[key] = _pinned.get(key, 0) + 1
+
+def set_cache_limit(limit):
+    """ Set the memory budget of the parsed database cache.
+
+        Least recently used databases are evicted until the cache fits the
+        new budget, except those pinned with :func:`pin`. A limit of 0
+        disables caching.
+
+        :param int limit: maximum size in bytes
+    """
+    global CACHE_LIMIT
+    with _cache_lock:
+        CACHE_LIMIT = limit
+        _cache_evict()
+
+def unpin(db_path):
+    """ Let the parsed data of a database be evicted from the cache again,
+        once every call to :func:`pin` has been matched.
+
+        :param str db_path: path to the database
+    """
+    key = os.path.abspath(db_path)
+    with _cache_lock:
+        if _pinned.get(key, 0) > 1:
+            _pinned[key] -= 1
+            return
+
+        _pinned.pop(key, None)
+        _cache_evict()
+
+def _appended(signature, current):
+    """ Check whether a database has only been changed by appending records
+        to its log since it had a signature.
+    """
+    if current[0] != signature[0] or not (current[1] and signature[1]):
+        return current == signature
+
+    return (current[1][0] == signature[1][0] and
+            current[1][1] >= signature[1][1])
+
+def _cache_store(key, signature, db_data):
+    """ Store parsed data in the cache and evict old entries if needed. """
+    with _cache_lock:
+        entry = _cache.pop(key, None)
+        if entry:
+            _cache_stats['size'] -= entry[2]
+
+        size = signature[0][1] + (signature[1][1] if signature[1] else 0)
+        _cache[key] = (signature, db_data, size)
+        _cache_stats['size'] += size
+        _cache_evict()
+
+def _cache_evict():
+    """ Evict least recently used entries until the cache fits its budget.
+
+        Must be called with the cache lock held.
+    """
+    for key in list(_cache):
+        if _cache_stats['size'] <= CACHE_LIMIT:
+            break
+
+        if key not in _pinned:
+            _cache_stats['size'] -= _cache.pop(key)[2]
+
+def _closing_rows(db_file, rows):
+    """ Iterate over rows, closing their file when done. """
+    try:
+        for row in rows:
+            yield row
+    finally:
+        db_file.close()
+
+def _copy_mode(path, temp_path):
+    """ Give a temporary file the permissions of the file it replaces, or
+        the default permissions for new files.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0666 & ~umask
+
+    os.chmod(temp_path, mode)
+
+def _copy_rows(rows, fields):
+    """ Iterate over copies of rows, including only some fields if a list
+        of them is given.
+    """
+    for row in rows:
+        if fields is None:
+            yield dict(row)
+        else:
+            yield dict((f, row[f]) for f in fields)
+
+def _data_path(db_path):
+    """ Get the path to the file whose signature identifies the current
+        version of a database: the manifest for segmented databases or the
+        database file otherwise.
+    """
+    if segment.is_segmented(db_path):
+        return segment.manifest_path(db_path)
+
+    return db_path
+
+def _dump_temp(path, db_data, sync, db_format):
+    """ Serialize database data to a temporary file in the directory of a
+        file, returning the path to the temporary file.
+    """
+    content = encode(db_data, db_format)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+            suffix='.tmp', dir=directory)
+    try:
+        db_file = os.fdopen(fd, 'wb')
+        try:
+            db_file.write(content)
+            db_file.flush()
+            if sync:
+                os.fsync(db_file.fileno())
+        finally:
+            db_file.close()
+
+    except:
+        os.remove(temp_path)
+        raise
+
+    return temp_path
+
+def _in_memory(db_path, table_name):
+    """ Check whether a table must be read from memory rather than from
+        its file: the database is open in a handle, has a change log or the
+        table is already loaded.
+    """
+    key = os.path.abspath(db_path)
+    if os.name == 'nt' or key in _handles or _log_signature(db_path):
+        # Windows cannot replace files that are open
+        return True
+
+    with _cache_lock:
+        entry = _cache.get(key)
+
+    return bool(entry) and entry[0] == get_signature(db_path) and (
+            not isinstance(entry[1], segment.Tables) or
+            entry[1].is_loaded(table_name))
+
+def _load_indexed(db_path, content):
+    """ Decode the content of a database file, deferring the decoding of
+        each table until it is accessed if the backend can index the file.
+    """
+    db_backend = backend.detect_backend(content[:HEAD_SIZE])
+    index = None
+    if hasattr(db_backend, 'read_index'):
+        index = db_backend.read_index(content)
+
+    if index is None:
+        return db_backend.decode(content)
+
+    def loader(location):
+        return db_backend.read_table(content, location)
+
+    return segment.Tables(dict((table_name, segment.Segment(location,
+            table_definition)) for table_name, (table_definition, location)
+            in index.iteritems()), loader, os.path.abspath(db_path))
+
+def _loading_lock(key):
+    """ Get the lock held while parsing a database. """
+    with _cache_lock:
+        if key not in _loading:
+            _loading[key] = threading.Lock()
+
+        return _loading[key]
+
+def _log_signature(db_path):
+    """ Build the cache signature of the log of a database, if any. """
+    try:
+        return _signature(os.stat(journal.log_path(db_path)))
+    except OSError:
+        return None
+
+def _open_table(db_path, table_name):
+    """ Open the file that contains a table to decode it directly, or
+        return None if the table must be read from memory.
+
+        :returns: tuple with the open file and its backend
     """
-    db_file = codecs.open(db_path, 'w', 'utf-8')
-    db_file.write(json.dumps(db_data, ensure_ascii=False,
-            sort_keys=True, indent=4))
-    db_file.close()
+    if _in_memory(db_path, table_name):
+        return None
+
+    try:
+        if segment.is_segmented(db_path):
+            table = segment.read_manifest(db_path)['tables'][table_name]
+            db_file = open(os.path.join(db_path, table['file']), 'rb')
+        else:
+            db_file = open(db_path, 'rb')
+    except (IOError, KeyError):
+        return None
+
+    try:
+        return db_file, backend.detect_backend(db_file.read(HEAD_SIZE))
+    except:
+        db_file.close()
+        raise
+
+def _replace(path, temp_path, sync):
+    """ Rename a temporary file over a file, removing the temporary file if
+        it cannot be renamed.
+    """
+    try:
+        _copy_mode(path, temp_path)
+        if os.name == 'nt' and os.path.isfile(path):
+            # Windows cannot rename over an existing file
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    except:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if sync:
+        sync_directory(os.path.dirname(os.path.abspath(path)))
+
+def _signature(stat):
+    """ Build the cache signature of a file from its stat result. """
+    return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+def _stream_rows(db_path, table_name, fields):
+    """ Decode the rows of a table from its file one at a time, or return
+        None if they must be read from memory.
+
+        The file is kept open until the iteration ends, so the rows belong
+        to the version of the file present when the iteration started.
+    """
+    opened = _open_table(db_path, table_name)
+    if opened is None:
+        return None
+
+    db_file, db_backend = opened
+    try:
+        rows = None
+        if hasattr(db_backend, 'iter_rows'):
+            rows = db_backend.iter_rows(db_file, table_name, fields)
+    except:
+        db_file.close()
+        raise
+
+    if rows is None:
+        db_file.close()
+        return None
 
+    return _closing_rows(db_file, rows)
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: predicate
+    :platform: Unix, Windows
+    :synopsis: Conditions selecting the rows of a table.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import re
+import index
+
+# Comparison operators, with the Python operator each one is compiled to
+OPERATORS = {
+    '=': '==',
+    '!=': '!=',
+    '<>': '!=',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>='
+}
+
+# Conversion of the values of a predicate to the data type of their field
+_TYPES = {
+    'str': unicode,
+    'int': int,
+    'bool': int,
+    'float': float
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*') |
+    (?P<name>"(?:[^"]|"")*") |
+    (?P<symbol><=|>=|!=|<>|[=<>(),]) |
+    (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?) |
+    (?P<word>[^\W\d]\w*)
+    )""", re.UNICODE | re.VERBOSE)
+
+_KEYWORDS = ['AND', 'BETWEEN', 'IN', 'NOT', 'OR']
+
+class Predicate(object):
+    """ Condition on the elements of the rows of a table, such as
+        ``age BETWEEN 18 AND 65 AND NOT name IN ('Bob', 'Alice')``.
+
+        A predicate combines comparisons between a field and a value,
+        ``IN`` lists and ``BETWEEN`` ranges (both limits included) with
+        ``AND``, ``OR``, ``NOT`` and parentheses. Field names that are not
+        plain words are written between double quotes, and strings between
+        single quotes. Values are converted to the data type of their field,
+        and empty elements only match ``= ''``, ``!=`` and ``IN``.
+
+        The predicate is compiled once into a single Python function that
+        checks a row, and the indexes of the table are used to avoid
+        checking every row where possible.
+
+        :arg unicode text: predicate to parse
+        :arg list fields: fields of the table, as in its definition
+
+        :raises ValueError: value cannot be converted to the field type
+        :raises Exception: invalid predicate, field does not exist
+    """
+
+    def __init__(self, text, fields):
+        self.text = text
+        self.types = dict(f.items()[0] for f in fields)
+        self.tokens = _tokenize(text)
+        self.tree = self._parse_or()
+        if self.tokens:
+            raise Exception('Invalid predicate: %s' % text)
+
+        self.match = _compile(self.tree)
+
+    def find(self, table):
+        """ Find the rows of a table that match the predicate.
+
+            :param dict table: table to search
+            :returns: list of row indexes in ascending order
+        """
+        match = self.match
+        rows = table['rows']
+        positions = _plan(self.tree, table)
+        if positions is None:
+            return [position for position, row in enumerate(rows)
+                    if match(row)]
+
+        return [position for position in sorted(positions)
+                if match(rows[position])]
+
+    def _expect(self, kind, value=None):
+        """ Take the next token, which must be of the given kind. """
+        if not self.tokens or self.tokens[0][0] != kind or (
+                value is not None and self.tokens[0][1].upper() != value):
+            raise Exception('Invalid predicate: %s' % self.text)
+
+        return self.tokens.pop(0)[1]
+
+    def _next_is(self, kind, value):
+        """ Check whether the next token is a keyword or symbol. """
+        return (bool(self.tokens) and self.tokens[0][0] == kind and
+                self.tokens[0][1].upper() == value)
+
+    def _parse_and(self):
+        node = self._parse_not()
+        while self._next_is('word', 'AND'):
+            self.tokens.pop(0)
+            node = ('and', node, self._parse_not())
+
+        return node
+
+    def _parse_comparison(self):
+        if self.tokens and self.tokens[0][0] == 'name':
+            field_name = self.tokens.pop(0)[1][1:-1].replace('""', '"')
+        else:
+            field_name = self._expect('word')
+            if field_name.upper() in _KEYWORDS:
+                raise Exception('Invalid predicate: %s' % self.text)
+
+        if field_name not in self.types:
+            raise Exception('Field %s does not exist' % field_name)
+
+        if self._next_is('word', 'IN'):
+            self.tokens.pop(0)
+            self._expect('symbol', '(')
+            values = [self._parse_value(field_name, '=')]
+            while self._next_is('symbol', ','):
+                self.tokens.pop(0)
+                values.append(self._parse_value(field_name, '='))
+
+            self._expect('symbol', ')')
+            return ('in', field_name, frozenset(values))
+
+        if self._next_is('word', 'BETWEEN'):
+            self.tokens.pop(0)
+            low = self._parse_value(field_name, '<=')
+            self._expect('word', 'AND')
+            return ('between', field_name, low,
+                    self._parse_value(field_name, '<='))
+
+        symbol = self._expect('symbol')
+        if symbol not in OPERATORS:
+            raise Exception('Invalid predicate: %s' % self.text)
+
+        return ('compare', field_name, symbol,
+                self._parse_value(field_name, symbol))
+
+    def _parse_not(self):
+        if self._next_is('word', 'NOT'):
+            self.tokens.pop(0)
+            return ('not', self._parse_not())
+
+        if self._next_is('symbol', '('):
+            self.tokens.pop(0)
+            node = self._parse_or()
+            self._expect('symbol', ')')
+            return node
+
+        return self._parse_comparison()
+
+    def _parse_or(self):
+        node = self._parse_and()
+        while self._next_is('word', 'OR'):
+            self.tokens.pop(0)
+            node = ('or', node, self._parse_and())
+
+        return node
+
+    def _parse_value(self, field_name, symbol):
+        """ Parse a value and convert it to the data type of its field. """
+        if self.tokens and self.tokens[0][0] == 'string':
+            value = self.tokens.pop(0)[1][1:-1].replace("''", "'")
+        else:
+            value = self._expect('number')
+
+        if value == "":
+            if symbol not in ('=', '!=', '<>'):
+                raise Exception('Invalid predicate: %s' % self.text)
+
+            return value
+
+        return _TYPES[self.types[field_name]](value)
+
+def _compile(tree):
+    """ Compile a parsed predicate into a function that checks whether a
+        row matches it.
+    """
+    values = {}
+    return eval('lambda row: ' + _source(tree, values), values)
+
+def _plan(node, table):
+    """ Find the rows that may match a node of a parsed predicate using the
+        indexes of the table.
+
+        :returns: set of row indexes, or None if every row must be checked
+    """
+    if node[0] == 'and':
+        left, right = _plan(node[1], table), _plan(node[2], table)
+        if left is None or right is None:
+            return right if left is None else left
+
+        return left & right
+
+    elif node[0] == 'or':
+        left, right = _plan(node[1], table), _plan(node[2], table)
+        if left is None or right is None:
+            return None
+
+        return left | right
+
+    elif node[0] == 'not':
+        return None
+
+    elif node[0] == 'in':
+        field_name, found = node[1], set()
+        for value in node[2]:
+            positions = _plan(('compare', field_name, '=', value), table)
+            if positions is None:
+                return None
+
+            found |= positions
+
+        return found
+
+    elif node[0] == 'between':
+        ordered = index.get(table, node[1], index.ORDERED, True)
+        return None if ordered is None else set(ordered.range(*node[2:]))
+
+    field_name, symbol, value = node[1:]
+    ordered = index.get(table, field_name, index.ORDERED, True)
+    if symbol == '=':
+        positions = index.lookup(table, field_name, value, True)
+        if positions is not None:
+            return set(positions)
+        elif ordered is None or value == "":
+            return None
+
+        return set(ordered.range(value, value))
+
+    elif symbol in ('!=', '<>') or ordered is None:
+        return None
+
+    # The limits are included and checked again with the predicate
+    if symbol in ('<', '<='):
+        return set(ordered.range(None, value))
+
+    return set(ordered.range(value, None))
+
+def _source(node, values):
+    """ Get the Python expression that checks a node of a parsed predicate
+        against a ``row`` dictionary. Values are stored in the namespace the
+        expression is evaluated in.
+    """
+    if node[0] in ('and', 'or'):
+        return '(%s %s %s)' % (_source(node[1], values), node[0],
+                _source(node[2], values))
+
+    elif node[0] == 'not':
+        return '(not %s)' % _source(node[1], values)
+
+    element = 'row[%r]' % node[1]
+    if node[0] == 'in':
+        return '(%s in %s)' % (element, _store(values, node[2]))
+
+    elif node[0] == 'between':
+        # Empty elements are not within any range
+        return '(%s != "" and %s <= %s <= %s)' % (element,
+                _store(values, node[2]), element, _store(values, node[3]))
+
+    symbol, value = OPERATORS[node[2]], node[3]
+    if value == "" or symbol in ('==', '!='):
+        return '(%s %s %s)' % (element, symbol, _store(values, value))
+
+    # Empty elements are not smaller or larger than any value
+    return '(%s != "" and %s %s %s)' % (element, element, symbol,
+            _store(values, value))
+
+def _store(values, value):
+    """ Store a value in the namespace of a compiled predicate, returning
+        its name.
+    """
+    name = 'v%i' % len(values)
+    values[name] = value
+    return name
+
+def _tokenize(text):
+    """ Split a predicate into (kind, text) tuples. """
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise Exception('Invalid predicate: %s' % text)
+
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+
+    return tokens
@@ -32,10 +32,27 @@ from db import *
 from table import *
 from field import *
 from element import *
+from handle import transaction
+import parser
 
 # Regular expression for arguments
 RE_ARG = re.compile('%(.+?)%;')
 
+# Regular expression for the database of a query
+RE_DB = re.compile('AT %(.+?)%;')
+
+# Functions computing each aggregate of a field
+AGGREGATES = {
+    'SUM': get_field_sum,
+    'AVG': get_field_avg,
+    'MIN': get_field_min,
+    'MAX': get_field_max
+}
+
+# Operations that change the database
+MUTATING = ['COMPACT', 'CREATE', 'DELETE', 'EMPTY', 'MODIFY', 'REMOVE',
+        'RENAME', 'SWAP', 'UPDATE', 'UPSERT']
+
 class Parser():
     """ Parses the query and divides it into subqueries where possible.
 
@@ -48,14 +65,20 @@ class Parser():
     def run(self):
         """ Run the query. """
         # Check the type of operation
-        if re.match("CREATE (.*)", self.query):
+        if re.match("COMPACT (.*)", self.query):
+            self.compact()
+        elif re.match("CREATE (.*)", self.query):
             self.create()
+        elif re.match("DELETE (.*)", self.query):
+            self.delete()
         elif re.match("EMPTY (.*)", self.query):
             self.empty()
         elif re.match("EXISTS (.*)", self.query):
             return self.exists()
         elif re.match("GET (.*)", self.query):
             return self.get()
+        elif re.match("ITER (.*)", self.query):
+            return self.iter()
         elif re.match("MODIFY (.*)", self.query):
             self.modify()
         elif re.match("REMOVE (.*)", self.query):
@@ -66,19 +89,65 @@ class Parser():
             return self.search()
         elif re.match("SWAP (.*)", self.query):
             self.swap()
+        elif re.match("UPDATE (.*)", self.query):
+            self.update()
+        elif re.match("UPSERT (.*)", self.query):
+            self.upsert()
         else:
             raise Exception('Invalid query: %s' % self.query)
             
+    def lock(self):
+        """ Get the lock of the database the query operates on. Queries that
+            change the database hold the lock exclusively, while the rest
+            hold it shared so that they can run concurrently.
+
+            :returns: context manager, or None if the query creates or
+                removes a database
+        """
+        if re.match("(CREATE|REMOVE) DB ", self.query):
+            return None
+
+        match = RE_DB.search(self.query)
+        if not match:
+            return None
+
+        db_path = match.group(1)
+        if self.query.split(' ', 1)[0] in MUTATING:
+            return parser.lock(db_path)
+
+        return parser.reading(db_path)
+
+    def compact(self):
+        """ Run a COMPACT operation. This operation only works with
+            databases.
+
+            :raises Exception: incorrect query syntax
+        """
+        re_compact_db = re.compile("COMPACT DB AT %(.+?)%;")
+
+        if re_compact_db.match(self.query):
+            # COMPACT DB AT %db%;
+            db_path = re_compact_db.match(self.query).group(1)
+
+            compact_db(db_path)
+
+        else:
+            raise Exception('Invalid query: %s' % self.query)
+
     def create(self):
         """ Run a CREATE operation. This operation works with databases,
-            tables and fields.
+            tables, fields, indexes and rows.
 
             :raises Exception: incorrect query syntax, incorrect number of parameters          
         """
         re_create_db = re.compile("CREATE DB %(.+?)%; AT %(.+?)%;")
         re_create_table = re.compile("CREATE TABLE (.*) AT %(.+?)%;")
         re_create_field = re.compile("CREATE FIELD (.*) IN %(.+?)%; AT %(.+?)%;")
+        re_create_key = re.compile("CREATE PRIMARY KEY %(.+?)%; %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_create_index = re.compile("CREATE (\w+ )?INDEX (.*) IN %(.+?)%; AT %(.+?)%;")
         re_create_row = re.compile("CREATE ROW (.*) IN %(.+?)%; AT %(.+?)%;")
+        re_create_row_ids = re.compile("CREATE ROW IDS IN %(.+?)%; AT %(.+?)%;")
+        re_create_rows = re.compile("CREATE ROWS (.*) IN %(.+?)%; AT %(.+?)%;")
 
         if re_create_db.match(self.query):
             # CREATE DB %name%; AT %path%;
@@ -92,8 +161,9 @@ class Parser():
             db_path = re_create_table.match(self.query).group(2)
             table_list = RE_ARG.findall(table_args)
 
-            for t in table_list:
-                create_table(t, db_path)
+            with transaction(db_path):
+                for t in table_list:
+                    create_table(t, db_path)
 
         elif re_create_field.match(self.query):
             # CREATE FIELD %name1%; %type1%; %name2%; %type2%; ... IN %table%; AT %db%;
@@ -105,11 +175,41 @@ class Parser():
             if len(field_list)%2 != 0:
                 raise Exception('Number of passed arguments is not correct')
 
-            it = 0
-            while it < len(field_list):
-                create_field(field_list[it], field_list[it+1], table_name,
-                        db_path)
-                it += 2
+            with transaction(db_path):
+                it = 0
+                while it < len(field_list):
+                    create_field(field_list[it], field_list[it+1],
+                            table_name, db_path)
+                    it += 2
+
+        elif re_create_key.match(self.query):
+            # CREATE PRIMARY KEY %name%; %type%; IN %table%; AT %db%;
+            field_name = re_create_key.match(self.query).group(1)
+            field_type = re_create_key.match(self.query).group(2)
+            table_name = re_create_key.match(self.query).group(3)
+            db_path = re_create_key.match(self.query).group(4)
+
+            create_field(field_name, field_type, table_name, db_path, True)
+
+        elif re_create_index.match(self.query):
+            # CREATE [ORDERED ]INDEX %field1%; %field2%; ... IN %table%; AT %db%;
+            index_type = (re_create_index.match(self.query).group(1) or
+                    'HASH ').strip().lower()
+            field_args = re_create_index.match(self.query).group(2)
+            table_name = re_create_index.match(self.query).group(3)
+            db_path = re_create_index.match(self.query).group(4)
+            field_list = RE_ARG.findall(field_args)
+
+            with transaction(db_path):
+                for f in field_list:
+                    create_index(f, table_name, db_path, index_type)
+
+        elif re_create_row_ids.match(self.query):
+            # CREATE ROW IDS IN %table%; AT %db%;
+            table_name = re_create_row_ids.match(self.query).group(1)
+            db_path = re_create_row_ids.match(self.query).group(2)
+
+            enable_row_ids(table_name, db_path)
 
         elif re_create_row.match(self.query):
             # CREATE ROW %element%; %element%; ... IN %table%; AT %db%;
@@ -120,6 +220,39 @@ class Parser():
 
             create_row(element_list, table_name, db_path)
 
+        elif re_create_rows.match(self.query):
+            # CREATE ROWS %row1_element1%; %row1_element2%; ... %row2_element1%; ... IN %table%; AT %db%;
+            element_args = re_create_rows.match(self.query).group(1)
+            table_name = re_create_rows.match(self.query).group(2)
+            db_path = re_create_rows.match(self.query).group(3)
+            element_list = RE_ARG.findall(element_args)
+            count = len(get_field_list(table_name, db_path))
+
+            if count == 0 or len(element_list)%count != 0:
+                raise Exception('Number of passed arguments is not correct')
+
+            create_rows((element_list[it:it+count] for it in
+                    xrange(0, len(element_list), count)), table_name, db_path)
+
+        else:
+            raise Exception('Invalid query: %s' % self.query)
+
+    def delete(self):
+        """ Run a DELETE operation. This operation removes the rows that
+            match a predicate, see :class:`predicate.Predicate`.
+
+            :raises Exception: incorrect query syntax
+        """
+        re_delete = re.compile("DELETE FROM %(.+?)%; WHERE %(.+?)%; AT %(.+?)%;")
+
+        if re_delete.match(self.query):
+            # DELETE FROM %table%; WHERE %predicate%; AT %db%;
+            table_name = re_delete.match(self.query).group(1)
+            predicate = re_delete.match(self.query).group(2)
+            db_path = re_delete.match(self.query).group(3)
+
+            remove_where(predicate, table_name, db_path)
+
         else:
             raise Exception('Invalid query: %s' % self.query)
 
@@ -133,26 +266,30 @@ class Parser():
         re_empty_field_row = re.compile("EMPTY FIELD (.*) OF %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
         re_empty_element = re.compile("EMPTY ELEMENT (.*) FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
 
-        if re_empty_field.match(self.query):
-            # EMPTY FIELD %field1%; %field2%; ... IN %table%; AT %db%; 
-            field_args = re_empty_field.match(self.query).group(1)
-            table_name = re_empty_field.match(self.query).group(2)
-            db_path = re_empty_field.match(self.query).group(3)
-            field_list = RE_ARG.findall(field_args)
-
-            for f in field_list:
-                empty_field_table(f, table_name, db_path)
-
-        elif re_empty_field_row.match(self.query):
+        # Checked first, as the field list of EMPTY FIELD ... IN would
+        # swallow the row index
+        if re_empty_field_row.match(self.query):
             # EMPTY FIELD %field1%; %field2%; ... OF %index%; IN %table%; AT %db%; 
             field_args = re_empty_field_row.match(self.query).group(1)
-            index = int(re_empty_field_row.match(self.query).group(1))
+            index = int(re_empty_field_row.match(self.query).group(2))
             table_name = re_empty_field_row.match(self.query).group(3)
             db_path = re_empty_field_row.match(self.query).group(4)
             field_list = RE_ARG.findall(field_args)
 
-            for f in field_list:
-                empty_field_row(index, f, table_name, db_path)
+            with transaction(db_path):
+                for f in field_list:
+                    empty_field_row(index, f, table_name, db_path)
+
+        elif re_empty_field.match(self.query):
+            # EMPTY FIELD %field1%; %field2%; ... IN %table%; AT %db%; 
+            field_args = re_empty_field.match(self.query).group(1)
+            table_name = re_empty_field.match(self.query).group(2)
+            db_path = re_empty_field.match(self.query).group(3)
+            field_list = RE_ARG.findall(field_args)
+
+            with transaction(db_path):
+                for f in field_list:
+                    empty_field_table(f, table_name, db_path)
 
         elif re_empty_element.match(self.query):
             # EMPTY ELEMENT %index1%; %index2%; ... FROM %field%; IN %table%; AT %db%; 
@@ -162,8 +299,10 @@ class Parser():
             db_path = re_empty_element.match(self.query).group(4)
             index_list = RE_ARG.findall(index_args)
 
-            for index in index_list:
-                empty_element(int(index), field, table, database)
+            with transaction(db_path):
+                for index in index_list:
+                    empty_element(int(index), field_name, table_name,
+                            db_path)
 
         else:
             raise Exception('Invalid query: %s' % self.query)
@@ -208,18 +347,26 @@ class Parser():
 
     def get(self):
         """ Run a GET operation. This operation works with databases,
-            tables, fields and elements.
+            tables, fields, indexes and elements.
 
             :returns: list of results obtained from the query
 
             :raises Exception: incorrect query syntax
         """
         re_get_tables = re.compile("GET TABLES AT %(.+?)%;")
+        re_get_count = re.compile("GET COUNT IN %(.+?)%; AT %(.+?)%;")
+        re_get_count_where = re.compile("GET COUNT IN %(.+?)%; WHERE %(.+?)%; AT %(.+?)%;")
+        re_get_aggregate = re.compile("GET (SUM|AVG|MIN|MAX) OF %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
         re_get_fields = re.compile("GET FIELDS IN %(.+?)%; AT %(.+?)%;")
+        re_get_fields_rows = re.compile("GET FIELDS (.*) FROM ROWS IN %(.+?)%; AT %(.+?)%;")
+        re_get_fields_where = re.compile("GET FIELDS (.*) FROM ROWS IN %(.+?)%; WHERE %(.+?)%; AT %(.+?)%;")
         re_get_type = re.compile("GET TYPE OF %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
         re_get_elements = re.compile("GET ELEMENTS FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
         re_get_row = re.compile("GET ROW %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_get_row_id = re.compile("GET ROW BY ID %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_get_row_key = re.compile("GET ROW BY KEY %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
         re_get_rows = re.compile("GET ROWS IN %(.+?)%; AT %(.+?)%;")
+        re_get_rows_where = re.compile("GET ROWS IN %(.+?)%; WHERE %(.+?)%; AT %(.+?)%;")
         re_get_element = re.compile("GET ELEMENT %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
 
         if re_get_tables.match(self.query):
@@ -228,6 +375,30 @@ class Parser():
 
             return get_table_list(db_path)
 
+        elif re_get_count_where.match(self.query):
+            # GET COUNT IN %table%; WHERE %predicate%; AT %db%;
+            table_name = re_get_count_where.match(self.query).group(1)
+            predicate = re_get_count_where.match(self.query).group(2)
+            db_path = re_get_count_where.match(self.query).group(3)
+
+            return count_rows(table_name, db_path, predicate)
+
+        elif re_get_count.match(self.query):
+            # GET COUNT IN %table%; AT %db%;
+            table_name = re_get_count.match(self.query).group(1)
+            db_path = re_get_count.match(self.query).group(2)
+
+            return count_rows(table_name, db_path)
+
+        elif re_get_aggregate.match(self.query):
+            # GET SUM|AVG|MIN|MAX OF %field%; IN %table%; AT %db%;
+            aggregate = AGGREGATES[re_get_aggregate.match(self.query).group(1)]
+            field_name = re_get_aggregate.match(self.query).group(2)
+            table_name = re_get_aggregate.match(self.query).group(3)
+            db_path = re_get_aggregate.match(self.query).group(4)
+
+            return aggregate(field_name, table_name, db_path)
+
         elif re_get_fields.match(self.query):
             # GET FIELDS IN %table%; AT %db%; 
             table_name = re_get_fields.match(self.query).group(1)
@@ -235,6 +406,25 @@ class Parser():
             
             return get_field_list(table_name, db_path)
 
+        elif re_get_fields_where.match(self.query):
+            # GET FIELDS %field1%; %field2%; ... FROM ROWS IN %table%; WHERE %predicate%; AT %db%;
+            field_args = re_get_fields_where.match(self.query).group(1)
+            table_name = re_get_fields_where.match(self.query).group(2)
+            predicate = re_get_fields_where.match(self.query).group(3)
+            db_path = re_get_fields_where.match(self.query).group(4)
+            field_list = RE_ARG.findall(field_args)
+
+            return get_row_list(table_name, db_path, predicate, field_list)
+
+        elif re_get_fields_rows.match(self.query):
+            # GET FIELDS %field1%; %field2%; ... FROM ROWS IN %table%; AT %db%;
+            field_args = re_get_fields_rows.match(self.query).group(1)
+            table_name = re_get_fields_rows.match(self.query).group(2)
+            db_path = re_get_fields_rows.match(self.query).group(3)
+            field_list = RE_ARG.findall(field_args)
+
+            return get_row_list(table_name, db_path, fields=field_list)
+
         elif re_get_type.match(self.query):
             # GET TYPE OF %field%; IN %table%; AT %db$;
             field_name = re_get_type.match(self.query).group(1)
@@ -259,6 +449,30 @@ class Parser():
 
             return get_row(index, table_name, db_path)
 
+        elif re_get_row_id.match(self.query):
+            # GET ROW BY ID %id%; IN %table%; AT %db%; 
+            row_id = int(re_get_row_id.match(self.query).group(1))
+            table_name = re_get_row_id.match(self.query).group(2)
+            db_path = re_get_row_id.match(self.query).group(3)
+
+            return get_row_by_id(row_id, table_name, db_path)
+
+        elif re_get_row_key.match(self.query):
+            # GET ROW BY KEY %key%; IN %table%; AT %db%; 
+            key = re_get_row_key.match(self.query).group(1)
+            table_name = re_get_row_key.match(self.query).group(2)
+            db_path = re_get_row_key.match(self.query).group(3)
+
+            return get_row_by_key(key, table_name, db_path)
+
+        elif re_get_rows_where.match(self.query):
+            # GET ROWS IN %table%; WHERE %predicate%; AT %db%;
+            table_name = re_get_rows_where.match(self.query).group(1)
+            predicate = re_get_rows_where.match(self.query).group(2)
+            db_path = re_get_rows_where.match(self.query).group(3)
+
+            return get_row_list(table_name, db_path, predicate)
+
         elif re_get_rows.match(self.query):
             # GET ROWS IN %table%; AT %db%;
             table_name = re_get_rows.match(self.query).group(1)
@@ -278,12 +492,42 @@ class Parser():
         else:
             raise Exception('Invalid query: %s' % self.query)
 
+    def iter(self):
+        """ Run an ITER operation. This operation only works with rows.
+
+            :returns: cursor that yields the rows of the table one at a time
+
+            :raises Exception: incorrect query syntax
+        """
+        re_iter_rows = re.compile("ITER ROWS IN %(.+?)%; AT %(.+?)%;")
+        re_iter_fields = re.compile("ITER ROWS (.*) IN %(.+?)%; AT %(.+?)%;")
+
+        if re_iter_rows.match(self.query):
+            # ITER ROWS IN %table%; AT %db%;
+            table_name = re_iter_rows.match(self.query).group(1)
+            db_path = re_iter_rows.match(self.query).group(2)
+
+            return iter_rows(table_name, db_path)
+
+        elif re_iter_fields.match(self.query):
+            # ITER ROWS %field1%; %field2%; ... IN %table%; AT %db%;
+            field_args = re_iter_fields.match(self.query).group(1)
+            table_name = re_iter_fields.match(self.query).group(2)
+            db_path = re_iter_fields.match(self.query).group(3)
+            field_list = RE_ARG.findall(field_args)
+
+            return iter_rows(table_name, db_path, field_list)
+
+        else:
+            raise Exception('Invalid query: %s' % self.query)
+
     def modify(self):
         """ Run a MODIFY operation. This operation only works with elements. 
 
             :raises Exception: incorrect query syntax 
         """
         re_modify = re.compile("MODIFY %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%; TO %(.+?)%;")
+        re_modify_key = re.compile("MODIFY BY KEY %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%; TO %(.+?)%;")
 
         if re_modify.match(self.query):
             # MODIFY %index%; FROM %field%; IN %table%; AT %db%; TO %new content""
@@ -295,19 +539,31 @@ class Parser():
 
             modify_element(index, field_name, table_name, db_path, new_content)
 
+        elif re_modify_key.match(self.query):
+            # MODIFY BY KEY %key%; FROM %field%; IN %table%; AT %db%; TO %new content%;
+            key = re_modify_key.match(self.query).group(1)
+            field_name = re_modify_key.match(self.query).group(2)
+            table_name = re_modify_key.match(self.query).group(3)
+            db_path = re_modify_key.match(self.query).group(4)
+            new_content = re_modify_key.match(self.query).group(5)
+
+            modify_by_key(key, field_name, table_name, db_path, new_content)
+
         else:
             raise Exception('Invalid query: %s' % self.query)
 
     def remove(self):
         """ Run a REMOVE operation. This operation works with databases,
-            tables, fields and elements.
+            tables, fields, indexes and elements.
 
             :raises Exception: incorrect query syntax
         """
         re_remove_db = re.compile("REMOVE DB AT %(.+?)%;")
         re_remove_table = re.compile("REMOVE TABLE (.*) AT %(.+?)%;")
         re_remove_field = re.compile("REMOVE FIELD (.*) IN %(.+?)%; AT %(.+?)%;")
+        re_remove_index = re.compile("REMOVE (\w+ )?INDEX (.*) IN %(.+?)%; AT %(.+?)%;")
         re_remove_row = re.compile("REMOVE ROW (.*) IN %(.+?)%; AT %(.+?)%;")
+        re_remove_row_id = re.compile("REMOVE ROW BY ID (.*) IN %(.+?)%; AT %(.+?)%;")
 
         if re_remove_db.match(self.query):
             # REMOVE DB AT %path""
@@ -321,8 +577,9 @@ class Parser():
             db_path = re_remove_table.match(self.query).group(2)
             table_list = RE_ARG.findall(table_args)
 
-            for t in table_list:
-                remove_table(t, db_path)
+            with transaction(db_path):
+                for t in table_list:
+                    remove_table(t, db_path)
 
         elif re_remove_field.match(self.query):
             # REMOVE FIELD %field1%; %field2%; ... IN %table%; AT %db%; 
@@ -331,8 +588,33 @@ class Parser():
             db_path = re_remove_field.match(self.query).group(3)
             field_list = RE_ARG.findall(field_args)
 
-            for f in field_list:
-                remove_field(f, table_name, db_path)
+            with transaction(db_path):
+                for f in field_list:
+                    remove_field(f, table_name, db_path)
+
+        elif re_remove_index.match(self.query):
+            # REMOVE [ORDERED ]INDEX %field1%; %field2%; ... IN %table%; AT %db%; 
+            index_type = (re_remove_index.match(self.query).group(1) or
+                    'HASH ').strip().lower()
+            field_args = re_remove_index.match(self.query).group(2)
+            table_name = re_remove_index.match(self.query).group(3)
+            db_path = re_remove_index.match(self.query).group(4)
+            field_list = RE_ARG.findall(field_args)
+
+            with transaction(db_path):
+                for f in field_list:
+                    remove_index(f, table_name, db_path, index_type)
+
+        elif re_remove_row_id.match(self.query):
+            # REMOVE ROW BY ID %id1%; %id2%; ... IN %table%; AT %db%; 
+            id_args = re_remove_row_id.match(self.query).group(1)
+            table_name = re_remove_row_id.match(self.query).group(2)
+            db_path = re_remove_row_id.match(self.query).group(3)
+            id_list = RE_ARG.findall(id_args)
+
+            with transaction(db_path):
+                for row_id in id_list:
+                    remove_row_by_id(int(row_id), table_name, db_path)
 
         elif re_remove_row.match(self.query):
             # REMOVE ROW %index1%; %index2%; ... IN %table%; AT %db%; 
@@ -341,8 +623,8 @@ class Parser():
             db_path = re_remove_row.match(self.query).group(3)
             index_list = RE_ARG.findall(index_args)
 
-            for index in index_list:
-                remove_row(int(index), table_name, db_path)
+            remove_rows([int(index) for index in index_list], table_name,
+                    db_path)
 
         else:
             raise Exception('Invalid query: %s' % self.query)
@@ -383,26 +665,57 @@ class Parser():
 
             :raises Exception: incorrect query syntax 
         """
-        re_search = re.compile("FIND %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
-        re_search_field = re.compile("FIND %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
-
-        if re_find.match(self.query):
-            # SEARCH %data%; IN %table%; AT %db%; 
-            data = re_search.match(self.query).group(1)
-            table_name = re_search.match(self.query).group(2)
-            db_path = re_search.match(self.query).group(3)
-
-            return search_data(data, table_name, db_path)
+        re_search = re.compile("SEARCH %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_search_field = re.compile("SEARCH %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_search_prefix = re.compile("SEARCH PREFIX %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
+        re_search_range = re.compile("SEARCH RANGE %(.+?)%; %(.+?)%; FROM %(.+?)%; IN %(.+?)%; AT %(.+?)%;")
 
-        elif re_find.match(self.query):
+        if re_search_field.match(self.query):
             # SEARCH %data%; FROM %field%; IN %table%; AT %db%; 
             data = re_search_field.match(self.query).group(1)
             field_name = re_search_field.match(self.query).group(2)
             table_name = re_search_field.match(self.query).group(3)
             db_path = re_search_field.match(self.query).group(4)
 
+            # Numbers are converted to the data type of the field, so that
+            # they are compared for equality and can use its hash index
+            field_type = get_field_type(field_name, table_name, db_path)
+            if field_type != 'str':
+                data = CONVERTERS[field_type](data)
+
             return search_data(data, table_name, db_path, field_name)
 
+        elif re_search.match(self.query):
+            # SEARCH %data%; IN %table%; AT %db%; 
+            data = re_search.match(self.query).group(1)
+            table_name = re_search.match(self.query).group(2)
+            db_path = re_search.match(self.query).group(3)
+
+            return search_data(data, table_name, db_path)
+
+        elif re_search_prefix.match(self.query):
+            # SEARCH PREFIX %prefix%; FROM %field%; IN %table%; AT %db%; 
+            prefix = re_search_prefix.match(self.query).group(1)
+            field_name = re_search_prefix.match(self.query).group(2)
+            table_name = re_search_prefix.match(self.query).group(3)
+            db_path = re_search_prefix.match(self.query).group(4)
+
+            return search_prefix(prefix, table_name, db_path, field_name)
+
+        elif re_search_range.match(self.query):
+            # SEARCH RANGE %low%; %high%; FROM %field%; IN %table%; AT %db%; 
+            low = re_search_range.match(self.query).group(1)
+            high = re_search_range.match(self.query).group(2)
+            field_name = re_search_range.match(self.query).group(3)
+            table_name = re_search_range.match(self.query).group(4)
+            db_path = re_search_range.match(self.query).group(5)
+
+            # Limits are converted to the data type of the field
+            convert = CONVERTERS[get_field_type(field_name, table_name,
+                    db_path)]
+            return search_range(convert(low), convert(high), table_name,
+                    db_path, field_name)
+
         else:
             raise Exception('Invalid query: %s' % self.query)
 
@@ -425,11 +738,73 @@ class Parser():
         else:
             raise Exception('Invalid query: %s' % self.query)
 
+    def update(self):
+        """ Run an UPDATE operation. This operation modifies the elements of
+            the rows that match a predicate, see :class:`predicate.Predicate`.
+
+            :raises Exception: incorrect query syntax
+        """
+        re_update = re.compile("UPDATE %(.+?)%; SET (.*) WHERE %(.+?)%; AT %(.+?)%;")
+
+        if re_update.match(self.query):
+            # UPDATE %table%; SET %field1%; %content1%; ... WHERE %predicate%; AT %db%;
+            table_name = re_update.match(self.query).group(1)
+            content_args = re_update.match(self.query).group(2)
+            predicate = re_update.match(self.query).group(3)
+            db_path = re_update.match(self.query).group(4)
+            content_list = RE_ARG.findall(content_args)
+
+            if not content_list or len(content_list)%2 != 0:
+                raise Exception('Number of passed arguments is not correct')
+
+            modify_where(predicate, dict(zip(content_list[::2],
+                    content_list[1::2])), table_name, db_path)
+
+        else:
+            raise Exception('Invalid query: %s' % self.query)
+
+    def upsert(self):
+        """ Run an UPSERT operation. This operation only works with rows of
+            tables that have a primary key.
+
+            :raises Exception: incorrect query syntax
+        """
+        re_upsert_row = re.compile("UPSERT ROW (.*) IN %(.+?)%; AT %(.+?)%;")
+        re_upsert_rows = re.compile("UPSERT ROWS (.*) IN %(.+?)%; AT %(.+?)%;")
+
+        if re_upsert_row.match(self.query):
+            # UPSERT ROW %element%; %element%; ... IN %table%; AT %db%;
+            element_args = re_upsert_row.match(self.query).group(1)
+            table_name = re_upsert_row.match(self.query).group(2)
+            db_path = re_upsert_row.match(self.query).group(3)
+            element_list = RE_ARG.findall(element_args)
+
+            upsert_row(element_list, table_name, db_path)
+
+        elif re_upsert_rows.match(self.query):
+            # UPSERT ROWS %row1_element1%; %row1_element2%; ... %row2_element1%; ... IN %table%; AT %db%;
+            element_args = re_upsert_rows.match(self.query).group(1)
+            table_name = re_upsert_rows.match(self.query).group(2)
+            db_path = re_upsert_rows.match(self.query).group(3)
+            element_list = RE_ARG.findall(element_args)
+            count = len(get_field_list(table_name, db_path))
+
+            if count == 0 or len(element_list)%count != 0:
+                raise Exception('Number of passed arguments is not correct')
+
+            upsert_rows((element_list[it:it+count] for it in
+                    xrange(0, len(element_list), count)), table_name, db_path)
+
+        else:
+            raise Exception('Invalid query: %s' % self.query)
+
 def run_query(query):
     """ Parse and execute a query in the database.
         
         This function divides the query (if there are more than one) by
-        using the string '>>' and then runs a parser for each one.
+        using the string '>>' and then runs a parser for each one. Each
+        query holds the lock of its database while it runs, see
+        :meth:`Parser.lock`.
     
         :param str query: query to execute
     """
@@ -437,7 +812,13 @@ def run_query(query):
     result_list = []
     for subquery in query_list:
         parser = Parser(subquery)
-        result = parser.run()
+        lock = parser.lock()
+        if lock:
+            with lock:
+                result = parser.run()
+        else:
+            result = parser.run()
+
         if result:
             result_list.append(result)
     
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of breezedb - https://github.com/RMed/breezedb_python
+#
+# Copyright (C) 2013-2014  Rafael Medina García <rafamedgar@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>.
+
+"""
+.. module:: segment
+    :platform: Unix, Windows
+    :synopsis: Directory-backed databases with one file per table.
+
+.. moduleauthor:: Rafael Medina García <rafamedgar@gmail.com>
+"""
+
+import json, os
+import backend, parser
+
+# Name of the manifest file inside the database directory
+MANIFEST = 'manifest.json'
+
+# Extension of segment files
+SEGMENT_SUFFIX = '.seg'
+
+class Segment(object):
+    """ Table whose rows are loaded on first access.
+
+        Until the table is loaded, its definition (see
+        :func:`backend.get_definition`) is the one stored with its location,
+        for instance in the manifest of a segmented database or in the index
+        of a database file.
+
+        :arg location: where the table is stored, as understood by the
+            loader of the :class:`Tables` object containing the segment.
+            None if the table has not been written yet
+        :arg dict definition: definition of the table
+        :arg dict table: table data, if already available
+        :arg int count: number of rows of the table, if known
+    """
+
+    def __init__(self, location=None, definition=None, table=None,
+            count=None):
+        self.location = location
+        self._definition = definition
+        self.table = table
+        self._count = count
+
+    def count(self):
+        """ Get the number of rows of the table without loading them.
+
+            :returns: number of rows, or None if it is not known
+        """
+        if self.table is None:
+            return self._count
+
+        return len(self.table['rows'])
+
+    def definition(self):
+        """ Get the definition of the table without loading its rows.
+
+            :returns: dictionary with every key of the table except those
+                holding a value for each row
+        """
+        if self.table is None:
+            return self._definition
+
+        return backend.get_definition(self.table)
+
+class Tables(dict):
+    """ Tables of a database, keyed by name, loaded on first access.
+
+        Values are stored as :class:`Segment` objects and loaded with the
+        given loader when accessed through the usual mapping methods, so
+        listing or checking the tables, or reading their definitions,
+        does not require decoding any rows. :meth:`pop` returns the segment
+        object itself so that tables can be renamed without loading them;
+        assigning either a segment or a table is supported.
+
+        :arg dict segments: :class:`Segment` objects by table name
+        :arg loader: function that receives the location of a segment and
+            returns the table stored there
+        :arg str source: path of the file or directory the segments were
+            read from
+    """
+
+    def __init__(self, segments, loader, source=None):
+        dict.__init__(self, segments)
+        self.loader = loader
+        self.source = source
+
+    def __getitem__(self, table_name):
+        segment = dict.__getitem__(self, table_name)
+        if segment.table is None:
+            segment.table = self.loader(segment.location)
+
+        return segment.table
+
+    def __setitem__(self, table_name, table):
+        if not isinstance(table, Segment):
+            table = Segment(table=table)
+
+        dict.__setitem__(self, table_name, table)
+
+    def __eq__(self, other):
+        return dict(self.iteritems()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def get(self, table_name, default=None):
+        if table_name in self:
+            return self[table_name]
+
+        return default
+
+    def iteritems(self):
+        for table_name in self.iterkeys():
+            yield table_name, self[table_name]
+
+    def itervalues(self):
+        for table_name in self.iterkeys():
+            yield self[table_name]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def pop(self, table_name, *default):
+        return dict.pop(self, table_name, *default)
+
+    def definition(self, table_name):
+        """ Get the definition of a table without loading its rows.
+
+            :param str table_name: name of the table
+            :returns: dictionary with every key of the table except those
+                holding a value for each row
+        """
+        return dict.__getitem__(self, table_name).definition()
+
+    def is_loaded(self, table_name):
+        """ Check whether the rows of a table have been loaded.
+
+            :param str table_name: name of the table
+            :returns: True or False
+        """
+        return dict.__getitem__(self, table_name).table is not None
+
+    def segments(self):
+        """ Iterate over the stored segment objects without loading them.
+
+            :returns: iterator of (name, segment) tuples
+        """
+        return dict.iteritems(self)
+
+def count_rows(db_path, table_name):
+    """ Get the number of rows of a table from the manifest.
+
+        :param str db_path: path to the database directory
+        :param unicode table_name: name of the table
+        :returns: number of rows, or None if the manifest does not store it
+
+        :raises IOError: cannot open manifest
+    """
+    return read_manifest(db_path)['tables'].get(table_name, {}).get('count')
+
+def create(db_path, db_format=backend.FORMAT_JSON, sync=True):
+    """ Create an empty segmented database.
+
+        :param str db_path: path to the database directory
+        :param str db_format: storage format of the segment files
+        :param Boolean sync: whether to fsync the manifest
+
+        :raises OSError: cannot create directory
+        :raises Exception: invalid format
+    """
+    backend.get_backend(db_format)
+    os.mkdir(db_path)
+    _write_manifest(db_path, {'format': db_format, 'next': 0, 'tables': {}},
+            sync)
+
+def get_format(db_path):
+    """ Get the storage format of the segment files of a database.
+
+        :param str db_path: path to the database directory
+        :returns: name of the format
+
+        :raises IOError: cannot open manifest
+    """
+    return read_manifest(db_path)['format']
+
+def get_size(db_path):
+    """ Get the size of the files of a segmented database.
+
+        :param str db_path: path to the database directory
+        :returns: size of the manifest and segment files, in bytes
+
+        :raises OSError: cannot access the files
+    """
+    return sum(os.path.getsize(os.path.join(db_path, file_name))
+            for file_name in os.listdir(db_path)
+            if file_name == MANIFEST or file_name.endswith(SEGMENT_SUFFIX))
+
+def is_segmented(db_path):
+    """ Check whether a database is stored as a directory of segments.
+
+        :param str db_path: path to the database
+        :returns: True or False
+    """
+    return os.path.isfile(manifest_path(db_path))
+
+def load(db_path, content):
+    """ Build the lazy table mapping of a database from its manifest.
+
+        :param str db_path: path to the database directory
+        :param str content: contents of the manifest
+        :returns: :class:`Tables` object
+    """
+    manifest = json.loads(content, encoding='utf-8')
+    segments = dict((table_name, Segment(entry['file'], entry['definition'],
+            count=entry.get('count')))
+            for table_name, entry in manifest['tables'].iteritems())
+
+    def loader(file_name):
+        segment_file = open(os.path.join(db_path, file_name), 'rb')
+        try:
+            return parser.load(segment_file.read()).values()[0]
+        finally:
+            segment_file.close()
+
+    return Tables(segments, loader, os.path.abspath(db_path))
+
+def manifest_path(db_path):
+    """ Get the path to the manifest of a segmented database.
+
+        :param str db_path: path to the database directory
+        :returns: path to the manifest file
+    """
+    return os.path.join(db_path, MANIFEST)
+
+def read_manifest(db_path):
+    """ Read the manifest of a segmented database.
+
+        :param str db_path: path to the database directory
+        :returns: contents of the manifest
+
+        :raises IOError: cannot open manifest
+    """
+    manifest_file = open(manifest_path(db_path), 'rb')
+    try:
+        return json.loads(manifest_file.read(), encoding='utf-8')
+    finally:
+        manifest_file.close()
+
+def tables_of(records):
+    """ Get the names of the tables affected by change records.
+
+        :param list records: change records, see :func:`journal.apply`
+        :returns: set of table names
+    """
+    tables = set()
+    for record in records:
+        tables.add(record[1])
+        if record[0] == 'rename_table':
+            tables.add(record[2])
+
+    return tables
+
+def write(db_path, db_data, table_names=None, sync=True, db_format=None):
+    """ Write the tables of a segmented database.
+
+        Changed tables are written to new segment files first, then the
+        manifest is replaced and finally the segment files no longer
+        referenced are removed, so the manifest always points to complete
+        files that match it.
+
+        :param str db_path: path to the database directory
+        :param db_data: data of the database, usually a :class:`Tables`
+            object
+        :param table_names: names of the tables whose rows changed. If None
+            is specified, every loaded table is written
+        :param Boolean sync: whether to fsync the written files
+        :param str db_format: storage format of the segment files. If None
+            is specified, the current format is kept
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+    """
+    manifest = read_manifest(db_path)
+    rewrite = db_format is not None and db_format != manifest['format']
+    if db_format:
+        manifest['format'] = db_format
+
+    if isinstance(db_data, Tables) and db_data.source == \
+            os.path.abspath(db_path):
+        segments = db_data.segments()
+    else:
+        segments = [(name, Segment(table=table))
+                for name, table in db_data.iteritems()]
+
+    tables = {}
+    locations = []
+    for table_name, segment in segments:
+        if rewrite:
+            db_data[table_name]
+
+        if segment.location is None:
+            write_segment = True
+        elif segment.table is None:
+            write_segment = False
+        else:
+            write_segment = rewrite or table_names is None or \
+                    table_name in table_names
+
+        location = segment.location
+        if write_segment:
+            # Segments are never written in place, so the current manifest
+            # keeps pointing to the old file until it is replaced
+            location = '%i%s' % (manifest['next'], SEGMENT_SUFFIX)
+            manifest['next'] += 1
+            parser.dump(os.path.join(db_path, location),
+                    {table_name: segment.table}, sync, manifest['format'])
+            locations.append((segment, location))
+
+        tables[table_name] = {'file': location,
+                'definition': segment.definition()}
+        if segment.count() is not None:
+            tables[table_name]['count'] = segment.count()
+
+    manifest['tables'] = tables
+    _write_manifest(db_path, manifest, sync)
+    for segment, location in locations:
+        segment.location = location
+
+    referenced = set(entry['file'] for entry in tables.itervalues())
+    for file_name in os.listdir(db_path):
+        if file_name.endswith(SEGMENT_SUFFIX) and file_name not in referenced:
+            os.remove(os.path.join(db_path, file_name))
+
+def _write_manifest(db_path, manifest, sync):
+    """ Atomically replace the manifest of a database. """
+    parser.dump(manifest_path(db_path), manifest, sync, backend.FORMAT_JSON)
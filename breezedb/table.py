@@ -28,7 +28,44 @@
 """
 
 import codecs
-import db, parser
+from predicate import Predicate
+import db, index, parser
+
+def count_rows(table_name, db_path, where=None):
+    """ Count the rows of the table.
+
+        Unless the table is already in memory, the number of rows is read
+        from the database file when its format stores it (see
+        :func:`parser.count_rows`), without decoding the rows.
+
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :param str where: only count the rows that match this predicate, see
+            :class:`predicate.Predicate`
+        :returns: number of rows
+
+        :raises IOError: cannot open file
+        :raises ValueError: value cannot be converted to the field type
+        :raises Exception: table or field does not exist, invalid predicate
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        table = codecs.decode(table_name, 'utf-8')
+        if where is None:
+            return parser.count_rows(db_path, table)
+
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            predicate = Predicate(codecs.decode(where, 'utf-8'),
+                    db_data[table]['fields'])
+            return len(predicate.find(db_data[table]))
+
+    except IOError as e:
+        raise e
+    except ValueError as e:
+        raise e
 
 def create_table(table_name, db_path):
     """ Create a new table in the database.
@@ -45,8 +82,38 @@ def create_table(table_name, db_path):
             raise Exception('Table %s already exists' % table_name)
 
         db_data = parser.read(db_path)
-        db_data[codecs.decode(table_name, 'utf-8')] = {"fields":[],"rows":[]}
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data,
+                ['create_table', codecs.decode(table_name, 'utf-8')])
+
+    except IOError as e:
+        raise e
+    except OSError as e:
+        raise e
+
+def enable_row_ids(table_name, db_path):
+    """ Give every row of the table an id that does not change when other
+        rows are removed.
+
+        Existing rows are numbered from 0 in order, and new rows receive
+        the next id. Ids of removed rows are never reused.
+
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+
+        :raises IOError: cannot open file
+        :raises OSError: error writing to database
+        :raises Exception: table does not exist, row ids already enabled
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        db_data = parser.read(db_path)
+        table = codecs.decode(table_name, 'utf-8')
+        if 'next_id' in parser.definition(db_data, table):
+            raise Exception('Table %s already has row ids' % table_name)
+
+        parser.update(db_path, db_data, ['enable_row_ids', table])
 
     except IOError as e:
         raise e
@@ -68,7 +135,7 @@ def exists_table(table_name, db_path):
             raise Exception('Not a breezedb database: %s' % db_path)
 
         db_data = parser.read(db_path)
-        if table_name.decode('utf-8') in sorted(db_data.iterkeys()):
+        if table_name.decode('utf-8') in db_data:
             return True
         else:
             return False
@@ -92,38 +159,46 @@ def get_field_list(table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
         db_data = parser.read(db_path)
-        return db_data[codecs.decode(table_name, 'utf-8')]['fields']
+        return [dict(f) for f in parser.definition(db_data,
+                codecs.decode(table_name, 'utf-8'))['fields']]
 
     except IOError as e:
         raise e
     except KeyError as e:
         raise e
 
-def get_row(index, table_name, db_path):
+def get_row(index, table_name, db_path, fields=None):
     """ Get the elements located in a row of the table.
 
         :param int index: index of the row
         :param str table_name: name of the table
         :param str db_path: path to the database
-        :returns: list containing the data of the row, ordered by field
+        :param list fields: names of the fields whose elements to get
+        :returns: list containing the data of the row, ordered by field, or
+            tuple containing the elements of the given fields
 
         :raises IndexError: invalid index
         :raises IOError: cannot open file
         :raises KeyError: invalid field key
-        :raises Exception: table does not exist
+        :raises Exception: table or field does not exist
     """
     try:
         if not exists_table(table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
-        db_data = parser.read(db_path)
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = codecs.decode(table_name, 'utf-8')
+            if fields is not None:
+                row = db_data[table]['rows'][index]
+                return tuple(row[f] for f in _check_fields(db_data, table,
+                        fields))
 
-        elementlist = []
-        table = codecs.decode(table_name, 'utf-8')
-        for f in db_data[table]['fields']:
-            elementlist.append(db_data[table]['rows'][index][f.keys()[0]])
+            elementlist = []
+            for f in db_data[table]['fields']:
+                elementlist.append(db_data[table]['rows'][index][f.keys()[0]])
 
-        return elementlist
+            return elementlist
 
     except IndexError as e:
         raise e
@@ -132,34 +207,139 @@ def get_row(index, table_name, db_path):
     except KeyError as e:
         raise e
 
-def get_row_list(table_name, db_path):
+def get_row_by_id(row_id, table_name, db_path):
+    """ Get the elements located in a row of the table from its id (see
+        :func:`enable_row_ids`).
+
+        :param int row_id: id of the row
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :returns: list containing the data of the row, ordered by field
+
+        :raises IOError: cannot open file
+        :raises Exception: table does not exist or has no row ids, row
+            does not exist
+    """
+    try:
+        with parser.reading(db_path):
+            return get_row(_find_id(row_id, table_name, db_path), table_name,
+                    db_path)
+
+    except IOError as e:
+        raise e
+
+def get_row_ids(table_name, db_path):
+    """ Get the id of every row of the table (see :func:`enable_row_ids`).
+
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :returns: list of ids, in the order of the rows
+
+        :raises IOError: cannot open file
+        :raises Exception: table does not exist or has no row ids
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = db_data[codecs.decode(table_name, 'utf-8')]
+            if 'row_ids' not in table:
+                raise Exception('Table %s has no row ids' % table_name)
+
+            return list(table['row_ids'])
+
+    except IOError as e:
+        raise e
+
+def get_row_list(table_name, db_path, where=None, fields=None):
     """ Get a list of all the rows in the table
 
+        When only some fields are requested from every row, the rows are
+        read with :func:`iter_rows`, so formats that store each field
+        separately do not decode the rest.
+
         :param str table_name: name of the table
         :param str db_path: path to the database
-        :returns: list of data rows in dictionary format
+        :param str where: only get the rows that match this predicate, see
+            :class:`predicate.Predicate`. If None is specified, every row is
+            included
+        :param list fields: names of the fields whose elements to get. If
+            None is specified, every field is included
+        :returns: list of data rows in dictionary format, or list of tuples
+            containing the elements of the given fields
 
         :raises IOError: cannot open file
         :raises KeyError: invalid field key
-        :raises Exception: table does not exist
+        :raises ValueError: value cannot be converted to the field type
+        :raises Exception: table or field does not exist, invalid predicate
     """
     try:
         if not exists_table(table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
-        db_data = parser.read(db_path)
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = codecs.decode(table_name, 'utf-8')
+            if fields is not None:
+                fields = _check_fields(db_data, table, fields)
+                if where is None:
+                    return [tuple(row[f] for f in fields) for row in
+                            parser.iter_rows(db_path, table, fields)]
 
-        elementlist = []
-        table = codecs.decode(table_name, 'utf-8')
-        for row in db_data[table]['rows']:
-            elementlist.append(row)
+            elementlist = []
+            rows = db_data[table]['rows']
+            if where is not None:
+                predicate = Predicate(codecs.decode(where, 'utf-8'),
+                        db_data[table]['fields'])
+                rows = [rows[position] for position in
+                        predicate.find(db_data[table])]
 
-        return elementlist
+            if fields is not None:
+                return [tuple(row[f] for f in fields) for row in rows]
+
+            for row in rows:
+                elementlist.append(dict(row))
+
+            return elementlist
 
     except IOError as e:
         raise e
     except KeyError as e:
         raise e
+    except ValueError as e:
+        raise e
+
+def iter_rows(table_name, db_path, fields=None):
+    """ Iterate over the rows of the table without building a list of all
+        of them.
+
+        Unless the table is already in memory, rows are decoded one at a
+        time from the database file, so memory usage does not depend on the
+        size of the table.
+
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :param list fields: names of the fields to include in each row. If
+            None is specified, every field is included
+        :returns: iterator of data rows in dictionary format
+
+        :raises IOError: cannot open file
+        :raises Exception: table or field does not exist
+    """
+    try:
+        if not exists_table(table_name, db_path):
+            raise Exception('Table %s does not exist' % table_name)
+
+        table = codecs.decode(table_name, 'utf-8')
+        if fields is not None:
+            fields = _check_fields(parser.read(db_path), table, fields)
+
+        return parser.iter_rows(db_path, table, fields)
+
+    except IOError as e:
+        raise e
 
 def rename_table(table_name, db_path, new_name):
     """ Rename a table from the database.
@@ -179,10 +359,9 @@ def rename_table(table_name, db_path, new_name):
             raise Exception('Table %s already exists' % new_name)
 
         db_data = parser.read(db_path)
-        db_data[codecs.decode(new_name, 'utf-8')] =\
-                db_data[codecs.decode(table_name, 'utf-8')]
-        del db_data[codecs.decode(table_name, 'utf-8')]
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data, ['rename_table',
+                codecs.decode(table_name, 'utf-8'),
+                codecs.decode(new_name, 'utf-8')])
 
     except IOError as e:
         raise e
@@ -204,8 +383,8 @@ def remove_table(table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
         db_data = parser.read(db_path)
-        del db_data[codecs.decode(table_name, 'utf-8')]
-        parser.write(db_path, db_data)
+        parser.update(db_path, db_data,
+                ['remove_table', codecs.decode(table_name, 'utf-8')])
 
     except IOError as e:
         raise e
@@ -234,42 +413,222 @@ def search_data(data, table_name, db_path, field_name=None, ignore_case=True):
         if not exists_table(table_name, db_path):
             raise Exception('Table %s does not exist' % table_name)
 
-        db_data = parser.read(db_path)
-
-        index_list = []
-        for index, row in enumerate(db_data[codecs.decode(
-                table_name, 'utf-8')]['rows']):
-            if field_name:
-                element = row[codecs.decode(field_name, 'utf-8')]
-                if ignore_case and isinstance(element, (str, unicode)):
-                    if data.decode('utf-8').lower() in element.lower():
-                        index_list.append(index)
-                elif not ignore_case and isinstance(element, (str, unicode)):
-                    if data.decode('utf-8') in element:
-                        index_list.append(index)
-                else:
-                    # Numbers
-                    if data == element:
-                        index_list.append(index)
-            else:
-                for value in sorted(row.itervalues()):              
-                    if ignore_case and isinstance(value, (str, unicode)):
-                        if data.decode('utf-8').lower() in value.lower():
-                            index_list.append(index)
-                            break
-                    elif not ignore_case and isinstance(value, (str, unicode)):
-                        if data.decode('utf-8') in value:
-                            index_list.append(index)
-                            break
+        with parser.reading(db_path):
+            db_data = parser.read(db_path)
+            table = db_data[codecs.decode(table_name, 'utf-8')]
+
+            # Text is searched within string elements, while numbers are
+            # only compared for equality, which a hash index answers without
+            # checking every row
+            text = isinstance(data, (str, unicode))
+            if field_name and not text:
+                index_list = index.lookup(table,
+                        codecs.decode(field_name, 'utf-8'), data, True)
+                if index_list is not None:
+                    return index_list
+
+            if text:
+                data = data.decode('utf-8')
+                folded = data.lower()
+
+            rows = table['rows']
+            positions = xrange(len(rows))
+            if field_name and text:
+                # A trigram index narrows down the rows that may contain the
+                # text
+                candidates = index.candidates(table,
+                        codecs.decode(field_name, 'utf-8'), data)
+                if candidates is not None:
+                    positions = candidates
+
+            index_list = []
+            for position in positions:
+                row = rows[position]
+                if field_name:
+                    element = row[codecs.decode(field_name, 'utf-8')]
+                    if text and ignore_case and isinstance(element,
+                            (str, unicode)):
+                        if folded in element.lower():
+                            index_list.append(position)
+                    elif text and not ignore_case and isinstance(element,
+                            (str, unicode)):
+                        if data in element:
+                            index_list.append(position)
                     else:
                         # Numbers
-                        if data == value:
-                            index_list.append(index)
-                            break
-        return index_list
+                        if data == element:
+                            index_list.append(position)
+                else:
+                    for value in sorted(row.itervalues()):              
+                        if text and ignore_case and isinstance(value,
+                                (str, unicode)):
+                            if folded in value.lower():
+                                index_list.append(position)
+                                break
+                        elif text and not ignore_case and isinstance(value,
+                                (str, unicode)):
+                            if data in value:
+                                index_list.append(position)
+                                break
+                        else:
+                            # Numbers
+                            if data == value:
+                                index_list.append(position)
+                                break
+            return index_list
 
     except IOError as e:
         raise e
     except OSError as e:
         raise e
 
+def search_prefix(prefix, table_name, db_path, field_name):
+    """ Search the rows whose element of a field starts with a string.
+
+        The search is case sensitive and uses the ordered index of the field
+        if it has one, once it is built (see :func:`index.get`).
+
+        :param str prefix: beginning of the elements to find
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :param str field_name: name of the field to search
+        :returns: list of indexes of the matching rows, in the order of
+            their elements
+
+        :raises IOError: cannot open file
+        :raises Exception: table or field does not exist
+    """
+    try:
+        with parser.reading(db_path):
+            table, field = _get_table(table_name, field_name, db_path)
+            prefix = codecs.decode(prefix, 'utf-8')
+
+            ordered = index.get(table, field, index.ORDERED, True)
+            if ordered is not None:
+                return ordered.prefix(prefix)
+
+            return [position for value, position in sorted(
+                    (row[field], position) for position, row in enumerate(
+                    table['rows']) if isinstance(row[field], (str, unicode))
+                    and row[field] != "" and row[field].startswith(prefix))]
+
+    except IOError as e:
+        raise e
+
+def search_range(low, high, table_name, db_path, field_name):
+    """ Search the rows whose element of a field is between two values,
+        both included. Empty elements are never found.
+
+        Uses the ordered index of the field if it has one, once it is built
+        (see :func:`index.get`).
+
+        :param low: smallest element to find, or None for no lower limit
+        :param high: largest element to find, or None for no upper limit
+        :param str table_name: name of the table that contains the field
+        :param str db_path: path to the database
+        :param str field_name: name of the field to search
+        :returns: list of indexes of the matching rows, in the order of
+            their elements
+
+        :raises IOError: cannot open file
+        :raises Exception: table or field does not exist
+    """
+    try:
+        with parser.reading(db_path):
+            table, field = _get_table(table_name, field_name, db_path)
+
+            ordered = index.get(table, field, index.ORDERED, True)
+            if ordered is not None:
+                return ordered.range(low, high)
+
+            return [position for value, position in sorted(
+                    (row[field], position) for position, row in enumerate(
+                    table['rows']) if row[field] != "" and
+                    (low is None or row[field] >= low) and
+                    (high is None or row[field] <= high))]
+
+    except IOError as e:
+        raise e
+
+def sort_data(field_name, table_name, db_path, reverse=False):
+    """ Sort the rows of the table by the elements of a field. Rows whose
+        element is empty are left out.
+
+        Uses the ordered index of the field if it has one, once it is built
+        (see :func:`index.get`).
+
+        :param str field_name: name of the field to sort by
+        :param str table_name: name of the table
+        :param str db_path: path to the database
+        :param Boolean reverse: whether to sort from the largest element
+        :returns: list of indexes of the rows, in the order of their
+            elements. Rows with the same element keep their order
+
+        :raises IOError: cannot open file
+        :raises Exception: table or field does not exist
+    """
+    try:
+        with parser.reading(db_path):
+            table, field = _get_table(table_name, field_name, db_path)
+
+            ordered = index.get(table, field, index.ORDERED, True)
+            if ordered is not None:
+                positions = ordered.range()
+            else:
+                positions = [position for value, position in sorted(
+                        (row[field], position) for position, row in enumerate(
+                        table['rows'])) if value != ""]
+
+            if reverse:
+                rows = table['rows']
+                positions.sort(key=lambda p: rows[p][field], reverse=True)
+
+            return positions
+
+    except IOError as e:
+        raise e
+
+def _check_fields(db_data, table_name, fields):
+    """ Decode the names of some fields of a table, checking that they
+        exist.
+    """
+    names = [f.keys()[0] for f in
+            parser.definition(db_data, table_name)['fields']]
+    fields = [codecs.decode(f, 'utf-8') for f in fields]
+    for f in fields:
+        if f not in names:
+            raise Exception('Field %s does not exist' % f)
+
+    return fields
+
+def _find_id(row_id, table_name, db_path):
+    """ Find the index of a row from its id, checking that it exists. """
+    if not exists_table(table_name, db_path):
+        raise Exception('Table %s does not exist' % table_name)
+
+    db_data = parser.read(db_path)
+    table = db_data[codecs.decode(table_name, 'utf-8')]
+    if 'row_ids' not in table:
+        raise Exception('Table %s has no row ids' % table_name)
+
+    position = index.find_id(table, row_id)
+    if position is None:
+        raise Exception('Row with id %i does not exist' % row_id)
+
+    return position
+
+def _get_table(table_name, field_name, db_path):
+    """ Get a table and the decoded name of one of its fields, checking
+        that both exist.
+    """
+    if not exists_table(table_name, db_path):
+        raise Exception('Table %s does not exist' % table_name)
+
+    db_data = parser.read(db_path)
+    table = codecs.decode(table_name, 'utf-8')
+    field = codecs.decode(field_name, 'utf-8')
+    if not [f for f in parser.definition(db_data, table)['fields']
+            if field in f]:
+        raise Exception('Field %s does not exist' % field_name)
+
+    return db_data[table], field
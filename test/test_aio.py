@@ -0,0 +1,88 @@
+import os, shutil, sys, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import aio, parser
+
+db = os.path.join(test_root, 'aiotemp.brdb')
+
+class TestAio(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isfile(db):
+            os.remove(db)
+        shutil.copy(os.path.join(test_root, 'db.brdb'), db)
+        parser.clear_cache()
+
+    def tearDown(self):
+        breezedb.remove_db(db)
+
+    def test_result(self):
+        future = aio.get_row(0, 'table_1', db)
+        self.assertEquals(future.result(5), [0, u'Name1', u'Name2'])
+        self.assertEquals(future.done(), True)
+        self.assertEquals(future.exception(), None)
+
+    def test_exception(self):
+        future = aio.get_row_list('inexistent', db)
+        self.assertTrue(future.exception(5) is not None)
+        try:
+            future.result()
+            self.assertEquals(False, True)
+        except Exception as e:
+            self.assertTrue('inexistent' in str(e))
+
+    def test_callback(self):
+        results = []
+        future = aio.exists_table('table_1', db)
+        future.result(5)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        self.assertEquals(results, [True])
+
+    def test_write(self):
+        aio.create_row([5, 'Name5', 'Name52'], 'table_1', db).result(5)
+        self.assertEquals(breezedb.get_row(2, 'table_1', db),
+                [5, u'Name5', u'Name52'])
+
+        result = aio.run_query('GET ROW %2%; IN %table_1%; AT %' + db +
+                '%;').result(5)
+        self.assertEquals(result, [[5, u'Name5', u'Name52']])
+
+    def test_coalesced_reads(self):
+        misses = parser.get_cache_info()['misses']
+        futures = [aio.get_row_list('table_1', db) for _ in range(10)]
+        for future in futures:
+            self.assertEquals(len(future.result(5)), 2)
+
+        self.assertEquals(parser.get_cache_info()['misses'], misses + 1)
+
+    def test_coalesced_reads_uncached(self):
+        # The shared load is kept until every read has used it, even if
+        # the database does not fit in the cache
+        limit = parser.CACHE_LIMIT
+        parser.set_cache_limit(0)
+        try:
+            misses = parser.get_cache_info()['misses']
+            futures = [aio.get_row_list('table_1', db) for _ in range(10)]
+            for future in futures:
+                self.assertEquals(len(future.result(5)), 2)
+
+            self.assertEquals(parser.get_cache_info()['misses'], misses + 1)
+            self.assertEquals(parser.get_cache_info()['entries'], 0)
+        finally:
+            parser.set_cache_limit(limit)
+
+    def test_set_max_workers(self):
+        aio.get_row(0, 'table_1', db).result(5)
+        workers = aio._executor.workers
+        aio.set_max_workers(aio.MAX_WORKERS)
+        for worker in workers:
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+
+        self.assertEquals(aio.get_row(0, 'table_1', db).result(5),
+                [0, u'Name1', u'Name2'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import os, shutil, sys, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import backend, parser, segment
+
+data = {
+    u'table_1': {
+        u'fields': [{u'id': u'int'}, {u'name': u'str'}, {u'score': u'float'},
+            {u'ok': u'bool'}],
+        u'rows': [
+            {u'id': 0, u'name': u'Ñame', u'score': 1.5, u'ok': 1},
+            {u'id': 23, u'name': u'', u'score': u'', u'ok': u''},
+            {u'id': 2 ** 70, u'name': u'a\x00b', u'score': 3, u'ok': 0}
+        ]
+    },
+    u'table_2': {
+        u'fields': [],
+        u'rows': [{}, {}]
+    },
+    u'table_3': {
+        u'fields': [{u'id': u'int'}],
+        u'rows': []
+    }
+}
+
+class MarkedBackend(backend.JSONBackend):
+    """ JSON prefixed with a marker, to test registration. """
+
+    name = 'marked'
+
+    def detect(self, head):
+        return head.startswith('MARK')
+
+    def encode(self, db_data):
+        return 'MARK' + backend.JSONBackend.encode(self, db_data)
+
+    def decode(self, content):
+        return backend.JSONBackend.decode(self, content[4:])
+
+class TestBackend(unittest.TestCase):
+
+    def test_roundtrip(self):
+        for name in ['json', 'compact', 'binary']:
+            content = parser.encode(data, name)
+            self.assertEquals(backend.detect_backend(content[:64]).name, name)
+            self.assertEquals(parser.load(content), data)
+
+    def test_read_index(self):
+        for name in ['json', 'compact', 'binary']:
+            db_backend = backend.get_backend(name)
+            content = parser.encode(data, name)
+            index = db_backend.read_index(content)
+            self.assertEquals(sorted(index), sorted(data))
+            for table_name, (definition, location) in index.iteritems():
+                self.assertEquals(definition,
+                        {u'fields': data[table_name][u'fields']})
+                self.assertEquals(db_backend.read_table(content, location),
+                        data[table_name])
+
+        json_backend = backend.get_backend('json')
+        self.assertEquals(json_backend.read_index('{"table_1": {}}'), None)
+        self.assertEquals(json_backend.read_index('{}'), None)
+
+    def test_row_ids(self):
+        ids = {u'table_1': dict(data[u'table_1'], row_ids=[0, 2, 5],
+                next_id=6)}
+        for name in ['json', 'compact', 'binary']:
+            db_backend = backend.get_backend(name)
+            content = parser.encode(ids, name)
+            self.assertEquals(parser.load(content), ids)
+
+            # The ids are stored with the rows, not in the definition
+            definition, location = db_backend.read_index(content)[u'table_1']
+            self.assertEquals(definition, {u'fields': data[u'table_1'][
+                    u'fields'], u'next_id': 6})
+            self.assertEquals(db_backend.read_table(content, location),
+                    ids[u'table_1'])
+
+    def test_lazy_read(self):
+        path = os.path.join(test_root, 'lazydb.brdb')
+        breezedb.create_db(test_root, 'lazydb')
+        try:
+            parser.write(path, data)
+            parser.clear_cache()
+            self.assertEquals(breezedb.get_table_list(path),
+                    [u'table_1', u'table_2', u'table_3'])
+            self.assertEquals(breezedb.get_field_list('table_3', path),
+                    [{u'id': u'int'}])
+            self.assertEquals(breezedb.get_field_type('name', 'table_1',
+                path), u'str')
+
+            db_data = parser.read(path)
+            self.assertTrue(isinstance(db_data, segment.Tables))
+            for table_name, s in db_data.segments():
+                self.assertTrue(s.table is None)
+
+            self.assertEquals(breezedb.get_row(1, 'table_1', path),
+                    [23, u'', u'', u''])
+            self.assertEquals(db_data, data)
+        finally:
+            breezedb.remove_db(path)
+
+    def test_iter_rows(self):
+        path = os.path.join(test_root, 'lazydb.brdb')
+        read_size = backend.READ_SIZE
+        backend.READ_SIZE = 7
+        try:
+            for name in ['json', 'compact', 'binary']:
+                breezedb.create_db(test_root, 'lazydb', name)
+                parser.write(path, data)
+                parser.clear_cache()
+
+                db_file = open(path, 'rb')
+                try:
+                    db_backend = backend.get_backend(name)
+                    for table_name, table in data.iteritems():
+                        rows = db_backend.iter_rows(db_file, table_name)
+                        self.assertEquals(list(rows), table['rows'])
+
+                    rows = db_backend.iter_rows(db_file, u'table_1',
+                            [u'name', u'score'])
+                    self.assertEquals(list(rows), [{u'name': r[u'name'],
+                        u'score': r[u'score']} for r in data[u'table_1'][
+                            u'rows']])
+                finally:
+                    db_file.close()
+
+                self.assertEquals(list(breezedb.iter_rows('table_1', path)),
+                        data[u'table_1'][u'rows'])
+                breezedb.remove_db(path)
+        finally:
+            backend.READ_SIZE = read_size
+            if os.path.isfile(path):
+                breezedb.remove_db(path)
+
+    def test_count_rows(self):
+        path = os.path.join(test_root, 'lazydb.brdb')
+        try:
+            for name in ['compact', 'binary']:
+                breezedb.create_db(test_root, 'lazydb', name)
+                parser.write(path, data)
+                parser.clear_cache()
+
+                db_file = open(path, 'rb')
+                try:
+                    db_backend = backend.get_backend(name)
+                    for table_name, table in data.iteritems():
+                        self.assertEquals(db_backend.count_rows(db_file,
+                            table_name), len(table['rows']))
+                finally:
+                    db_file.close()
+
+                # The rows are counted without loading the table
+                self.assertEquals(breezedb.count_rows('table_1', path), 3)
+                self.assertFalse(parser.read(path).is_loaded(u'table_1'))
+                breezedb.remove_db(path)
+        finally:
+            if os.path.isfile(path):
+                breezedb.remove_db(path)
+
+    def test_truncated_rows(self):
+        path = os.path.join(test_root, 'lazydb.brdb')
+        breezedb.create_db(test_root, 'lazydb', 'compact')
+        try:
+            parser.write(path, data)
+            content = open(path, 'rb').read()
+            db_file = open(path, 'wb')
+            db_file.write(content[:content.rindex('[]') + 1])
+            db_file.close()
+            parser.clear_cache()
+
+            # Reported as an error rather than as a table without elements
+            try:
+                breezedb.get_field_max('id', 'table_3', path)
+                self.assertEquals(False, True)
+            except ValueError:
+                self.assertTrue(True, True)
+        finally:
+            breezedb.remove_db(path)
+
+    def test_binary_typed_columns(self):
+        binary = backend.get_backend('binary')
+        block = binary.encode_column([1, 2, 3], 'int')
+        self.assertEquals(block[0][0], binary.INT)
+        self.assertEquals(len(block[1]), 3 * 8)
+
+        block = binary.encode_column([1.0, u'', 3.0], 'float')
+        self.assertEquals(block[0][0], binary.FLOAT)
+
+        block = binary.encode_column([u'a', 5], 'str')
+        self.assertEquals(block[0][0], binary.JSON)
+
+    def test_binary_db(self):
+        path = os.path.join(test_root, 'binarydb.brdb')
+        breezedb.create_db(test_root, 'binarydb', 'binary')
+        try:
+            self.assertEquals(breezedb.get_db_format(path), 'binary')
+            breezedb.create_table('table', path)
+            breezedb.create_field('id', 'int', 'table', path)
+            breezedb.create_field('name', 'str', 'table', path)
+            breezedb.create_row([1, 'Name'], 'table', path)
+            self.assertTrue(open(path, 'rb').read().startswith('BRDB'))
+
+            parser.clear_cache()
+            self.assertEquals(breezedb.get_row(0, 'table', path), [1, u'Name'])
+        finally:
+            breezedb.remove_db(path)
+
+    def test_register_backend(self):
+        backend.register_backend(MarkedBackend())
+        self.assertTrue('marked' in backend.get_backend_list())
+
+        content = parser.encode(data, 'marked')
+        self.assertEquals(parser.load(content), data)
+
+    def test_invalid_format(self):
+        try:
+            backend.get_backend('xml')
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
-import os, shutil, sys, unittest
+import json, os, shutil, sys, unittest
 
 test_root = os.path.abspath(os.path.dirname(__file__))
 
 import breezedb
+from breezedb import parser
 
 class TestDBOperations(unittest.TestCase):
 
@@ -18,6 +19,51 @@ class TestDBOperations(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_compact_format(self):
+        path = os.path.join(test_root, 'compactdb.brdb')
+        breezedb.create_db(test_root, 'compactdb', 'compact')
+        try:
+            self.assertEquals(breezedb.get_db_format(path), 'compact')
+            breezedb.create_table('table', path)
+            breezedb.create_field('id', 'int', 'table', path)
+            breezedb.create_field('name', 'str', 'table', path)
+            breezedb.create_row([1, 'Name'], 'table', path)
+
+            parser.clear_cache()
+            self.assertEquals(breezedb.get_row(0, 'table', path), [1, u'Name'])
+            header, tables = json.load(open(path))
+            self.assertEquals(header[u'format'], u'compact')
+            self.assertEquals(tables, {u'table': {
+                u'fields': [{u'id': u'int'}, {u'name': u'str'}],
+                u'rows': [[1, u'Name']]}})
+        finally:
+            breezedb.remove_db(path)
+
+    def test_convert_db(self):
+        path = os.path.join(test_root, 'convertdb.brdb')
+        shutil.copy(os.path.join(test_root, 'db.brdb'), path)
+        try:
+            expected = breezedb.get_row_list('table_1', path)
+            breezedb.convert_db(path, 'compact')
+            self.assertEquals(breezedb.get_db_format(path), 'compact')
+            self.assertTrue(os.path.getsize(path) <
+                    os.path.getsize(os.path.join(test_root, 'db.brdb')))
+
+            parser.clear_cache()
+            self.assertEquals(breezedb.get_row_list('table_1', path), expected)
+
+            breezedb.convert_db(path, 'json')
+            self.assertEquals(breezedb.get_db_format(path), 'json')
+        finally:
+            breezedb.remove_db(path)
+
+    def test_create_db_invalid_format(self):
+        try:
+            breezedb.create_db(test_root, 'formatdb', 'xml')
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_get_table_list(self):
         path = os.path.join(test_root, 'tempdb.brdb')
         result = breezedb.get_table_list(path)
@@ -19,6 +19,33 @@ class TestElement(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_create_rows(self):
+        count = len(breezedb.get_row_list(table, db))
+        breezedb.create_rows(([i, 'Row%i' % i, ''] for i in range(2)),
+                table, db)
+        rows = breezedb.get_row_list(table, db)
+        self.assertEquals(len(rows), count + 2)
+        self.assertEquals(rows[-1], {u'id': 1, u'name': u'Row1',
+            u'name2': u''})
+
+    def test_create_rows_invalid(self):
+        count = len(breezedb.get_row_list(table, db))
+        try:
+            breezedb.create_rows([[5, 'Valid', ''], ['invalid', '', '']],
+                    table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertEquals(len(breezedb.get_row_list(table, db)), count)
+
+    def test_create_rows_query(self):
+        count = len(breezedb.get_row_list(table, db))
+        breezedb.run_query('CREATE ROWS %7%; %Seven%; %7%; %8%; %Eight%; %8%; '
+                'IN %' + table + '%; AT %' + db + '%;')
+        rows = breezedb.get_row_list(table, db)
+        self.assertEquals(rows[count:], [
+            {u'id': 7, u'name': u'Seven', u'name2': u'7'},
+            {u'id': 8, u'name': u'Eight', u'name2': u'8'}])
+
     def test_empty_element(self):
         breezedb.empty_element(0, 'id', table, db)
 
@@ -48,6 +75,54 @@ class TestElement(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_get_row_by_key(self):
+        breezedb.create_table('keys_get', db)
+        breezedb.run_query('CREATE PRIMARY KEY %code%; %str%; IN %keys_get%; AT %' + db + '%;')
+        breezedb.create_field('amount', 'int', 'keys_get', db)
+        breezedb.create_rows([['a', '1'], ['b', '2']], 'keys_get', db)
+
+        self.assertEquals([u'b', 2], breezedb.get_row_by_key('b', 'keys_get', db))
+        self.assertEquals([[u'a', 1]], breezedb.run_query(
+            'GET ROW BY KEY %a%; IN %keys_get%; AT %' + db + '%;'))
+
+    def test_get_row_by_key_duplicate(self):
+        breezedb.create_table('keys_duplicate', db)
+        breezedb.create_field('id', 'int', 'keys_duplicate', db, True)
+        breezedb.create_row(['1'], 'keys_duplicate', db)
+        try:
+            breezedb.create_row(['1'], 'keys_duplicate', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+        self.assertEquals(1, len(breezedb.get_row_list('keys_duplicate', db)))
+
+    def test_get_row_by_key_inexistent(self):
+        try:
+            breezedb.get_row_by_key('1', table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+    def test_modify_by_key(self):
+        breezedb.create_table('keys_modify', db)
+        breezedb.create_field('id', 'int', 'keys_modify', db, True)
+        breezedb.create_field('name', 'str', 'keys_modify', db)
+        breezedb.create_rows([['1', 'One'], ['2', 'Two']], 'keys_modify', db)
+
+        breezedb.run_query('MODIFY BY KEY %2%; FROM %name%; IN %keys_modify%; AT %' + db + '%; TO %Dos%;')
+        breezedb.modify_by_key(1, 'id', 'keys_modify', db, '3')
+        self.assertEquals([3, u'One'],
+                breezedb.get_row_by_key(3, 'keys_modify', db))
+        self.assertEquals([2, u'Dos'],
+                breezedb.get_row_by_key(2, 'keys_modify', db))
+
+        try:
+            breezedb.modify_by_key(3, 'id', 'keys_modify', db, '2')
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_modify_element(self):
         breezedb.modify_element(0, 'id', table, db, 13)
 
@@ -58,9 +133,76 @@ class TestElement(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_modify_where(self):
+        breezedb.create_table('rows_modify', db)
+        breezedb.create_field('id', 'int', 'rows_modify', db)
+        breezedb.create_field('name', 'str', 'rows_modify', db)
+        breezedb.create_index('id', 'rows_modify', db, 'ordered')
+        breezedb.create_rows([[str(i), 'Row %d' % i] for i in range(10)],
+                'rows_modify', db)
+
+        breezedb.run_query('UPDATE %rows_modify%; SET %name%; %Low%; WHERE %id < 3 OR id = 9%; AT %' + db + '%;')
+        breezedb.modify_where("name = 'Low' AND NOT id >= 2", {'id': '-1'},
+                'rows_modify', db)
+        self.assertEquals([-1, -1, 2, 3, 4, 5, 6, 7, 8, 9],
+                breezedb.get_field_data('id', 'rows_modify', db))
+        self.assertEquals(4, breezedb.get_field_data('name', 'rows_modify',
+                db).count(u'Low'))
+
+    def test_modify_where_duplicate(self):
+        breezedb.create_table('keys_where', db)
+        breezedb.create_field('id', 'int', 'keys_where', db, True)
+        breezedb.create_field('name', 'str', 'keys_where', db)
+        breezedb.create_rows([['1', 'One'], ['2', 'Two'], ['3', 'Three']],
+                'keys_where', db)
+
+        with breezedb.Database(db) as handle:
+            try:
+                handle.modify_where('id > 1', {'name': 'Changed', 'id': '4'},
+                        'keys_where')
+                self.assertEquals(False, True)
+            except:
+                self.assertTrue(True, True)
+
+            self.assertEquals([1, 2, 3],
+                    handle.get_field_data('id', 'keys_where'))
+            handle.create_row(['4', 'Four'], 'keys_where')
+
+        breezedb.parser.clear_cache()
+        self.assertEquals([u'One', u'Two', u'Three', u'Four'],
+                breezedb.get_field_data('name', 'keys_where', db))
+
+    def test_modify_where_invalid(self):
+        try:
+            breezedb.modify_where("id = AND", {'id': '1'}, 'rows_modify', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_remove_row(self):
         breezedb.remove_row(0, table, db)
 
+    def test_remove_row_by_id(self):
+        breezedb.enable_row_ids('table_2', db)
+        breezedb.create_row(['5', 'Five', '5'], 'table_2', db)
+        self.assertEquals([0, 1, 2], breezedb.get_row_ids('table_2', db))
+
+        breezedb.run_query('REMOVE ROW BY ID %0%; %1%; IN %table_2%; AT %' + db + '%;')
+        self.assertEquals([2], breezedb.get_row_ids('table_2', db))
+        self.assertEquals(False, breezedb.exists_row_id(0, 'table_2', db))
+
+        breezedb.create_row(['6', 'Six', '6'], 'table_2', db)
+        breezedb.remove_row_by_id(2, 'table_2', db)
+        self.assertEquals([6, u'Six', u'6'],
+                breezedb.get_row_by_id(3, 'table_2', db))
+
+    def test_remove_row_by_id_inexistent(self):
+        try:
+            breezedb.remove_row_by_id(0, 'table_2', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_remove_row_inexistent(self):
         try:
             breezedb.remove_row(110, table, db)
@@ -68,6 +210,64 @@ class TestElement(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_remove_rows(self):
+        breezedb.create_table('rows_remove', db)
+        breezedb.create_field('id', 'int', 'rows_remove', db, True)
+        breezedb.create_rows([[str(i)] for i in range(10)], 'rows_remove', db)
+        breezedb.enable_row_ids('rows_remove', db)
+
+        breezedb.run_query('REMOVE ROW %1%; %2%; IN %rows_remove%; AT %' + db + '%;')
+        breezedb.remove_rows([0, 6, 3, 0], 'rows_remove', db)
+        self.assertEquals([3, 4, 6, 7, 9],
+                breezedb.get_field_data('id', 'rows_remove', db))
+        self.assertEquals([3, 4, 6, 7, 9],
+                breezedb.get_row_ids('rows_remove', db))
+        self.assertEquals([7], breezedb.get_row_by_key(7, 'rows_remove', db))
+
+    def test_remove_rows_inexistent(self):
+        try:
+            breezedb.remove_rows([0, 110], table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+    def test_remove_where(self):
+        breezedb.create_table('rows_where', db)
+        breezedb.create_field('id', 'int', 'rows_where', db, True)
+        breezedb.create_field('amount', 'float', 'rows_where', db)
+        breezedb.create_rows([[str(i), str(i * 1.5)] for i in range(10)],
+                'rows_where', db)
+
+        breezedb.run_query('DELETE FROM %rows_where%; WHERE %amount > 6 AND id != 8%; AT %' + db + '%;')
+        breezedb.remove_where('id = 0 OR id = 8', 'rows_where', db)
+        self.assertEquals([1, 2, 3, 4],
+                breezedb.get_field_data('id', 'rows_where', db))
+
+    def test_remove_where_inexistent(self):
+        try:
+            breezedb.remove_where('missing = 1', 'rows_where', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+    def test_upsert_rows(self):
+        breezedb.create_table('keys_upsert', db)
+        breezedb.create_field('id', 'int', 'keys_upsert', db, True)
+        breezedb.create_field('name', 'str', 'keys_upsert', db)
+        breezedb.upsert_row(['1', 'One'], 'keys_upsert', db)
+        breezedb.run_query('UPSERT ROWS %1%; %Uno%; %2%; %Two%; IN %keys_upsert%; AT %' + db + '%;')
+
+        self.assertEquals([[1, u'Uno'], [2, u'Two']],
+                [[row['id'], row['name']] for row in
+                breezedb.get_row_list('keys_upsert', db)])
+
+    def test_upsert_rows_inexistent(self):
+        try:
+            breezedb.upsert_row(['5', 'Five', '5'], 'table_2', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
 if __name__ == "__main__":
     if os.path.isfile(os.path.join(test_root, 'dbtemp.brdb')):
         os.remove(os.path.join(test_root, 'dbtemp.brdb'))
@@ -76,4 +276,3 @@ if __name__ == "__main__":
         os.path.join(test_root, 'dbtemp.brdb'))
 
     unittest.main()
-
@@ -19,6 +19,52 @@ class TestField(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_create_index(self):
+        breezedb.create_index('id', table, db)
+        self.assertEquals(breezedb.get_index_list('id', table, db), ['hash'])
+        self.assertEquals(breezedb.search_data(23, table, db, 'id'), [1])
+
+        breezedb.create_rows([['23', 'Name', 'Name2', ''],
+                ['5', 'Name', 'Name2', ''], ['7', 'Name', 'Name2', '']],
+                table, db)
+        self.assertEquals(breezedb.search_data(23, table, db, 'id'), [1, 2])
+
+        breezedb.modify_element(1, 'id', table, db, 5)
+        self.assertEquals(breezedb.search_data(5, table, db, 'id'), [1, 3])
+
+        breezedb.empty_element(3, 'id', table, db)
+        self.assertEquals(breezedb.search_data(5, table, db, 'id'), [1])
+
+        breezedb.remove_row(2, table, db)
+        breezedb.remove_row(2, table, db)
+        self.assertEquals(breezedb.search_data(23, table, db, 'id'), [])
+        self.assertEquals(breezedb.search_data(7, table, db, 'id'), [2])
+
+        # The index is kept in the database and built again when read
+        breezedb.parser.clear_cache()
+        self.assertEquals(breezedb.get_index_list('id', table, db), ['hash'])
+        self.assertEquals(breezedb.search_data(7, table, db, 'id'), [2])
+
+        breezedb.remove_row(2, table, db)
+        breezedb.modify_element(1, 'id', table, db, 23)
+
+    def test_create_index_deferred(self):
+        # Rows parsed for a single search are scanned instead of indexed
+        breezedb.parser.clear_cache()
+        self.assertEquals(breezedb.search_data(23, table, db, 'id'), [1])
+        rows = breezedb.parser.read(db)[table]['rows']
+        self.assertEquals(rows.indexes, {})
+
+        self.assertEquals(breezedb.search_data(23, table, db, 'id'), [1])
+        self.assertEquals(rows.indexes.keys(), [(u'id', 'hash')])
+
+    def test_create_index_existing(self):
+        try:
+            breezedb.create_index('id', table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_empty_field_row(self):
         breezedb.empty_field_row(0, 'id', table, db)
 
@@ -29,6 +75,15 @@ class TestField(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_empty_field_row_query(self):
+        breezedb.create_table('empty_query', db)
+        breezedb.create_field('id', 'int', 'empty_query', db)
+        breezedb.create_field('name', 'str', 'empty_query', db)
+        breezedb.create_rows([[1, 'One'], [2, 'Two']], 'empty_query', db)
+        breezedb.run_query('EMPTY FIELD %id%; %name%; OF %0%; IN %empty_query%; AT %' + db + '%;')
+        self.assertEquals(breezedb.get_row_list('empty_query', db),
+                [{u'id': u'', u'name': u''}, {u'id': 2, u'name': u'Two'}])
+
     def test_empty_field_table(self):
         breezedb.empty_field_table('name', table, db)
 
@@ -47,6 +102,10 @@ class TestField(unittest.TestCase):
         result = breezedb.exists_field('id1234', table, db)
         self.assertEquals(result, False)
 
+    def test_get_field_avg(self):
+        result = breezedb.get_field_avg('id', table, db)
+        self.assertEquals(23.0, result)
+
     def test_get_field_data(self):
         result = breezedb.get_field_data('name2', table, db)
         self.assertEquals([u'Name2', u'Name21'], result)
@@ -58,6 +117,29 @@ class TestField(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_get_field_max(self):
+        result = breezedb.get_field_max('name2', table, db)
+        self.assertEquals(u'Name21', result)
+
+    def test_get_field_min(self):
+        breezedb.create_index('name2', table, db, 'ordered')
+        result = breezedb.get_field_min('name2', table, db)
+        self.assertEquals(u'Name2', result)
+
+    def test_get_field_sum(self):
+        result = breezedb.get_field_sum('id', table, db)
+        self.assertEquals(23, result)
+
+        result = breezedb.run_query('GET SUM OF %id%; IN %' + table + '%; AT %' + db + '%;>>GET MAX OF %name2%; IN %' + table + '%; AT %' + db + '%;')
+        self.assertEquals([23, u'Name21'], result)
+
+    def test_get_field_sum_invalid(self):
+        try:
+            breezedb.get_field_sum('name2', table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_get_field_type(self):
         result = breezedb.get_field_type('name2', table, db)
         self.assertEquals(u'str', result)
@@ -82,6 +164,20 @@ class TestField(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_remove_index(self):
+        breezedb.run_query('CREATE INDEX %name%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals(breezedb.get_index_list('name', table, db), ['hash'])
+
+        breezedb.remove_index('name', table, db)
+        self.assertEquals(breezedb.get_index_list('name', table, db), [])
+
+    def test_remove_index_inexistent(self):
+        try:
+            breezedb.remove_index('name', table, db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_swap_fields(self):
         breezedb.swap_fields(0, 1, table, db)
 
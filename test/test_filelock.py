@@ -0,0 +1,105 @@
+import fcntl, multiprocessing, os, shutil, sys, threading, time, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import filelock, parser
+
+db = os.path.join(test_root, 'locktemp.brdb')
+
+def create_rows(count):
+    for i in range(count):
+        breezedb.create_row([i, 'Name'], 'table', db)
+
+class TestFileLock(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isfile(db):
+            breezedb.remove_db(db)
+        parser.clear_cache()
+
+        breezedb.create_db(test_root, 'locktemp')
+        breezedb.create_table('table', db)
+        breezedb.create_field('id', 'int', 'table', db)
+        breezedb.create_field('name', 'str', 'table', db)
+
+    def tearDown(self):
+        filelock.set_lock_timeout(30.0)
+        breezedb.remove_db(db)
+
+    def test_concurrent_processes(self):
+        workers = [multiprocessing.Process(target=create_rows, args=(20,))
+                for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list('table', db)), 80)
+
+    def test_timeout(self):
+        # A separate descriptor behaves like another process
+        fd = os.open(filelock.lock_path(db), os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        filelock.set_lock_timeout(0.1)
+        timeouts = filelock.get_lock_info()['timeouts']
+        try:
+            breezedb.create_row([1, 'Name'], 'table', db)
+            self.assertEquals(False, True)
+        except Exception as e:
+            self.assertTrue('Timed out' in str(e))
+        finally:
+            os.close(fd)
+
+        info = filelock.get_lock_info()
+        self.assertEquals(info['timeouts'], timeouts + 1)
+        self.assertTrue(info['wait_time'] >= 0.1)
+
+        breezedb.create_row([1, 'Name'], 'table', db)
+        self.assertEquals(len(breezedb.get_row_list('table', db)), 1)
+
+    def test_reentrant(self):
+        lock = filelock.get_lock(db)
+        with filelock.exclusive(db):
+            with filelock.shared(db):
+                with filelock.exclusive(db):
+                    self.assertEquals(lock.depth, 3)
+        self.assertEquals(lock.owner, None)
+        self.assertEquals(lock.fd, None)
+
+        with filelock.shared(db):
+            with filelock.shared(db):
+                self.assertEquals(lock.readers, 2)
+        self.assertEquals(lock.readers, 0)
+
+    def test_writer_preference(self):
+        order = []
+
+        def acquire(name, hold):
+            with hold(db):
+                order.append(name)
+
+        with filelock.shared(db):
+            writer = threading.Thread(target=acquire,
+                    args=('writer', filelock.exclusive))
+            writer.start()
+            while not filelock.get_lock(db).writers:
+                time.sleep(0.01)
+
+            reader = threading.Thread(target=acquire,
+                    args=('reader', filelock.shared))
+            reader.start()
+            reader.join(0.2)
+            self.assertEquals(reader.is_alive(), True)
+
+            # The thread already reading is not blocked by the writer
+            with filelock.shared(db):
+                order.append('nested')
+
+        writer.join()
+        reader.join()
+        self.assertEquals(order, ['nested', 'writer', 'reader'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+import json, os, shutil, sys, threading, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import parser
+
+db = os.path.join(test_root, 'handletemp.brdb')
+table = 'table_1'
+
+class TestHandle(unittest.TestCase):
+
+    def test_create_row(self):
+        handle = breezedb.Database(db)
+        handle.create_row([1, 'Name', 'Name2'], table)
+        self.assertEquals(len(handle.get_row_list(table)), 3)
+
+        # Not written until the handle is flushed
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 2)
+        handle.close()
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 3)
+
+    def test_flush(self):
+        handle = breezedb.Database(db)
+        handle.create_table('flush_table')
+        self.assertEquals(breezedb.exists_table('flush_table', db), True)
+        handle.flush()
+        handle.close()
+        parser.clear_cache()
+        self.assertEquals(breezedb.exists_table('flush_table', db), True)
+
+    def test_context_manager(self):
+        with breezedb.Database(db) as handle:
+            handle.modify_element(0, 'name', table, 'Modified')
+            self.assertEquals(handle.get_element_data(0, 'name', table),
+                    u'Modified')
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_element_data(0, 'name', table, db),
+                u'Modified')
+
+    def test_transaction(self):
+        inode = os.stat(db).st_ino
+        with breezedb.transaction(db) as tx:
+            tx.create_table('tx_table')
+            breezedb.create_field('id', 'int', 'tx_table', db)
+            breezedb.create_field('name', 'str', 'tx_table', db)
+            self.assertEquals(os.stat(db).st_ino, inode)
+
+        self.assertNotEquals(os.stat(db).st_ino, inode)
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_field_list('tx_table', db),
+                [{u'id': u'int'}, {u'name': u'str'}])
+
+    def test_transaction_discard(self):
+        inode = os.stat(db).st_ino
+        try:
+            with breezedb.transaction(db):
+                breezedb.create_table('discarded_table', db)
+                breezedb.remove_table('inexistent_table', db)
+        except:
+            pass
+
+        self.assertEquals(os.stat(db).st_ino, inode)
+        self.assertEquals(breezedb.exists_table('discarded_table', db), False)
+
+    def test_transaction_threads(self):
+        breezedb.create_table('tx_threads', db)
+        breezedb.create_field('id', 'int', 'tx_threads', db)
+        started = threading.Event()
+
+        def worker():
+            started.wait()
+            breezedb.create_row([2], 'tx_threads', db)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        try:
+            with breezedb.transaction(db):
+                breezedb.create_row([1], 'tx_threads', db)
+                started.set()
+                # The other thread waits for the transaction to end
+                thread.join(0.2)
+                self.assertEquals(thread.is_alive(), True)
+                raise Exception('Rollback')
+        except:
+            pass
+
+        thread.join()
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row_list('tx_threads', db),
+                [{u'id': 2}])
+
+    def test_query_transaction(self):
+        breezedb.run_query('CREATE TABLE %q1%; %q2%; AT %' + db + '%;')
+        inode = os.stat(db).st_ino
+        try:
+            breezedb.run_query('REMOVE TABLE %q1%; %q3%; AT %' + db + '%;')
+        except:
+            pass
+
+        self.assertEquals(os.stat(db).st_ino, inode)
+        self.assertEquals(breezedb.exists_table('q1', db), True)
+
+    def test_iter_rows_changed(self):
+        with breezedb.Database(db) as handle:
+            expected = handle.get_row_list(table)
+            rows = breezedb.iter_rows(table, db)
+            handle.modify_element(0, 'name', table, 'Iterated')
+            self.assertEquals(list(rows), expected)
+            handle.discard()
+
+    def test_iter_rows_changed_during(self):
+        with breezedb.Database(db) as handle:
+            expected = handle.get_row_list(table)
+            rows = breezedb.iter_rows(table, db)
+            first = next(rows)
+            handle.modify_element(1, 'name', table, 'Iterated')
+            handle.create_field('iterated', 'str', table)
+            handle.remove_row(0, table)
+            self.assertEquals([first] + list(rows), expected)
+            handle.discard()
+
+    def test_shared(self):
+        database = breezedb.shared(db)
+        self.assertTrue(breezedb.shared(db) is database)
+
+        limit = parser.get_cache_info()['limit']
+        try:
+            parser.set_cache_limit(0)
+            with database.reading():
+                data = database.read()
+                self.assertTrue(database.read() is data)
+
+            # Evicted once every user has closed it
+            database.close()
+            self.assertEquals(parser.get_cache_info()['entries'], 1)
+            database.close()
+            self.assertEquals(parser.get_cache_info()['entries'], 0)
+        finally:
+            parser.set_cache_limit(limit)
+
+        with breezedb.shared(db) as other:
+            self.assertTrue(other is not database)
+
+    def test_shared_read_waits(self):
+        breezedb.create_table('read_waits', db)
+        breezedb.create_field('id', 'int', 'read_waits', db)
+        breezedb.create_rows([[1], [2]], 'read_waits', db)
+        rows = []
+
+        def reader():
+            rows.append(breezedb.get_row(0, 'read_waits', db))
+
+        with breezedb.shared(db) as database:
+            with database.writing():
+                thread = threading.Thread(target=reader)
+                thread.start()
+                thread.join(0.2)
+                self.assertEquals(thread.is_alive(), True)
+                breezedb.remove_row(0, 'read_waits', db)
+
+            thread.join()
+
+        self.assertEquals(rows, [[2]])
+
+    def test_shared_threads(self):
+        breezedb.create_table('threads', db)
+        breezedb.create_field('id', 'int', 'threads', db)
+        errors = []
+
+        def worker(number):
+            try:
+                for i in range(10):
+                    breezedb.run_query('CREATE ROW %' + str(number) +
+                            '%; IN %threads%; AT %' + db + '%;')
+                    breezedb.run_query('GET ROWS IN %threads%; AT %' + db +
+                            '%;')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEquals(errors, [])
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list('threads', db)), 40)
+
+    def test_single_parse(self):
+        parser.clear_cache()
+        misses = parser.get_cache_info()['misses']
+        threads = [threading.Thread(target=parser.read, args=(db,))
+                for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEquals(parser.get_cache_info()['misses'], misses + 1)
+
+    def test_already_open(self):
+        with breezedb.Database(db):
+            try:
+                breezedb.Database(db)
+                self.assertEquals(False, True)
+            except:
+                self.assertTrue(True, True)
+
+    def test_not_brdb(self):
+        try:
+            breezedb.Database(os.path.join(test_root, 'handle1234.brdb'))
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+if __name__ == "__main__":
+    if os.path.isfile(db):
+        os.remove(db)
+
+    shutil.copy(os.path.join(test_root, 'db.brdb'), db)
+
+    unittest.main()
@@ -0,0 +1,196 @@
+import json, os, shutil, sys, threading, time, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import journal, parser
+
+db = os.path.join(test_root, 'journaltemp.brdb')
+log = db + journal.LOG_SUFFIX
+table = 'table_1'
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        shutil.copy(os.path.join(test_root, 'db.brdb'), db)
+        if os.path.isfile(log):
+            os.remove(log)
+        parser.clear_cache()
+        breezedb.enable_log(db)
+
+    def tearDown(self):
+        breezedb.remove_db(db)
+
+    def test_enable_log_existing(self):
+        try:
+            breezedb.enable_log(db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+    def test_create_row_appends(self):
+        size = os.path.getsize(db)
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        self.assertEquals(os.path.getsize(db), size)
+        self.assertEquals(len(open(log).readlines()), 2)
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row(2, table, db), [1, u'Name', u'Name2'])
+
+    def test_replay_operations(self):
+        breezedb.modify_element(0, 'name', table, db, 'Modified')
+        breezedb.empty_element(1, 'name2', table, db)
+        breezedb.remove_row(0, table, db)
+        breezedb.create_field('extra', 'int', table, db)
+        breezedb.rename_field('name2', table, db, 'name3')
+        breezedb.swap_fields(0, 1, table, db)
+        breezedb.rename_table('table_2', db, 'table_4')
+        breezedb.remove_table('table_3', db)
+        expected = parser.read(db)
+
+        parser.clear_cache()
+        self.assertEquals(parser.read(db), expected)
+        self.assertEquals(breezedb.get_table_list(db), [u'table_1', u'table_4'])
+        self.assertEquals(breezedb.get_row(0, table, db),
+                [u'Name12', 23, u'', u''])
+
+    def test_partial_record(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        log_file = open(log, 'ab')
+        log_file.write('["remove_row", "table_1"')
+        log_file.close()
+
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 3)
+
+        breezedb.remove_row(0, table, db)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 2)
+
+    def test_replay_line_separator(self):
+        breezedb.create_row([1, 'before', 'x'], table, db)
+        breezedb.create_row([2, u'a\u2028b\u2029c\x85d'.encode('utf-8'), 'x'],
+                table, db)
+        breezedb.create_row([3, 'after', 'x'], table, db)
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_field_data('name', table, db)[2:],
+                [u'before', u'a\u2028b\u2029c\x85d', u'after'])
+
+    def test_stale_log(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        shutil.copy(os.path.join(test_root, 'db.brdb'), db + '.new')
+        os.rename(db + '.new', db)
+
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 2)
+
+    def test_disable_log(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        breezedb.disable_log(db)
+        self.assertEquals(os.path.isfile(log), False)
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 3)
+
+    def test_handle_flush(self):
+        with breezedb.Database(db) as handle:
+            handle.create_row([1, 'Name', 'Name2'], table)
+            handle.create_row([2, 'Name', 'Name2'], table)
+
+        self.assertEquals(len(open(log).readlines()), 3)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 4)
+
+    def test_handle_compact(self):
+        handle = breezedb.Database(db)
+        handle.create_row([1, 'Name', 'Name2'], table)
+        breezedb.compact_db(db, background=True).join()
+        handle.discard()
+
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 2)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 2)
+
+    def test_compact_db(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        breezedb.compact_db(db)
+        self.assertEquals(len(open(log).readlines()), 1)
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 3)
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 3)
+
+    def test_compact_query(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        breezedb.run_query('COMPACT DB AT %' + db + '%;')
+        self.assertEquals(len(open(log).readlines()), 1)
+
+    def test_compact_background(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        breezedb.compact_db(db, background=True).join()
+        self.assertEquals(len(open(log).readlines()), 1)
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 3)
+
+    def test_compact_concurrent(self):
+        breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        dump_temp = parser._dump_temp
+        writers = []
+
+        def write_meanwhile(*args):
+            # Changes wait while the new file is written
+            writer = threading.Thread(target=breezedb.create_row,
+                    args=([2, 'Name', 'Name2'], table, db))
+            writer.start()
+            while not breezedb.filelock.get_lock(db).writers:
+                time.sleep(0.01)
+            writers.append(writer)
+            return dump_temp(*args)
+
+        parser._dump_temp = write_meanwhile
+        try:
+            breezedb.compact_db(db)
+        finally:
+            parser._dump_temp = dump_temp
+
+        writers[0].join()
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 3)
+        self.assertEquals(len(open(log).readlines()), 2)
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 4)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 4)
+
+    def test_cache_hit_unlocked(self):
+        breezedb.get_row_list(table, db)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            with breezedb.filelock.exclusive(db):
+                locked.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait()
+        try:
+            breezedb.filelock.set_lock_timeout(0.1)
+            self.assertEquals(len(parser.read_file(db)[table]['rows']), 2)
+        finally:
+            breezedb.filelock.set_lock_timeout(30.0)
+            release.set()
+            thread.join()
+
+    def test_compact_threshold(self):
+        size = journal.COMPACT_SIZE
+        journal.COMPACT_SIZE = 1
+        try:
+            breezedb.create_row([1, 'Name', 'Name2'], table, db)
+        finally:
+            journal.COMPACT_SIZE = size
+
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread():
+                thread.join()
+
+        self.assertEquals(len(json.load(open(db))[table]['rows']), 3)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list(table, db)), 3)
+
+if __name__ == "__main__":
+    unittest.main()
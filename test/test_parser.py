@@ -0,0 +1,116 @@
+import os, shutil, sys, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import parser
+
+db = os.path.join(test_root, 'parsertemp.brdb')
+
+class TestParser(unittest.TestCase):
+
+    def setUp(self):
+        parser.clear_cache()
+        parser.set_cache_limit(64 * 1024 * 1024)
+
+    def test_cache_hit(self):
+        before = parser.get_cache_info()
+        first = parser.read(db)
+        second = parser.read(db)
+        after = parser.get_cache_info()
+        self.assertTrue(first is second)
+        self.assertEquals(after['misses'] - before['misses'], 1)
+        self.assertEquals(after['hits'] - before['hits'], 1)
+
+    def test_cache_external_change(self):
+        parser.read(db)
+        shutil.copy(os.path.join(test_root, 'db.brdb'), db + '.new')
+        os.rename(db + '.new', db)
+        before = parser.get_cache_info()
+        parser.read(db)
+        after = parser.get_cache_info()
+        self.assertEquals(after['misses'] - before['misses'], 1)
+
+    def test_cache_write(self):
+        data = parser.read(db)
+        parser.write(db, data)
+        before = parser.get_cache_info()
+        self.assertTrue(parser.read(db) is data)
+        after = parser.get_cache_info()
+        self.assertEquals(after['hits'] - before['hits'], 1)
+
+    def test_cache_limit(self):
+        parser.read(db)
+        self.assertEquals(parser.get_cache_info()['entries'], 1)
+        parser.set_cache_limit(0)
+        info = parser.get_cache_info()
+        self.assertEquals(info['entries'], 0)
+        self.assertEquals(info['size'], 0)
+
+    def test_returned_rows_are_copies(self):
+        rows = breezedb.get_row_list('table_1', db)
+        rows[0]['name'] = u'Changed'
+        self.assertEquals(breezedb.get_element_data(0, 'name', 'table_1', db),
+                u'Name1')
+
+    def test_write_atomic(self):
+        os.chmod(db, 0640)
+        data = parser.read(db)
+        parser.write(db, data)
+        self.assertEquals(os.stat(db).st_mode & 0777, 0640)
+        leftovers = [f for f in os.listdir(test_root) if f.endswith('.tmp')]
+        self.assertEquals(leftovers, [])
+
+    def test_write_failure_keeps_file(self):
+        before = open(db).read()
+        try:
+            parser.write(db, {'table': object()})
+            self.assertEquals(False, True)
+        except TypeError:
+            pass
+        self.assertEquals(open(db).read(), before)
+        leftovers = [f for f in os.listdir(test_root) if f.endswith('.tmp')]
+        self.assertEquals(leftovers, [])
+
+    def test_fsync_policy(self):
+        calls = []
+        fsync = os.fsync
+        os.fsync = lambda fd: calls.append(fd)
+        try:
+            data = parser.read(db)
+            parser.write(db, data)
+            self.assertTrue(len(calls) > 0)
+
+            del calls[:]
+            parser.set_fsync_policy(parser.FSYNC_NEVER)
+            parser.write(db, data)
+            self.assertEquals(calls, [])
+
+            parser.set_fsync_policy(parser.FSYNC_CLOSE)
+            parser.write(db, data)
+            self.assertEquals(calls, [])
+            with breezedb.Database(db) as handle:
+                handle.create_table('fsync_table')
+                handle.flush()
+                self.assertEquals(calls, [])
+                handle.remove_table('fsync_table')
+            self.assertTrue(len(calls) > 0)
+
+        finally:
+            os.fsync = fsync
+            parser.set_fsync_policy(parser.FSYNC_ALWAYS)
+
+    def test_fsync_policy_invalid(self):
+        try:
+            parser.set_fsync_policy('sometimes')
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
+if __name__ == "__main__":
+    if os.path.isfile(db):
+        os.remove(db)
+
+    shutil.copy(os.path.join(test_root, 'db.brdb'), db)
+
+    unittest.main()
@@ -0,0 +1,169 @@
+import os, shutil, sys, unittest
+
+test_root = os.path.abspath(os.path.dirname(__file__))
+
+import breezedb
+from breezedb import journal, parser, segment
+
+db = os.path.join(test_root, 'segmenttemp.brdb')
+
+def segment_files():
+    return sorted(f for f in os.listdir(db) if f.endswith('.seg'))
+
+def segment_file(table_name):
+    return segment.read_manifest(db)['tables'][table_name]['file']
+
+class TestSegment(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isdir(db):
+            shutil.rmtree(db)
+        if os.path.isfile(db + '.log'):
+            os.remove(db + '.log')
+        parser.clear_cache()
+
+        breezedb.create_db(test_root, 'segmenttemp', segmented=True)
+        for t in ['events', 'lookup']:
+            breezedb.create_table(t, db)
+            breezedb.create_field('id', 'int', t, db)
+            breezedb.create_field('name', 'str', t, db)
+            breezedb.create_row([1, 'Name'], t, db)
+
+    def tearDown(self):
+        breezedb.remove_db(db)
+
+    def test_is_brdb(self):
+        self.assertEquals(breezedb.is_brdb(db), True)
+        self.assertEquals(segment_files(), sorted([segment_file('events'),
+                segment_file('lookup')]))
+
+    def test_rows(self):
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row(0, 'events', db), [1, u'Name'])
+        self.assertEquals(breezedb.get_field_list('lookup', db),
+                [{u'id': u'int'}, {u'name': u'str'}])
+
+    def test_write_only_touched_segment(self):
+        events, lookup = segment_file('events'), segment_file('lookup')
+        inode = os.stat(os.path.join(db, events)).st_ino
+        breezedb.create_row([2, 'Other'], 'lookup', db)
+        self.assertEquals(segment_file('events'), events)
+        self.assertEquals(os.stat(os.path.join(db, events)).st_ino, inode)
+
+        # Changed tables are written to a new file
+        self.assertNotEquals(segment_file('lookup'), lookup)
+        self.assertEquals(segment_files(), sorted([events,
+                segment_file('lookup')]))
+
+    def test_write_interrupted(self):
+        write_manifest = segment._write_manifest
+        def fail(*args):
+            raise OSError('Interrupted')
+
+        segment._write_manifest = fail
+        try:
+            breezedb.create_field('other', 'str', 'events', db)
+            self.assertEquals(False, True)
+        except OSError:
+            pass
+        finally:
+            segment._write_manifest = write_manifest
+
+        # The manifest still matches the segment it points to
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_field_list('events', db),
+                [{u'id': u'int'}, {u'name': u'str'}])
+        self.assertEquals(breezedb.get_row(0, 'events', db), [1, u'Name'])
+
+    def test_row_ids(self):
+        breezedb.enable_row_ids('events', db)
+        breezedb.create_row([2, 'Other'], 'events', db)
+        self.assertEquals(segment.read_manifest(db)['tables']['events'][
+                'definition'], {u'fields': [{u'id': u'int'},
+                {u'name': u'str'}], u'next_id': 2})
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row_ids('events', db), [0, 1])
+
+    def test_count_rows(self):
+        breezedb.create_row([2, 'Other'], 'events', db)
+        self.assertEquals(segment.read_manifest(db)['tables']['events'][
+                'count'], 2)
+
+        # The count is read from the manifest without loading the table
+        parser.clear_cache()
+        self.assertEquals(breezedb.count_rows('events', db), 2)
+        self.assertEquals(breezedb.count_rows('lookup', db), 1)
+        self.assertFalse(parser.read(db).is_loaded(u'events'))
+
+    def test_table_list_reads_manifest(self):
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_table_list(db), [u'events', u'lookup'])
+        self.assertEquals(breezedb.exists_table('events', db), True)
+        tables = parser.read(db)
+        for name, s in tables.segments():
+            self.assertTrue(s.table is None)
+
+    def test_rename_remove_table(self):
+        lookup = segment_file('lookup')
+        breezedb.rename_table('events', db, 'events2')
+        self.assertEquals(segment_file('lookup'), lookup)
+        self.assertEquals(segment_files(), sorted([lookup,
+                segment_file('events2')]))
+        breezedb.remove_table('lookup', db)
+        self.assertEquals(segment_files(), [segment_file('events2')])
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_table_list(db), [u'events2'])
+        self.assertEquals(breezedb.get_row(0, 'events2', db), [1, u'Name'])
+
+    def test_log(self):
+        breezedb.enable_log(db)
+        breezedb.create_row([2, 'Other'], 'lookup', db)
+        breezedb.modify_element(0, 'name', 'events', db, 'Changed')
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row(1, 'lookup', db), [2, u'Other'])
+        self.assertEquals(breezedb.get_row(0, 'events', db), [1, u'Changed'])
+
+        breezedb.compact_db(db)
+        parser.clear_cache()
+        self.assertEquals(len(breezedb.get_row_list('lookup', db)), 2)
+
+    def test_needs_compaction(self):
+        breezedb.enable_log(db)
+        breezedb.create_row([2, 'Other'], 'lookup', db)
+        log_size = os.path.getsize(journal.log_path(db))
+        self.assertEquals(segment.get_size(db), sum(os.path.getsize(
+                os.path.join(db, f)) for f in segment_files() +
+                [segment.MANIFEST]))
+
+        # The log is compared with the size of the files, not the directory
+        ratio = journal.COMPACT_RATIO
+        journal.COMPACT_RATIO = 0.5 * log_size / segment.get_size(db)
+        try:
+            self.assertEquals(journal.needs_compaction(db), True)
+        finally:
+            journal.COMPACT_RATIO = ratio
+
+    def test_convert_format(self):
+        breezedb.convert_db(db, 'binary')
+        self.assertEquals(breezedb.get_db_format(db), 'binary')
+        self.assertTrue(open(os.path.join(db, segment_file('events')), 'rb')
+                .read().startswith('BRDB'))
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_row(0, 'events', db), [1, u'Name'])
+
+    def test_handle(self):
+        with breezedb.Database(db) as handle:
+            handle.create_row([2, 'Other'], 'lookup')
+            handle.create_table('new')
+
+        parser.clear_cache()
+        self.assertEquals(breezedb.get_table_list(db),
+                [u'events', u'lookup', u'new'])
+        self.assertEquals(len(breezedb.get_row_list('lookup', db)), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,13 @@ db = os.path.join(test_root, 'dbtemp.brdb')
 
 class TestTable(unittest.TestCase):
 
+    def test_count_rows(self):
+        result = breezedb.count_rows('table_1', db)
+        self.assertEquals(2, result)
+
+        result = breezedb.run_query('GET COUNT IN %table_1%; WHERE %id > 0%; AT %' + db + '%;')
+        self.assertEquals([1], result)
+
     def test_create_table(self):
         breezedb.create_table('new_table', db)
 
@@ -18,6 +25,17 @@ class TestTable(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_enable_row_ids(self):
+        breezedb.enable_row_ids('table_3', db)
+        self.assertEquals([0, 1], breezedb.get_row_ids('table_3', db))
+
+    def test_enable_row_ids_existing(self):
+        try:
+            breezedb.enable_row_ids('table_3', db)
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_exists_table_true(self):
         result = breezedb.exists_table('table_1', db)
         self.assertEquals(True, result)
@@ -30,6 +48,17 @@ class TestTable(unittest.TestCase):
         result = breezedb.get_row(0, 'table_1', db)
         self.assertEquals([0, u'Name1', u'Name2'], result)
 
+    def test_get_row_fields(self):
+        result = breezedb.get_row(1, 'table_1', db, ['name2', 'id'])
+        self.assertEquals((u'Name21', 23), result)
+
+    def test_get_row_by_id(self):
+        result = breezedb.get_row_by_id(1, 'table_3', db)
+        self.assertEquals([23, u'Name12', u'Name21'], result)
+
+        result = breezedb.run_query('GET ROW BY ID %0%; IN %table_3%; AT %' + db + '%;')
+        self.assertEquals([[0, u'Name1', u'Name2']], result)
+
     def test_get_row_inexistent(self):
         try:
             result = breezedb.get_row(10, 'table_1', db)
@@ -42,6 +71,35 @@ class TestTable(unittest.TestCase):
         expected = [{u'name2': u'Name2', u'id': 0, u'name': u'Name1'}, {u'name2': u'Name21', u'id': 23, u'name': u'Name12'}]
         self.assertEquals(result, expected)
 
+    def test_get_row_list_where(self):
+        result = breezedb.get_row_list('table_1', db,
+                "id BETWEEN 1 AND 30 AND name IN ('Name12', 'Name3')")
+        self.assertEquals([23], [row['id'] for row in result])
+
+        result = breezedb.run_query('GET ROWS IN %table_1%; WHERE %NOT (id > 0 OR name2 = \'\')%; AT %' + db + '%;')
+        self.assertEquals([[0]], [[row['id'] for row in r] for r in result])
+
+    def test_get_row_list_where_invalid(self):
+        try:
+            breezedb.get_row_list('table_1', db, "id IN ('a')")
+            self.assertEqual(True, False)
+        except:
+            self.assertTrue(True, True)
+
+    def test_get_row_list_fields(self):
+        result = breezedb.get_row_list('table_1', db, fields=['id', 'name'])
+        self.assertEquals([(0, u'Name1'), (23, u'Name12')], result)
+
+        result = breezedb.run_query('GET FIELDS %name2%; FROM ROWS IN %table_1%; WHERE %id > 0%; AT %' + db + '%;')
+        self.assertEquals([[(u'Name21',)]], result)
+
+    def test_get_row_list_fields_inexistent(self):
+        try:
+            breezedb.get_row_list('table_1', db, fields=['inexistent'])
+            self.assertEqual(True, False)
+        except:
+            self.assertTrue(True, True)
+
     def test_get_row_list_inexistent(self):
         try: 
             result = breezedb.get_row_list('table_12345', db)
@@ -49,6 +107,20 @@ class TestTable(unittest.TestCase):
         except:
             self.assertTrue(True, True)
 
+    def test_iter_rows(self):
+        result = list(breezedb.iter_rows('table_1', db))
+        self.assertEquals(result, breezedb.get_row_list('table_1', db))
+
+        result = list(breezedb.iter_rows('table_1', db, ['id']))
+        self.assertEquals(result, [{u'id': 0}, {u'id': 23}])
+
+    def test_iter_rows_inexistent(self):
+        try:
+            breezedb.iter_rows('table_1', db, ['inexistent'])
+            self.assertEquals(False, True)
+        except:
+            self.assertTrue(True, True)
+
     def test_get_field_list(self):
         result = breezedb.get_field_list('table_1', db)
         self.assertEquals([{u'id': u'int'}, {u'name': u'str'}, {u'name2': u'str'}], result)
@@ -85,6 +157,89 @@ class TestTable(unittest.TestCase):
         result = breezedb.search_data('name1', 'table_1', db)
         self.assertEquals(expected, result)
 
+        result = breezedb.run_query('SEARCH %name12%; FROM %name%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals([[1]], result)
+
+    def test_search_data_number(self):
+        result = breezedb.run_query('SEARCH %23%; FROM %id%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals([[1]], result)
+
+        breezedb.create_index('id', 'table_1', db)
+        try:
+            result = breezedb.run_query('SEARCH %23%; FROM %id%; IN %table_1%; AT %' + db + '%;')
+            self.assertEquals([[1]], result)
+        finally:
+            breezedb.remove_index('id', 'table_1', db)
+
+    def test_search_data_trigram(self):
+        breezedb.run_query('CREATE TRIGRAM INDEX %name2%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals(['trigram'], breezedb.get_index_list('name2', 'table_1', db))
+
+        result = breezedb.search_data('ME2', 'table_1', db, 'name2')
+        self.assertEquals([0, 1], result)
+
+        result = breezedb.search_data('ME2', 'table_1', db, 'name2', False)
+        self.assertEquals([], result)
+
+        result = breezedb.search_data('e21', 'table_1', db, 'name2')
+        self.assertEquals([1], result)
+
+        result = breezedb.search_data('e2', 'table_1', db, 'name2')
+        self.assertEquals([0, 1], result)
+
+        # Rows parsed for a single search are scanned instead of indexed
+        breezedb.parser.clear_cache()
+        result = breezedb.search_data('e21', 'table_1', db, 'name2')
+        self.assertEquals([1], result)
+        rows = breezedb.parser.read(db)['table_1']['rows']
+        self.assertEquals(rows.indexes, {})
+
+        result = breezedb.search_data('e21', 'table_1', db, 'name2')
+        self.assertEquals([1], result)
+        self.assertEquals(rows.indexes.keys(), [(u'name2', 'trigram')])
+
+    def test_search_prefix(self):
+        result = breezedb.search_prefix('Name1', 'table_1', db, 'name')
+        self.assertEquals([0, 1], result)
+
+        breezedb.create_index('name', 'table_1', db, 'ordered')
+        result = breezedb.search_prefix('Name12', 'table_1', db, 'name')
+        self.assertEquals([1], result)
+
+        result = breezedb.run_query('SEARCH PREFIX %Name%; FROM %name%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals([[0, 1]], result)
+
+    def test_search_range(self):
+        result = breezedb.search_range(1, 30, 'table_1', db, 'id')
+        self.assertEquals([1], result)
+
+        breezedb.run_query('CREATE ORDERED INDEX %id%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals(['ordered'], breezedb.get_index_list('id', 'table_1', db))
+
+        result = breezedb.search_range(None, 30, 'table_1', db, 'id')
+        self.assertEquals([0, 1], result)
+
+        result = breezedb.run_query('SEARCH RANGE %0%; %22%; FROM %id%; IN %table_1%; AT %' + db + '%;')
+        self.assertEquals([[0]], result)
+
+        # Rows parsed for a single search are scanned instead of indexed
+        breezedb.parser.clear_cache()
+        result = breezedb.search_range(1, None, 'table_1', db, 'id')
+        self.assertEquals([1], result)
+        rows = breezedb.parser.read(db)['table_1']['rows']
+        self.assertEquals(rows.indexes, {})
+
+        result = breezedb.search_range(1, None, 'table_1', db, 'id')
+        self.assertEquals([1], result)
+        self.assertEquals(rows.indexes.keys(), [(u'id', 'ordered')])
+
+    def test_sort_data(self):
+        result = breezedb.sort_data('id', 'table_1', db, True)
+        self.assertEquals([1, 0], result)
+
+        result = breezedb.sort_data('name2', 'table_1', db)
+        self.assertEquals([0, 1], result)
+
 if __name__ == "__main__":
     if os.path.isfile(os.path.join(test_root, 'dbtemp.brdb')):
         os.remove(os.path.join(test_root, 'dbtemp.brdb'))